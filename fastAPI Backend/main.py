@@ -1,23 +1,68 @@
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException, Body, Header
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
 from langchain_openai import ChatOpenAI
 from langchain.chains import GraphCypherQAChain
 from langchain_community.graphs import Neo4jGraph
+import asyncio
 import json
 import os
 from dotenv import load_dotenv
-from utils.thresholdChecker import check_threshold
-from utils.graphRAG import script_analysis
+from utils.thresholdChecker import check_threshold, acknowledge_threshold
+from utils.graphRAG import script_analysis, resume_script_analysis, start_script_analysis, shutdown_analysis_runner, analysis_events_topic, register_query_templates
+from utils.analysisRuns import get_run
 from utils.callTranscriptKG import construct_graph
+from utils.graphConnection import get_graph_connection, init_graph_connections, close_graph_connections
+from utils.graphSchema import ensure_calls_schema
+from utils.jobQueue import enqueue_transcript, get_job, shutdown_job_queue
+from utils.extractionCache import get_extraction_cache_stats
+from utils.llmCache import get_llm_cache_stats, llm_cache_bypass
+from utils.batchIngest import ingest_transcripts_batch, load_transcripts_from_directory, resolve_ingest_directory, BATCH_MAX_CONCURRENCY, BATCH_GROUP_SIZE
+from utils.thresholdNotifier import shutdown_threshold_notifier, THRESHOLD_EVENTS_TOPIC
+from utils.eventStream import event_stream
+from utils.referenceIndex import get_reference_index
+from utils.cypherCache import run_nl_query, pin_template, unpin_template, list_templates, get_cypher_cache_stats
 
 # Load environment variables
 load_dotenv()
 
 # --- Application Setup ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One long-lived driver (and connection pool) per database, shared by all requests
+    init_graph_connections()
+
+    # Built-in question-to-Cypher templates served by /query without an LLM call
+    register_query_templates()
+
+    # Make sure every MERGE/MATCH key of the calls graph is backed by a constraint or index.
+    # Waiting for the indexes blocks, so it runs in a worker thread instead of on the event loop.
+    try:
+        await asyncio.to_thread(ensure_calls_schema, get_graph_connection(1))
+    except Exception as e:
+        print(f"WARNING: Could not bootstrap the calls graph schema: {e}")
+
+    # Build the reference passage index once; it is rebuilt when reference.txt changes
+    try:
+        get_reference_index()
+    except Exception as e:
+        print(f"WARNING: Could not build the reference index: {e}")
+    yield
+    # Let already queued /construct-kg jobs finish before the process exits
+    shutdown_job_queue(wait=True)
+    # Finish delivering threshold webhooks raised by those jobs
+    shutdown_threshold_notifier(wait=True)
+    # Let background /update-script runs reach their final event
+    shutdown_analysis_runner(wait=True)
+    close_graph_connections()
+
 app = FastAPI(
     title="N8N Cold Calling AI Analysis API",
     description="Provides endpoints to check call thresholds and run GraphRAG analysis.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # --- API Endpoint 1: The Threshold Checker ---
@@ -25,12 +70,15 @@ app = FastAPI(
 # Response model for clarity and type safety
 class ThresholdCheckResponse(BaseModel):
     status: bool
+    ready_segments: List[str] = []
+    calls_since_last_analysis: Optional[int] = None
     message: str
 
 @app.get("/check-threshold", response_model=ThresholdCheckResponse)
 def check_icp_threshold():
     """
-    Checks if any IdealTargetCustomer segment has reached the 50-call threshold.
+    Checks if the calls since the last acknowledged analysis reached the analysis threshold,
+    globally and per IdealTargetCustomer segment (each segment has its own threshold).
     Returns a simple Yes/No (boolean) and a list of segments that are ready.
     """
     try:
@@ -41,6 +89,8 @@ def check_icp_threshold():
         # }
         return {
             "status": response.get("threshold_met"),
+            "ready_segments": response.get("ready_segments", []),
+            "calls_since_last_analysis": response.get("calls_since_last_analysis"),
             "message": response.get("message")
         }
             
@@ -48,6 +98,47 @@ def check_icp_threshold():
         raise HTTPException(status_code=500, detail=f"Database query failed: {str(e)}")
 
 
+# --- API Endpoint 1(B): Acknowledge the Threshold After an Analysis ---
+
+class ThresholdAcknowledgeRequest(BaseModel):
+    # None acknowledges every segment
+    segments: Optional[List[str]] = None
+
+class ThresholdAcknowledgeResponse(BaseModel):
+    acknowledged_segments: List[str]
+    total_calls: int
+    message: str
+
+@app.post("/check-threshold/acknowledge", response_model=ThresholdAcknowledgeResponse)
+def acknowledge_icp_threshold(request: ThresholdAcknowledgeRequest = Body(default=ThresholdAcknowledgeRequest())):
+    """
+    Resets the "since last analysis" counts (globally and for the given segments)
+    once the analysis for the ready segments has been run.
+    """
+    try:
+        return acknowledge_threshold(request.segments)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database query failed: {str(e)}")
+
+
+# --- API Endpoint 1(C): Threshold Event Stream (push instead of polling) ---
+
+@app.get("/events/thresholds")
+async def threshold_events(last_event_id: Optional[int] = Header(default=None, alias="Last-Event-ID")):
+    """
+    Server-Sent Events stream with one "threshold_crossed" event each time an ingested
+    call crosses the global or a segment threshold. Reconnecting clients send
+    Last-Event-ID and receive the events they missed.
+    """
+    return StreamingResponse(
+        event_stream(THRESHOLD_EVENTS_TOPIC, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # --- API Endpoint 2: Call Transcript KG Construct ---
 
 # Input model for the POST request
@@ -59,12 +150,19 @@ class CallTranscriptResponse(BaseModel):
     status: bool
     message: str
     additional_info: str = None  # Optional field for any extra information
+    job_id: str = None  # Set when the transcript was queued instead of processed inline
 
 @app.post("/construct-kg", response_model=CallTranscriptResponse)
-def construct_kg(transcript: CallTranscript):
+def construct_kg(transcript: CallTranscript, enqueue: bool = False):
     """
     Takes a VAPI call transcript and constructs a knowledge graph from it.
+    With ?enqueue=true the transcript is queued for the worker pool and the
+    job ID is returned right away; poll GET /jobs/{job_id} for progress.
     """
+    if enqueue:
+        job_id = enqueue_transcript(transcript.transcript_text)
+        return {"status": True, "message": "Transcript queued for graph construction.", "job_id": job_id}
+
     try:
 
         # with open(f"/home/GraphRAG/call transcripts/call 1.txt", "r") as f:
@@ -81,6 +179,93 @@ def construct_kg(transcript: CallTranscript):
         raise HTTPException(status_code=500, detail=f"Graph construction failed: {str(e)}")
 
 
+# --- API Endpoint 2(B): Queued Job Status ---
+
+# Response model for clarity and type safety
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str  # queued / running / completed / failed
+    steps: Dict[str, str]  # step name (same vocabulary as step_failed) -> pending / running / completed / failed
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[dict] = None
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+def job_status(job_id: str):
+    """
+    Returns the per-step status of a transcript queued with /construct-kg?enqueue=true.
+    """
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return job
+
+
+# --- API Endpoint 2(C): Bulk Transcript Ingestion ---
+
+# Input model for the POST request (either transcripts, a server-side directory, or both)
+class BatchTranscripts(BaseModel):
+    transcripts: List[str] = []
+    directory: Optional[str] = None  # inside BATCH_INGEST_ROOT, e.g. "/home/GraphRAG/call transcripts"
+    max_concurrency: int = BATCH_MAX_CONCURRENCY
+    group_size: int = BATCH_GROUP_SIZE
+
+# Response model for the batch summary
+class BatchIngestResponse(BaseModel):
+    total: int
+    succeeded: int
+    failed: int
+    failures_by_step: Dict[str, int]
+    elapsed_seconds: float
+    transcripts_per_minute: float
+    threshold_crossings: List[dict] = []
+    results: List[dict]
+
+@app.post("/construct-kg/batch", response_model=BatchIngestResponse)
+def construct_kg_batch(batch: BatchTranscripts):
+    """
+    Ingests many transcripts in one request: session IDs are reserved up front,
+    LLM extraction runs concurrently and calls are written in grouped transactions.
+    A directory is only read if it is inside BATCH_INGEST_ROOT.
+    """
+    transcripts = list(batch.transcripts)
+    if batch.directory:
+        try:
+            directory = resolve_ingest_directory(batch.directory)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        transcripts.extend(load_transcripts_from_directory(directory))
+
+    if not transcripts:
+        raise HTTPException(status_code=400, detail="No transcripts provided.")
+
+    try:
+        return ingest_transcripts_batch(transcripts, max_concurrency=batch.max_concurrency, group_size=batch.group_size)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch graph construction failed: {str(e)}")
+
+
+# --- API Endpoint 2(D): Extraction Cache Statistics ---
+
+@app.get("/extraction-cache/stats")
+def extraction_cache_stats():
+    """
+    Returns hit/miss counters and size of the transcript extraction cache.
+    """
+    return get_extraction_cache_stats()
+
+
+# --- API Endpoint 2(E): LLM Response Cache Statistics ---
+
+@app.get("/llm-cache/stats")
+def llm_cache_stats():
+    """
+    Returns hit/miss/bypass counters, bytes saved and size of the LLM response cache.
+    """
+    return get_llm_cache_stats()
+
+
 # --- API Endpoint 3: The GraphRAG Analyzer ---
 
 # Input model for the POST request
@@ -91,32 +276,208 @@ class VapiScript(BaseModel):
 class RAGAnalysisResponse(BaseModel):
     status: bool
     message: str
+    run_id: Optional[str] = None  # Pass to /update-script/resume/{run_id} if a step failed
+    events_url: Optional[str] = None  # Set for background runs: SSE progress stream of the run
+    unchanged_since_run: Optional[str] = None  # Set when the previous outcome was returned without running
+
+
+def _script_update_response(response):
+    run_id = response.get("run_id")
+    unchanged = response.get("unchanged_since_run")
+    prefix = "No new calls and unchanged script since the last analysis. " if unchanged else ""
+
+    if response.get("vapi_update_status") == 200:
+        return {"status": True, "message": prefix + "VAPI script updated successfully.", "run_id": run_id, "unchanged_since_run": unchanged}
+
+    if response.get("vapi_update_status") == "N/A - No improvements needed":
+        return {"status": True, "message": prefix + "No improvements needed for the VAPI script.", "run_id": run_id, "unchanged_since_run": unchanged}
+        
+    return {"status":False, "message": "VAPI script update failed.", "run_id": run_id}
+
+
+def _background_run_response(run_id, message):
+    return {"status": True, "message": message, "run_id": run_id, "events_url": f"/events/update-script/{run_id}"}
+
     
 @app.post("/update-script", response_model=RAGAnalysisResponse)
-def update_script(transcript: VapiScript):
+def update_script(transcript: VapiScript, bypass_cache: bool = False, wait: bool = False, force: bool = False):
     """
     Takes a VAPI call transcript and a user query, runs it against both the
     calls graph and the PDF graph, and returns the combined results.
+    With ?bypass_cache=true every LLM step is called fresh instead of served from the cache.
+    Each step is checkpointed; if one fails, the error names the run_id to resume.
+    The run starts in the background and its run_id is returned right away; follow
+    GET /events/update-script/{run_id} for progress and the result. With ?wait=true the
+    request blocks until the run finishes and returns its outcome.
+    If the script is byte-identical and no call was ingested since the last completed run,
+    that run's outcome is returned without running again; ?force=true always runs.
     """
+    if not wait:
+        run_id, started = start_script_analysis(transcript.vapi_script, bypass_cache=bypass_cache, force=force)
+        if not started:
+            return {**_background_run_response(run_id, "No new calls and unchanged script since the last analysis."), "unchanged_since_run": run_id}
+        return _background_run_response(run_id, "Script analysis started.")
+
     try:
 
         # with open('/home/GraphRAG/vapi script.txt', 'r', encoding='utf-8') as f:
         #     vapi_script = f.read()
 
-        response = script_analysis(transcript.vapi_script)
-        
-        if response.get("vapi_update_status") == 200:
-            return {"status": True, "message": "VAPI script updated successfully."}
+        with llm_cache_bypass(bypass_cache):
+            response = script_analysis(transcript.vapi_script, force=force)
 
-        if response.get("vapi_update_status") == "N/A - No improvements needed":
-            return {"status": True, "message": "No improvements needed for the VAPI script."}
-            
-        return {"status":False, "message": "VAPI script update failed."}
+        return _script_update_response(response)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"RAG analysis failed: {str(e)}")
 
 
+# --- API Endpoint 3(B): Resume a Failed Analysis Run ---
+
+@app.post("/update-script/resume/{run_id}", response_model=RAGAnalysisResponse)
+def resume_update_script(run_id: str, bypass_cache: bool = False, wait: bool = False):
+    """
+    Restarts a script analysis run from its first incomplete step, reusing the saved
+    outputs of the steps that already completed. Runs in the background unless ?wait=true,
+    as for /update-script.
+    """
+    if not wait:
+        _, started = start_script_analysis(run_id=run_id, bypass_cache=bypass_cache)
+        return _background_run_response(run_id, "Script analysis resumed." if started else "Analysis run already completed.")
+
+    try:
+        with llm_cache_bypass(bypass_cache):
+            response = resume_script_analysis(run_id)
+
+        return _script_update_response(response)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"RAG analysis failed: {str(e)}")
+
+
+# --- API Endpoint 3(C): Analysis Run Status ---
+
+class AnalysisRunResponse(BaseModel):
+    run_id: str
+    status: str  # running / completed / failed
+    steps: Dict[str, str]  # step name -> pending / completed / failed
+    next_step: Optional[str] = None
+    failed_step: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+    result: Optional[dict] = None
+
+@app.get("/update-script/runs/{run_id}", response_model=AnalysisRunResponse)
+def analysis_run_status(run_id: str):
+    """
+    Returns the per-step status of a script analysis run.
+    """
+    run = get_run(run_id, include_outputs=False)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Analysis run '{run_id}' not found.")
+    return run
+
+
+# --- API Endpoint 3(D): Analysis Run Progress Stream ---
+
+@app.get("/events/update-script/{run_id}")
+async def analysis_run_events(run_id: str, last_event_id: Optional[int] = Header(default=None, alias="Last-Event-ID")):
+    """
+    Server-Sent Events stream of a background run: one event per step boundary (step name,
+    duration, token usage), then a final run_completed / run_failed event with the result.
+    Events published before the client connected are replayed first.
+    """
+    if get_run(run_id, include_outputs=False) is None:
+        raise HTTPException(status_code=404, detail=f"Analysis run '{run_id}' not found.")
+
+    return StreamingResponse(
+        event_stream(analysis_events_topic(run_id), last_event_id, replay=True),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# --- API Endpoint 4: Natural-Language Query over the Calls Graph ---
+
+class NLQueryRequest(BaseModel):
+    question: str
+    max_rows: int = 200
+
+class NLQueryResponse(BaseModel):
+    question: str
+    cypher: str
+    params: dict
+    source: str  # pinned / cached / generated
+    schema_version: str
+    row_count: int
+    results: List[dict]
+
+@app.post("/query", response_model=NLQueryResponse)
+def nl_query(request: NLQueryRequest):
+    """
+    Answers a question about the calls graph with the rows of a Cypher query. Pinned
+    templates and Cypher generated earlier for the same question and schema version run
+    directly; only new questions cost an LLM round trip.
+    """
+    try:
+        return run_nl_query(request.question, max_rows=request.max_rows)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
+
+
+# --- API Endpoint 4(B): Pinned Cypher Templates ---
+
+class CypherTemplate(BaseModel):
+    question: str  # numbers in the question become $num1, $num2, ... in the template
+    cypher: str
+
+@app.get("/query/templates")
+def query_templates():
+    """
+    Lists the pinned and built-in Cypher templates.
+    """
+    return list_templates()
+
+@app.post("/query/templates")
+def pin_query_template(template: CypherTemplate):
+    """
+    Pins hand-tuned, read-only Cypher for a question (and every question that differs only in its numbers).
+    """
+    try:
+        pattern = pin_template(template.question, template.cypher)
+        return {"status": True, "question_pattern": pattern}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Pinning the template failed: {str(e)}")
+
+@app.delete("/query/templates")
+def unpin_query_template(question: str):
+    """
+    Removes a pinned template; the question falls back to generated Cypher.
+    """
+    if not unpin_template(question):
+        raise HTTPException(status_code=404, detail="No pinned template for this question.")
+    return {"status": True}
+
+
+# --- API Endpoint 4(C): Query Cache Statistics ---
+
+@app.get("/query/cache/stats")
+def query_cache_stats():
+    """
+    Returns pinned/cached hit counts, LLM generations, hit rate and the most asked questions.
+    """
+    return get_cypher_cache_stats()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,74 @@
+from utils import callCounters
+from utils.callCounters import GLOBAL_COUNTER_NAME, acknowledge_counters, crossed_thresholds
+
+
+class RecordingGraph:
+    """Records the queries it is sent and answers read_counters with fixed rows."""
+
+    def __init__(self):
+        self.queries = []
+
+    def query(self, query, params=None):
+        self.queries.append((query, params or {}))
+        if "OPTIONAL MATCH (c:CallCounter" in query:
+            return [{"count": 60, "acknowledged_count": 0}]
+        if "RETURN ic.segment AS segment" in query:
+            return [{"segment": "Retail-Enterprise", "count": 12, "acknowledged_count": 0}]
+        return []
+
+    def writes(self):
+        return [(query, params) for query, params in self.queries if "SET" in query]
+
+
+def _counter(count, notified_at_count, acknowledged_count=0, segment=None):
+    counter = {"count": count, "acknowledged_count": acknowledged_count, "notified_at_count": notified_at_count}
+    if segment:
+        counter["segment"] = segment
+    return counter
+
+
+def test_crossing_fires_on_the_increment_that_recorded_it(monkeypatch):
+    monkeypatch.setattr(callCounters, "ANALYSIS_THRESHOLD", 50)
+    crossings = crossed_thresholds({"global": _counter(50, 50), "segment": None})
+    assert [(c["scope"], c["count"]) for c in crossings] == [("global", 50)]
+
+
+def test_crossing_fires_once_for_a_counter_seeded_above_the_threshold(monkeypatch):
+    monkeypatch.setattr(callCounters, "ANALYSIS_THRESHOLD", 50)
+    # An existing graph with 120 calls: the first increment records the crossing...
+    assert crossed_thresholds({"global": _counter(121, 121), "segment": None})
+    # ...and the following ones see it already recorded
+    assert crossed_thresholds({"global": _counter(122, 121), "segment": None}) == []
+    assert crossed_thresholds({"global": _counter(123, 121), "segment": None}) == []
+
+
+def test_no_crossing_below_the_threshold():
+    assert crossed_thresholds({"global": _counter(10, None), "segment": _counter(3, None, segment="Retail-Enterprise")}) == []
+
+
+def test_segment_crossing_uses_the_segment_threshold(monkeypatch):
+    monkeypatch.setattr(callCounters, "SEGMENT_THRESHOLDS", {"Retail-Enterprise": 5})
+    crossings = crossed_thresholds({
+        "global": _counter(30, None),
+        "segment": _counter(25, 25, acknowledged_count=20, segment="Retail-Enterprise")
+    })
+    assert crossings == [{"scope": "segment", "segment": "Retail-Enterprise", "threshold": 5, "count": 25}]
+
+
+def test_acknowledging_segments_leaves_the_global_counter_alone():
+    graph = RecordingGraph()
+    acknowledge_counters(graph, ["Retail-Enterprise"])
+    writes = graph.writes()
+    assert len(writes) == 1
+    assert "IdealTargetCustomer" in writes[0][0]
+    assert writes[0][1] == {"segments": ["Retail-Enterprise"]}
+
+
+def test_acknowledging_everything_resets_the_global_counter():
+    graph = RecordingGraph()
+    counters = acknowledge_counters(graph)
+    writes = graph.writes()
+    assert writes[0][1] == {"counter_name": GLOBAL_COUNTER_NAME}
+    assert "c.notified_at_count = null" in writes[0][0]
+    assert writes[1][1] == {"segments": None}
+    assert counters["segments"]["Retail-Enterprise"]["since_last_analysis"] == 12
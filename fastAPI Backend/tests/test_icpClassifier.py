@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from utils import icpClassifier
+from utils.icpClassifier import classify_icp_locally, counterpart_text, load_training_examples, ICP_LOCAL_MIN_CONFIDENCE
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+TRANSCRIPTS_DIR = os.path.join(REPO_ROOT, "call transcripts")
+OUTPUTS_GLOB = os.path.join(REPO_ROOT, "call outputs", "*", "*_enriched.json")
+
+
+def _sample(number):
+    with open(os.path.join(TRANSCRIPTS_DIR, f"call {number}.txt"), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture(autouse=True)
+def bundled_training_data(monkeypatch):
+    # Train on the bundled outputs instead of the deployment path
+    monkeypatch.setattr(icpClassifier, "ICP_TRAINING_GLOB", OUTPUTS_GLOB)
+    monkeypatch.setattr(icpClassifier, "_model_trained_at", None)
+
+
+def test_agent_lines_are_not_scored():
+    text = counterpart_text(_sample(1))
+    assert "Georgia Senate Bill 68" not in text
+    assert "It's Dale speaking" in text
+
+
+def test_repeated_pain_point_takes_local_path_on_sample():
+    # Call 4: the recipient talks about compliance three times and names no other segment's concern
+    result = classify_icp_locally(_sample(4))
+    assert result["segment"] == "Retail-Enterprise"
+    assert result["path"] == "keywords"
+    assert result["confidence"] >= ICP_LOCAL_MIN_CONFIDENCE
+
+
+def test_sample_without_counterpart_clues_falls_back_to_llm():
+    # Call 1: the called party never mentions a title, an industry or a pain point
+    assert classify_icp_locally(_sample(1))["confidence"] < ICP_LOCAL_MIN_CONFIDENCE
+
+
+def test_title_and_industry_from_called_party():
+    transcript = "Assistant: Hi, who am I speaking with?\nYou: I'm the plant manager at our factory. Downtime is our problem."
+    result = classify_icp_locally(transcript)
+    assert result["segment"] == "Manufacturing-Enterprise"
+    assert result["confidence"] >= ICP_LOCAL_MIN_CONFIDENCE
+
+
+def test_industry_named_only_by_agent_is_ignored():
+    transcript = "Assistant: We work with hospitals and retail chains.\nYou: Okay, what is this about?"
+    assert classify_icp_locally(transcript)["confidence"] < ICP_LOCAL_MIN_CONFIDENCE
+
+
+def test_single_pain_point_mention_is_not_enough():
+    transcript = "Assistant: Hi.\nYou: Compliance isn't in today."
+    assert classify_icp_locally(transcript)["confidence"] < ICP_LOCAL_MIN_CONFIDENCE
+
+
+def test_legacy_outputs_count_as_llm_labels():
+    examples = load_training_examples(OUTPUTS_GLOB)
+    assert len(examples) == 4
+    assert {segment for segment, _ in examples} == {"Retail-Enterprise"}
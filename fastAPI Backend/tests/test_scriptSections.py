@@ -0,0 +1,95 @@
+import pytest
+
+from utils.scriptSections import (
+    ScriptSectionError, flagged_sections, parse_improved_sections, parse_script,
+    splice_improved_sections, validate_splice
+)
+
+SCRIPT = """[Identity]
+You are Arison, calling on behalf of the compliance team.
+
+<SECTION 1; type='opening' id='open_1'>
+  Hi, this is Arison. Do you have a minute?
+</SECTION 1>
+
+<SECTION 2; type='objection' id='obj_1' category='bad-timing'>
+  I understand, when would be a better time?
+</SECTION 2>
+
+<SECTION 3; type='close' id='close_1'>
+  Would Tuesday at 10 work for a short call?
+</SECTION 3>
+"""
+
+IMPROVED = """Before:
+<SECTION 2; type='objection' id='obj_1' category='bad-timing'>
+I understand, when would be a better time?
+</SECTION 2>
+After:
+<SECTION 2; type='objection' id='obj_1' category='bad-timing'>
+Totally fair. Could I take thirty seconds now, or is later today better?
+</SECTION 2>
+"""
+
+
+def test_parse_renders_back_to_the_original():
+    model = parse_script(SCRIPT)
+    assert model.render() == SCRIPT
+    assert [section.number for section in model.sections] == [1, 2, 3]
+    assert model.section(2).attributes == {"type": "objection", "id": "obj_1", "category": "bad-timing"}
+
+
+def test_duplicate_section_numbers_are_rejected():
+    with pytest.raises(ScriptSectionError):
+        parse_script(SCRIPT + "<SECTION 1; id='open_2'>again</SECTION 1>")
+
+
+def test_only_after_blocks_are_applied():
+    assert list(parse_improved_sections(IMPROVED)) == [2]
+
+
+def test_splice_replaces_only_the_improved_section():
+    rebuilt, report = splice_improved_sections(SCRIPT, IMPROVED)
+    assert report == {"updated": [2], "unchanged": [], "unknown": []}
+
+    original, spliced = parse_script(SCRIPT), parse_script(rebuilt)
+    assert spliced.section(2).body == "\n  Totally fair. Could I take thirty seconds now, or is later today better?\n"
+    assert spliced.section(2).header == original.section(2).header
+    for number in (1, 3):
+        assert spliced.section(number).render() == original.section(number).render()
+    assert rebuilt.replace(spliced.section(2).body, original.section(2).body) == SCRIPT
+
+
+def test_unknown_sections_are_reported_not_added():
+    _, report = splice_improved_sections(SCRIPT, "After:\n<SECTION 9; id='x'>new</SECTION 9>")
+    assert report["unknown"] == [9]
+
+
+def test_validate_splice_rejects_changes_outside_updated_sections():
+    with pytest.raises(ScriptSectionError, match="Text outside the sections"):
+        validate_splice(SCRIPT, SCRIPT.replace("[Identity]", "[Persona]"), [])
+
+    changed_body = SCRIPT.replace("Tuesday at 10", "Wednesday at 10")
+    with pytest.raises(ScriptSectionError, match="Section 3 changed"):
+        validate_splice(SCRIPT, changed_body, [2])
+    validate_splice(SCRIPT, changed_body, [3])
+
+    with pytest.raises(ScriptSectionError, match="Section 1 tags changed"):
+        validate_splice(SCRIPT, SCRIPT.replace("id='open_1'", "id='open_9'"), [1])
+
+
+def test_flagged_sections_keeps_only_needs_improvement():
+    analysis = """## Section Analysis
+### Section 1: Opening (open_1)
+Status: EFFECTIVE
+
+### Section 2: Objection 1 (obj_1)
+Status: NEEDS IMPROVEMENT
+Prospects hang up after this line.
+
+## Overall Recommendations
+Shorten the opening.
+"""
+    flagged = flagged_sections(analysis)
+    assert list(flagged) == [2]
+    assert flagged[2].endswith("Prospects hang up after this line.")
@@ -0,0 +1,59 @@
+from utils.transcriptWindows import merge_window_extractions, split_into_windows, split_speaker_utterances
+
+
+def _window(*texts, outcome="Rejected"):
+    return {
+        "call_session": {"session_id": "call_transcript_1", "outcome": outcome, "product_focus": "compliance"},
+        "participants": [{"name": "Arison", "role": "Agent"}],
+        "dialogue_turns": [{"turn_number": i, "speaker_name": "Arison", "text": text, "turn_type": "Opening"}
+                           for i, text in enumerate(texts, start=1)]
+    }
+
+
+def _texts(merged):
+    return [turn["text"] for turn in merged["dialogue_turns"]]
+
+
+def test_overlap_turns_are_dropped_once():
+    merged = merge_window_extractions([_window("1", "2", "3", "4", "5"), _window("4", "5", "6", "7")], [0, 2])
+    assert _texts(merged) == ["1", "2", "3", "4", "5", "6", "7"]
+    assert [turn["turn_number"] for turn in merged["dialogue_turns"]] == list(range(1, 8))
+
+
+def test_merged_overlap_turn_does_not_lose_the_next_turn():
+    # The model joined the two repeated utterances into one turn
+    merged = merge_window_extractions([_window("1", "2", "3", "4", "5"), _window("4 5", "6", "7")], [0, 2])
+    assert _texts(merged) == ["1", "2", "3", "4", "5", "6", "7"]
+
+
+def test_split_overlap_turn_is_dropped_entirely():
+    # The model split a repeated utterance into two turns
+    merged = merge_window_extractions(
+        [_window("one", "two", "three four"), _window("three", "four", "five")], [0, 1]
+    )
+    assert _texts(merged) == ["one", "two", "three four", "five"]
+
+
+def test_repeated_wording_after_the_overlap_is_kept():
+    merged = merge_window_extractions([_window("Hello", "Yes.", "Who is this?"), _window("Who is this?", "Yes.")], [0, 1])
+    assert _texts(merged) == ["Hello", "Yes.", "Who is this?", "Yes."]
+
+
+def test_paraphrased_overlap_is_kept_and_logged(capsys):
+    merged = merge_window_extractions([_window("1", "2", "3"), _window("two and three, reworded", "4")], [0, 2])
+    assert _texts(merged) == ["1", "2", "3", "two and three, reworded", "4"]
+    assert "WARNING" in capsys.readouterr().out
+
+
+def test_outcome_comes_from_the_last_window():
+    merged = merge_window_extractions([_window("1", outcome="Rejected"), _window("2", outcome="Meeting Scheduled")], [0, 0])
+    assert merged["call_session"]["outcome"] == "Meeting Scheduled"
+    assert len(merged["participants"]) == 1
+
+
+def test_windows_report_their_overlap():
+    transcript = "\n".join(f"{'Assistant' if i % 2 == 0 else 'You'}: line {i} " + "x" * 40 for i in range(12))
+    windows = split_into_windows(transcript, 200, 2)
+    assert windows[0]["overlap"] == 0
+    assert all(window["overlap"] == 2 for window in windows[1:])
+    assert split_speaker_utterances(transcript)[1] == ("You", "line 1 " + "x" * 40)
@@ -0,0 +1,263 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# --- Script analysis run store settings ---
+ANALYSIS_RUNS_PATH = os.getenv("ANALYSIS_RUNS_PATH", "/home/GraphRAG/cache/analysis_runs.sqlite3")
+# Runs older than this are deleted when a new run is created
+ANALYSIS_RUNS_RETENTION_SECONDS = float(os.getenv("ANALYSIS_RUNS_RETENTION_SECONDS", str(30 * 24 * 3600)))
+
+# The steps of graphRAG.script_analysis, in order (same names as workflow_steps_completed)
+ANALYSIS_STEPS = [
+    "call_data_fetch",
+    "script_analysis",
+    "reference_extraction",
+    "claude_improvement",
+    "script_rebuild",
+    "vapi_update"
+]
+
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _connect():
+    global _initialized
+    os.makedirs(os.path.dirname(ANALYSIS_RUNS_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(ANALYSIS_RUNS_PATH, timeout=30)
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS analysis_runs (
+                    run_id TEXT PRIMARY KEY,
+                    vapi_script TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    failed_step TEXT,
+                    error TEXT,
+                    result TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """)
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS analysis_run_steps (
+                    run_id TEXT NOT NULL,
+                    step TEXT NOT NULL,
+                    output TEXT NOT NULL,
+                    duration_seconds REAL,
+                    completed_at REAL NOT NULL,
+                    PRIMARY KEY (run_id, step)
+                )
+                """)
+                # Inputs of each completed run: same script, same calls and same settings = same outcome
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS analysis_fingerprints (
+                    script_hash TEXT NOT NULL,
+                    max_session_num INTEGER NOT NULL,
+                    settings TEXT NOT NULL,
+                    run_id TEXT NOT NULL,
+                    completed_at REAL NOT NULL,
+                    PRIMARY KEY (script_hash, max_session_num, settings)
+                )
+                """)
+                # Named state carried from one run to the next (e.g. the incremental insight state)
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS analysis_state (
+                    name TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """)
+                conn.commit()
+                _initialized = True
+    return conn
+
+
+# ==============================================================================
+# RUNS
+# ==============================================================================
+def create_run(vapi_script):
+    """
+    Registers a new script analysis run and returns its run ID.
+    """
+    run_id = uuid.uuid4().hex
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT INTO analysis_runs (run_id, vapi_script, status, created_at, updated_at) VALUES (?, ?, 'running', ?, ?)",
+            (run_id, vapi_script, now, now)
+        )
+        # Drop old runs so the store does not grow without bound
+        expired = now - ANALYSIS_RUNS_RETENTION_SECONDS
+        conn.execute("DELETE FROM analysis_run_steps WHERE run_id IN (SELECT run_id FROM analysis_runs WHERE updated_at < ?)", (expired,))
+        conn.execute("DELETE FROM analysis_runs WHERE updated_at < ?", (expired,))
+        conn.execute("DELETE FROM analysis_fingerprints WHERE completed_at < ?", (expired,))
+        conn.commit()
+    finally:
+        conn.close()
+    return run_id
+
+
+def update_run(run_id, status, failed_step=None, error=None, result=None):
+    """
+    Sets the status of a run (running / completed / failed) and, when finished, its result.
+    """
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE analysis_runs SET status = ?, failed_step = ?, error = ?, result = ?, updated_at = ? WHERE run_id = ?",
+            (status, failed_step, error, json.dumps(result) if result is not None else None, time.time(), run_id)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def save_step_output(run_id, step, output, duration_seconds=None):
+    """
+    Persists the output of a completed step so a resumed run can skip it.
+    """
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO analysis_run_steps (run_id, step, output, duration_seconds, completed_at) VALUES (?, ?, ?, ?, ?)",
+            (run_id, step, json.dumps(output), duration_seconds, time.time())
+        )
+        conn.execute("UPDATE analysis_runs SET updated_at = ? WHERE run_id = ?", (time.time(), run_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_run(run_id, include_outputs=True):
+    """
+    Returns the run with the outputs of its completed steps, or None if the run is unknown.
+    """
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT run_id, vapi_script, status, failed_step, error, result, created_at, updated_at FROM analysis_runs WHERE run_id = ?",
+            (run_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        steps = conn.execute(
+            "SELECT step, output, duration_seconds, completed_at FROM analysis_run_steps WHERE run_id = ?", (run_id,)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    completed = {step: {"output": json.loads(output), "duration_seconds": duration, "completed_at": completed_at}
+                 for step, output, duration, completed_at in steps}
+    run = {
+        "run_id": row[0],
+        "status": row[2],
+        "failed_step": row[3],
+        "error": row[4],
+        "result": json.loads(row[5]) if row[5] else None,
+        "created_at": row[6],
+        "updated_at": row[7],
+        "steps": {
+            step: "completed" if step in completed else ("failed" if step == row[3] else "pending")
+            for step in ANALYSIS_STEPS
+        },
+        "next_step": first_incomplete_step(completed)
+    }
+    if include_outputs:
+        run["vapi_script"] = row[1]
+        run["outputs"] = {step: data["output"] for step, data in completed.items()}
+        run["durations"] = {step: data["duration_seconds"] for step, data in completed.items()}
+    return run
+
+
+def first_incomplete_step(completed_steps):
+    """
+    Returns the first step of ANALYSIS_STEPS without a persisted output, or None.
+    """
+    for step in ANALYSIS_STEPS:
+        if step not in completed_steps:
+            return step
+    return None
+
+
+# ==============================================================================
+# INPUT FINGERPRINTS
+# ==============================================================================
+def script_hash(vapi_script):
+    return hashlib.sha256(vapi_script.encode("utf-8")).hexdigest()
+
+
+def save_fingerprint(vapi_script, max_session_num, settings, run_id):
+    """
+    Records that `run_id` analyzed this exact script with calls up to `max_session_num`.
+    """
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO analysis_fingerprints (script_hash, max_session_num, settings, run_id, completed_at) VALUES (?, ?, ?, ?, ?)",
+            (script_hash(vapi_script), max_session_num, settings, run_id, time.time())
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def find_fingerprint(vapi_script, max_session_num, settings):
+    """
+    Returns the run ID of the latest completed run with the same inputs, or None.
+    """
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT run_id FROM analysis_fingerprints WHERE script_hash = ? AND max_session_num = ? AND settings = ?",
+            (script_hash(vapi_script), max_session_num, settings)
+        ).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+# ==============================================================================
+# STATE CARRIED BETWEEN RUNS
+# ==============================================================================
+def load_analysis_state(name):
+    """
+    Returns the saved state called `name`, or None.
+    """
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT state FROM analysis_state WHERE name = ?", (name,)).fetchone()
+    finally:
+        conn.close()
+    return json.loads(row[0]) if row else None
+
+
+def save_analysis_state(name, state):
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO analysis_state (name, state, updated_at) VALUES (?, ?, ?)",
+            (name, json.dumps(state), time.time())
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def clear_analysis_state(name):
+    conn = _connect()
+    try:
+        conn.execute("DELETE FROM analysis_state WHERE name = ?", (name,))
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from utils.graphConnection import get_graph_connection, run_in_transaction
+from utils.sessionSequence import allocate_session_ids
+from utils.callTranscriptKG import prepare_transcript, write_dialogue_flow, get_output_path
+from utils.callCounters import crossed_thresholds
+from utils.thresholdNotifier import notify_threshold_crossings, shutdown_threshold_notifier
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Default number of transcripts extracted by the LLM at the same time
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+# Default number of calls written to Neo4j per transaction
+BATCH_GROUP_SIZE = int(os.getenv("BATCH_GROUP_SIZE", "10"))
+# The only server-side folder (and its subfolders) the API may read transcripts from
+BATCH_INGEST_ROOT = os.getenv("BATCH_INGEST_ROOT", "/home/GraphRAG/call transcripts")
+
+
+def load_transcripts_from_directory(directory):
+    """
+    Reads every .txt transcript in a directory (e.g. "call transcripts/"),
+    in natural order so that "call 2.txt" comes before "call 10.txt".
+    """
+    def natural_key(name):
+        return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", name)]
+
+    file_names = sorted((f for f in os.listdir(directory) if f.endswith(".txt")), key=natural_key)
+    transcripts = []
+    for file_name in file_names:
+        with open(os.path.join(directory, file_name), "r", encoding="utf-8") as f:
+            transcripts.append(f.read())
+    return transcripts
+
+
+def resolve_ingest_directory(directory):
+    """
+    Returns the real path of `directory` if it lies inside BATCH_INGEST_ROOT (relative
+    paths are taken from the root). Raises ValueError for anything outside it.
+    """
+    root = os.path.realpath(BATCH_INGEST_ROOT)
+    path = os.path.realpath(os.path.join(root, directory))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"Directory must be inside the ingest root ({BATCH_INGEST_ROOT}).")
+    if not os.path.isdir(path):
+        raise ValueError(f"Directory not found: {directory}")
+    return path
+
+
+def _write_group(graph, group):
+    """
+    Writes a group of (session_id, prepared call) pairs in one transaction.
+    Returns the thresholds crossed by the calls of the group.
+    """
+    def work(tx):
+        return [write_dialogue_flow(tx, item["validated_data"], item["quality_report"]) for _, item in group]
+
+    written = run_in_transaction(graph, work)
+    return [crossing for call in written for crossing in crossed_thresholds(call["counters"])]
+
+
+def _ingestion_failure(item, error):
+    session_id = item["validated_data"].call_session.session_id
+    error_message = f"[{session_id}] STEP 5 FAILED: Graph ingestion failed. Error: {str(error)}"
+    print(error_message)
+    return {"status": False, "message": error_message, "step_failed": "graph_ingestion"}
+
+
+# ==============================================================================
+# MAIN BATCH WORKFLOW
+# ==============================================================================
+def ingest_transcripts_batch(transcripts, max_concurrency=BATCH_MAX_CONCURRENCY, group_size=BATCH_GROUP_SIZE):
+    """
+    Ingests many transcripts at once:
+      1. reserves one block of session IDs up front,
+      2. runs the LLM extraction steps concurrently (at most `max_concurrency` at a time),
+      3. writes the successful calls to Neo4j in transactions of `group_size` calls.
+    If a group transaction fails, its calls are retried one by one so a single bad
+    call does not fail the whole group.
+
+    Returns a summary with per-call results, per-step failure counts and throughput.
+    """
+    start_time = time.perf_counter()
+
+    if not transcripts:
+        return {"total": 0, "succeeded": 0, "failed": 0, "failures_by_step": {},
+                "elapsed_seconds": 0.0, "transcripts_per_minute": 0.0, "threshold_crossings": [], "results": []}
+
+    graph = get_graph_connection(1)
+    api_key = os.getenv("OPENAI_API_KEY")
+
+    session_ids = allocate_session_ids(graph, len(transcripts))
+    print(f"Reserved session IDs {session_ids[0]}-{session_ids[-1]} for {len(transcripts)} transcripts.")
+
+    # STEP 1: Concurrent extraction, validation, classification and scoring
+    def prepare(args):
+        transcript_text, session_id = args
+        # An unexpected error is reported under the step that was running when it was raised
+        # ("preparation" when it happened between steps, e.g. creating the audit folder)
+        running = {"step": "preparation"}
+
+        def track(step, status):
+            running["step"] = step if status == "running" else "preparation"
+
+        try:
+            return prepare_transcript(api_key, transcript_text, session_id, get_output_path(session_id), on_step=track)
+        except Exception as e:
+            return {"status": False, "message": f"[call_transcript_{session_id}] Preparation failed during '{running['step']}'. Error: {str(e)}",
+                    "step_failed": running["step"]}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        prepared = list(executor.map(prepare, zip(transcripts, session_ids)))
+
+    results = {}
+    ready = []
+    for session_id, item in zip(session_ids, prepared):
+        if item.get("status"):
+            ready.append((session_id, item))
+        else:
+            results[session_id] = item
+
+    # STEP 2: Grouped graph writes
+    group_size = max(1, group_size)
+    crossings = []
+    for i in range(0, len(ready), group_size):
+        group = ready[i:i + group_size]
+        try:
+            crossings.extend(_write_group(graph, group))
+            written = group
+        except Exception as e:
+            print(f"Group transaction failed ({str(e)}). Retrying {len(group)} calls individually.")
+            written = []
+            for pair in group:
+                try:
+                    crossings.extend(_write_group(graph, [pair]))
+                    written.append(pair)
+                except Exception as item_error:
+                    results[pair[0]] = _ingestion_failure(pair[1], item_error)
+
+        for session_id, item in written:
+            call_session_id = item["validated_data"].call_session.session_id
+            results[session_id] = {
+                "status": True,
+                "message": f"[{call_session_id}] Full processing complete successfully.",
+                "session_id": call_session_id,
+                "quality_score": item["quality_report"]["final_score"]
+            }
+
+    ordered_results = [results[session_id] for session_id in session_ids]
+    elapsed_seconds = time.perf_counter() - start_time
+    failures_by_step = Counter(r["step_failed"] for r in ordered_results if not r.get("status"))
+    succeeded = sum(1 for r in ordered_results if r.get("status"))
+
+    summary = {
+        "total": len(transcripts),
+        "succeeded": succeeded,
+        "failed": len(transcripts) - succeeded,
+        "failures_by_step": dict(failures_by_step),
+        "elapsed_seconds": round(elapsed_seconds, 2),
+        "transcripts_per_minute": round(len(transcripts) / elapsed_seconds * 60, 2) if elapsed_seconds else 0.0,
+        "threshold_crossings": crossings,
+        "results": ordered_results
+    }
+    if crossings:
+        notify_threshold_crossings(crossings)
+    print(f"Batch finished: {succeeded}/{len(transcripts)} succeeded in {summary['elapsed_seconds']}s "
+          f"({summary['transcripts_per_minute']} transcripts/min).")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-ingest call transcripts into the calls graph.")
+    parser.add_argument("directory", help="Folder of .txt transcripts, e.g. 'call transcripts/'")
+    parser.add_argument("--concurrency", type=int, default=BATCH_MAX_CONCURRENCY, help="Concurrent LLM extractions")
+    parser.add_argument("--group-size", type=int, default=BATCH_GROUP_SIZE, help="Calls written per Neo4j transaction")
+    args = parser.parse_args()
+
+    summary = ingest_transcripts_batch(
+        load_transcripts_from_directory(args.directory),
+        max_concurrency=args.concurrency,
+        group_size=args.group_size
+    )
+    print(json.dumps({k: v for k, v in summary.items() if k != "results"}, indent=2))
+    shutdown_threshold_notifier(wait=True)
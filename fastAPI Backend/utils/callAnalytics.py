@@ -0,0 +1,324 @@
+import argparse
+import json
+import os
+from collections import defaultdict
+from utils.graphConnection import get_graph_connection
+from utils.sessionSequence import get_max_session_num
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Number of most recent calls summarized for script analysis
+ANALYSIS_WINDOW_CALLS = int(os.getenv("ANALYSIS_WINDOW_CALLS", "1000"))
+# Number of most recent calls also passed as full dialogues, for tone and wording
+ANALYSIS_SAMPLE_CALLS = int(os.getenv("ANALYSIS_SAMPLE_CALLS", "5"))
+# Representative objection/response pairs kept per objection category and result (scheduled / not)
+ANALYSIS_EXAMPLES_PER_GROUP = int(os.getenv("ANALYSIS_EXAMPLES_PER_GROUP", "1"))
+# Example texts are cut to this many characters so the summary size stays bounded
+ANALYSIS_EXAMPLE_CHARS = 300
+# How many turns before the end of a call count as "preceding" its outcome
+PRECEDING_TURNS = 3
+
+MEETING_OUTCOME = "Meeting Scheduled"
+
+# Objection categories, aligned with the objection sections of the VAPI script.
+# The first category with a matching keyword wins; anything else is "other".
+OBJECTION_CATEGORIES = [
+    {"name": "send-information", "keywords": ["send me", "send it", "send over", "brochure", "website", "materials"]},
+    {"name": "we-have-a-solution", "keywords": ["already have", "already using", "already work", "in place", "we have a", "vendor", "provider", "handled"]},
+    {"name": "not-interested", "keywords": ["not interested", "no thanks", "no thank you", "don't need", "do not need"]},
+    {"name": "bad-timing", "keywords": ["busy", "bad time", "not a good time", "call back", "later", "in a meeting"]},
+    {"name": "email-privacy-concern", "keywords": ["email", "e-mail"]},
+    {"name": "phone-privacy-concern", "keywords": ["phone", "cell", "number", "who gave you", "how did you get"]},
+    {"name": "information-privacy-concern", "keywords": ["privacy", "personal information", "information", "data"]},
+]
+
+# Cypher expression mapping an objection turn `o` to its category
+_CATEGORY_EXPRESSION = """
+coalesce(head([c IN $categories WHERE any(k IN c.keywords WHERE toLower(o.text) CONTAINS k) | c.name]), 'other')
+"""
+
+_WINDOW_MATCH = """
+MATCH (cs:CallSession)
+WHERE cs.session_num >= $from_session AND cs.session_num <= $to_session
+"""
+
+
+# ==============================================================================
+# 1. CYPHER AGGREGATES OVER A WINDOW OF CALLS
+# ==============================================================================
+OVERVIEW_QUERY = _WINDOW_MATCH + """
+RETURN count(cs) AS calls,
+       count(cs.quality_score) AS scored_calls,
+       sum(cs.quality_score) AS quality_score_sum,
+       sum(CASE WHEN cs.outcome = $meeting THEN 1 ELSE 0 END) AS meetings
+"""
+
+OUTCOMES_BY_SEGMENT_QUERY = _WINDOW_MATCH + """
+RETURN coalesce(cs.matched_icp_segment, 'General') AS segment, cs.outcome AS outcome, count(*) AS calls
+"""
+
+OBJECTIONS_QUERY = _WINDOW_MATCH + """
+MATCH (o:CustomerObjection)-[:RAISED_IN]->(cs)
+WITH cs, """ + _CATEGORY_EXPRESSION + """ AS category, count(o) AS mentions
+RETURN category, cs.outcome AS outcome, count(cs) AS calls, sum(mentions) AS mentions
+"""
+
+PRECEDING_TURN_TYPES_QUERY = _WINDOW_MATCH + f"""
+MATCH (last)-[:RAISED_IN]->(cs)
+WHERE NOT EXISTS {{ (last)-[:NEXT]->() }}
+MATCH (turn)-[:NEXT*0..{PRECEDING_TURNS - 1}]->(last)
+RETURN cs.outcome = $meeting AS scheduled, labels(turn)[0] AS turn_type, count(*) AS turns
+"""
+
+EXAMPLES_QUERY = _WINDOW_MATCH + """
+MATCH (o:CustomerObjection)-[:RAISED_IN]->(cs)
+OPTIONAL MATCH (r)-[:RESPONDS_TO]->(o)
+WITH cs, o, r, """ + _CATEGORY_EXPRESSION + """ AS category
+ORDER BY cs.quality_score DESC, cs.session_num DESC
+WITH category, cs.outcome = $meeting AS scheduled,
+     collect({session_id: cs.session_id, outcome: cs.outcome, objection: o.text, response: r.text})[0..$per_group] AS examples
+RETURN category, scheduled, examples
+"""
+
+
+# session_num of the `last_n`-th most recent call at or before $to_session, read from the
+# session_num index. Session numbers can have gaps (failed ingestions, deleted calls), so
+# the lower bound of the window cannot be computed from the upper one.
+WINDOW_START_QUERY = """
+MATCH (cs:CallSession)
+WHERE cs.session_num IS NOT NULL AND cs.session_num <= $to_session
+RETURN cs.session_num AS session_num
+ORDER BY cs.session_num DESC
+SKIP $skip
+LIMIT 1
+"""
+
+
+def resolve_window(graph, last_n=ANALYSIS_WINDOW_CALLS, from_session=None, to_session=None):
+    """
+    Returns the (from_session, to_session) session_num range to analyze: an explicit range,
+    or the last `last_n` calls.
+    """
+    if to_session is None:
+        to_session = get_max_session_num(graph)
+    if from_session is None:
+        result = graph.query(WINDOW_START_QUERY, params={"to_session": to_session, "skip": max(0, last_n - 1)})
+        # Fewer than last_n calls: the window starts at the first one
+        from_session = result[0]["session_num"] if result else 1
+    return from_session, to_session
+
+
+def _rate(part, total):
+    return round(part / total, 3) if total else 0.0
+
+
+def _cut(text):
+    if text is None:
+        return None
+    text = " ".join(str(text).split())
+    return text if len(text) <= ANALYSIS_EXAMPLE_CHARS else text[:ANALYSIS_EXAMPLE_CHARS] + "..."
+
+
+def compute_call_analytics(graph, last_n=ANALYSIS_WINDOW_CALLS, from_session=None, to_session=None):
+    """
+    Aggregates a window of calls in Cypher: outcome distribution, outcomes per ICP
+    segment, objection categories with the outcome of the calls they occurred in,
+    turn types in the last turns of scheduled vs. other calls, and a few representative
+    objection/response examples. The result size depends only on the number of
+    categories, segments and turn types, not on the number of calls.
+    """
+    from_session, to_session = resolve_window(graph, last_n, from_session, to_session)
+    params = {
+        "from_session": from_session,
+        "to_session": to_session,
+        "meeting": MEETING_OUTCOME,
+        "categories": OBJECTION_CATEGORIES,
+        "per_group": ANALYSIS_EXAMPLES_PER_GROUP
+    }
+
+    overview = graph.query(OVERVIEW_QUERY, params=params)[0]
+
+    # Outcomes per segment
+    segments = defaultdict(lambda: {"calls": 0, "outcomes": defaultdict(int)})
+    for row in graph.query(OUTCOMES_BY_SEGMENT_QUERY, params=params):
+        segments[row["segment"]]["calls"] += row["calls"]
+        segments[row["segment"]]["outcomes"][row["outcome"]] += row["calls"]
+
+    # Objection categories and the outcome of the calls they appeared in
+    objections = defaultdict(lambda: {"calls": 0, "mentions": 0, "outcomes": defaultdict(int)})
+    for row in graph.query(OBJECTIONS_QUERY, params=params):
+        category = objections[row["category"]]
+        category["calls"] += row["calls"]
+        category["mentions"] += row["mentions"]
+        category["outcomes"][row["outcome"]] += row["calls"]
+
+    # Turn types in the last PRECEDING_TURNS turns: scheduled calls vs. the rest
+    preceding = defaultdict(lambda: {"scheduled": 0, "other": 0})
+    for row in graph.query(PRECEDING_TURN_TYPES_QUERY, params=params):
+        preceding[row["turn_type"]]["scheduled" if row["scheduled"] else "other"] += row["turns"]
+
+    examples = defaultdict(list)
+    for row in graph.query(EXAMPLES_QUERY, params=params):
+        for example in row["examples"]:
+            examples[row["category"]].append({
+                "session_id": example["session_id"],
+                "outcome": example["outcome"],
+                "objection": _cut(example["objection"]),
+                "response": _cut(example["response"])
+            })
+
+    return _build_analytics(
+        from_session, to_session, overview["calls"], overview["meetings"],
+        overview["quality_score_sum"] or 0, overview["scored_calls"],
+        segments, objections, preceding, examples
+    )
+
+
+def _build_analytics(from_session, to_session, calls, meetings, quality_score_sum, scored_calls,
+                     segments, objections, preceding, examples):
+    # Raw counts are kept next to the rates so two windows can be merged (merge_call_analytics)
+    outcomes = defaultdict(int)
+    for data in segments.values():
+        for outcome, count in data["outcomes"].items():
+            outcomes[outcome] += count
+
+    scheduled_total = sum(v["scheduled"] for v in preceding.values())
+    other_total = sum(v["other"] for v in preceding.values())
+
+    return {
+        "window": {"from_session": from_session, "to_session": to_session},
+        "calls": calls,
+        "meetings": meetings,
+        "meeting_rate": _rate(meetings, calls),
+        "avg_quality_score": round(quality_score_sum / scored_calls, 1) if scored_calls else None,
+        "quality_score_sum": quality_score_sum,
+        "scored_calls": scored_calls,
+        "outcomes": dict(outcomes),
+        "segments": {
+            name: {
+                "calls": data["calls"],
+                "meeting_rate": _rate(data["outcomes"].get(MEETING_OUTCOME, 0), data["calls"]),
+                "outcomes": dict(data["outcomes"])
+            }
+            for name, data in sorted(segments.items(), key=lambda item: -item[1]["calls"])
+        },
+        "objections": {
+            name: {
+                "calls": data["calls"],
+                "share_of_calls": _rate(data["calls"], calls),
+                "mentions": data["mentions"],
+                "meeting_rate_after": _rate(data["outcomes"].get(MEETING_OUTCOME, 0), data["calls"]),
+                "outcomes": dict(data["outcomes"])
+            }
+            for name, data in sorted(objections.items(), key=lambda item: -item[1]["calls"])
+        },
+        "turn_types_before_outcome": {
+            turn_type: {
+                "share_in_scheduled": _rate(counts["scheduled"], scheduled_total),
+                "share_in_other": _rate(counts["other"], other_total),
+                "scheduled_turns": counts["scheduled"],
+                "other_turns": counts["other"]
+            }
+            for turn_type, counts in sorted(preceding.items(), key=lambda item: -item[1]["scheduled"])
+        },
+        "examples": dict(examples)
+    }
+
+
+def merge_call_analytics(previous, new):
+    """
+    Combines the analytics of two consecutive windows into the analytics of both, so
+    running totals can be kept without re-aggregating calls that were already counted.
+    The newest examples of each category are kept first.
+    """
+    if not previous:
+        return new
+    if not new or not new["calls"]:
+        return previous
+
+    segments = defaultdict(lambda: {"calls": 0, "outcomes": defaultdict(int)})
+    objections = defaultdict(lambda: {"calls": 0, "mentions": 0, "outcomes": defaultdict(int)})
+    preceding = defaultdict(lambda: {"scheduled": 0, "other": 0})
+    examples = defaultdict(list)
+
+    for analytics in (previous, new):
+        for name, data in analytics["segments"].items():
+            segments[name]["calls"] += data["calls"]
+            for outcome, count in data["outcomes"].items():
+                segments[name]["outcomes"][outcome] += count
+        for name, data in analytics["objections"].items():
+            objections[name]["calls"] += data["calls"]
+            objections[name]["mentions"] += data["mentions"]
+            for outcome, count in data["outcomes"].items():
+                objections[name]["outcomes"][outcome] += count
+        for turn_type, data in analytics["turn_types_before_outcome"].items():
+            preceding[turn_type]["scheduled"] += data.get("scheduled_turns", 0)
+            preceding[turn_type]["other"] += data.get("other_turns", 0)
+
+    for analytics in (new, previous):
+        for category, category_examples in analytics["examples"].items():
+            examples[category].extend(category_examples)
+    examples = {category: items[:2 * ANALYSIS_EXAMPLES_PER_GROUP] for category, items in examples.items()}
+
+    return _build_analytics(
+        previous["window"]["from_session"], new["window"]["to_session"],
+        previous["calls"] + new["calls"], previous["meetings"] + new["meetings"],
+        previous.get("quality_score_sum", 0) + new.get("quality_score_sum", 0),
+        previous.get("scored_calls", 0) + new.get("scored_calls", 0),
+        segments, objections, preceding, examples
+    )
+
+
+# ==============================================================================
+# 2. BOUNDED-SIZE PROMPT SUMMARY
+# ==============================================================================
+def _distribution(counts):
+    return ", ".join(f"{name} {count}" for name, count in sorted(counts.items(), key=lambda item: -item[1]))
+
+
+def format_call_analytics(analytics):
+    """
+    Renders the analytics as a compact text block for the analysis prompt.
+    """
+    window = analytics["window"]
+    lines = [
+        f"Window: sessions {window['from_session']}-{window['to_session']} ({analytics['calls']} calls)",
+        f"Meetings scheduled: {analytics['meetings']} ({analytics['meeting_rate']:.1%}); "
+        f"average quality score: {analytics['avg_quality_score']}",
+        f"Outcomes: {_distribution(analytics['outcomes'])}",
+        "",
+        "Outcomes per ICP segment:"
+    ]
+    for name, data in analytics["segments"].items():
+        lines.append(f"- {name}: {data['calls']} calls, meeting rate {data['meeting_rate']:.1%} ({_distribution(data['outcomes'])})")
+
+    lines += ["", "Objections (category: calls with it, share of calls, meeting rate of those calls, outcomes):"]
+    for name, data in analytics["objections"].items():
+        lines.append(f"- {name}: {data['calls']} calls ({data['share_of_calls']:.1%}), meeting rate {data['meeting_rate_after']:.1%} "
+                     f"({_distribution(data['outcomes'])})")
+
+    lines += ["", f"Turn types in the last {PRECEDING_TURNS} turns (share in '{MEETING_OUTCOME}' calls vs. other calls):"]
+    for turn_type, data in analytics["turn_types_before_outcome"].items():
+        lines.append(f"- {turn_type}: {data['share_in_scheduled']:.1%} vs {data['share_in_other']:.1%}")
+
+    lines += ["", "Representative objections and agent responses:"]
+    for category, examples in analytics["examples"].items():
+        for example in examples:
+            lines.append(f"- [{category}] {example['session_id']} ({example['outcome']}): "
+                         f"customer: \"{example['objection']}\" / agent: \"{example['response'] or 'no direct response'}\"")
+
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate objection and outcome statistics over a window of calls.")
+    parser.add_argument("--last", type=int, default=ANALYSIS_WINDOW_CALLS, help="Number of most recent calls")
+    parser.add_argument("--from-session", type=int, default=None)
+    parser.add_argument("--to-session", type=int, default=None)
+    parser.add_argument("--text", action="store_true", help="Print the prompt summary instead of JSON")
+    args = parser.parse_args()
+
+    analytics = compute_call_analytics(get_graph_connection(1), args.last, args.from_session, args.to_session)
+    print(format_call_analytics(analytics) if args.text else json.dumps(analytics, indent=2))
@@ -0,0 +1,145 @@
+import json
+import os
+from utils.graphConnection import get_graph_connection
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# --- Analysis thresholds ---
+# Number of new calls (since the last acknowledged analysis) that triggers a script analysis
+ANALYSIS_THRESHOLD = int(os.getenv("ANALYSIS_THRESHOLD", "50"))
+# Optional per-segment overrides, e.g. SEGMENT_THRESHOLDS='{"Healthcare-Enterprise": 20}'
+SEGMENT_THRESHOLDS = json.loads(os.getenv("SEGMENT_THRESHOLDS", "{}"))
+
+GLOBAL_COUNTER_NAME = "global"
+
+
+# ==============================================================================
+# 1. WRITE SIDE - RUN INSIDE THE INGESTION TRANSACTION
+# ==============================================================================
+# Bumps the materialized global call counter. The first time it is created it is
+# seeded from the CallSession label count (served from the count store, so O(1));
+# the "- 1" accounts for the session this same transaction just created.
+# The first increment at or past the threshold since the last acknowledgement records
+# its count in notified_at_count, in the same transaction, so exactly one call reports
+# the crossing even when the counter was seeded above the threshold.
+INCREMENT_CALL_COUNTER_QUERY = """
+MERGE (c:CallCounter {name: $counter_name})
+ON CREATE SET c.count = COUNT { (:CallSession) } - 1
+SET c.count = c.count + 1
+SET c.notified_at_count = coalesce(
+    c.notified_at_count,
+    CASE WHEN c.count - coalesce(c.acknowledged_count, 0) >= $threshold THEN c.count END
+)
+RETURN c.count AS count, coalesce(c.acknowledged_count, 0) AS acknowledged_count,
+       c.notified_at_count AS notified_at_count
+"""
+
+
+def segment_threshold(segment):
+    return int(SEGMENT_THRESHOLDS.get(segment, ANALYSIS_THRESHOLD))
+
+
+def _crossed(counter):
+    # The increment that recorded notified_at_count is the only one whose count equals it
+    return counter.get("notified_at_count") is not None and counter["notified_at_count"] == counter["count"]
+
+
+def crossed_thresholds(counters):
+    """
+    Given the counter values returned by the ingestion transaction
+    ({"global": {...}, "segment": {...} or None}), returns the thresholds this call crossed.
+    Counter updates are serialized by Neo4j and every increment gets its own count, so
+    exactly one call sees each crossing until the counter is acknowledged.
+    """
+    crossings = []
+
+    global_counter = counters.get("global")
+    if global_counter and _crossed(global_counter):
+        crossings.append({
+            "scope": "global",
+            "segment": None,
+            "threshold": ANALYSIS_THRESHOLD,
+            "count": global_counter["count"]
+        })
+
+    segment_counter = counters.get("segment")
+    if segment_counter:
+        threshold = segment_threshold(segment_counter["segment"])
+        if _crossed(segment_counter):
+            crossings.append({
+                "scope": "segment",
+                "segment": segment_counter["segment"],
+                "threshold": threshold,
+                "count": segment_counter["count"]
+            })
+
+    return crossings
+
+
+# ==============================================================================
+# 2. READ SIDE - CONSTANT TIME, ONLY COUNTER NODES ARE TOUCHED
+# ==============================================================================
+def read_counters(graph):
+    """
+    Returns the global counter and the per-segment counters with their thresholds.
+    Only the CallCounter node and the (handful of) IdealTargetCustomer nodes are read,
+    so the cost does not depend on how many calls are in the graph.
+    """
+    global_rows = graph.query("""
+    OPTIONAL MATCH (c:CallCounter {name: $counter_name})
+    RETURN coalesce(c.count, COUNT { (:CallSession) }) AS count,
+           coalesce(c.acknowledged_count, 0) AS acknowledged_count
+    """, params={"counter_name": GLOBAL_COUNTER_NAME})
+
+    segment_rows = graph.query("""
+    MATCH (ic:IdealTargetCustomer)
+    RETURN ic.segment AS segment,
+           coalesce(ic.completed_call_count, 0) AS count,
+           coalesce(ic.acknowledged_call_count, 0) AS acknowledged_count
+    ORDER BY segment
+    """)
+
+    def describe(row, threshold):
+        since = row["count"] - row["acknowledged_count"]
+        return {
+            "count": row["count"],
+            "acknowledged_count": row["acknowledged_count"],
+            "since_last_analysis": since,
+            "threshold": threshold,
+            "threshold_met": since >= threshold
+        }
+
+    return {
+        "global": describe(global_rows[0], ANALYSIS_THRESHOLD),
+        "segments": {row["segment"]: describe(row, segment_threshold(row["segment"])) for row in segment_rows}
+    }
+
+
+def acknowledge_counters(graph, segments=None):
+    """
+    Marks the current counts as analyzed: the given segments start counting towards their
+    thresholds again. When `segments` is None every segment and the global counter do;
+    acknowledging specific segments leaves the global progress untouched.
+    """
+    if segments is None:
+        graph.query("""
+        MERGE (c:CallCounter {name: $counter_name})
+        ON CREATE SET c.count = COUNT { (:CallSession) }
+        SET c.acknowledged_count = c.count,
+            c.notified_at_count = null
+        """, params={"counter_name": GLOBAL_COUNTER_NAME})
+
+    graph.query("""
+    MATCH (ic:IdealTargetCustomer)
+    WHERE $segments IS NULL OR ic.segment IN $segments
+    SET ic.acknowledged_call_count = coalesce(ic.completed_call_count, 0),
+        ic.notified_at_count = null
+    """, params={"segments": segments})
+
+    return read_counters(graph)
+
+
+if __name__ == "__main__":
+    print(json.dumps(read_counters(get_graph_connection(1)), indent=2))
@@ -0,0 +1,134 @@
+import argparse
+import json
+import statistics
+import time
+from collections import Counter
+from utils.graphConnection import connect_to_database, NEO4J_DATABASE1
+from utils.graphSchema import ensure_calls_schema, drop_calls_schema
+from utils.graphRAG import LAST_N_CALL_RECORDS_QUERY
+from utils.schemaBenchmark import NEO4J_BENCHMARK_DATABASE, generate_synthetic_calls, _wipe
+
+
+# The call-record query as it was before the subquery rewrite, kept only for comparison.
+# Participants and turns are matched in the same pipeline, so every turn is repeated
+# once per participant before collect(turn).
+LEGACY_LAST_N_CALL_RECORDS_QUERY = """
+    MATCH (cs:CallSession)
+    WITH cs
+    ORDER BY toInteger(split(cs.session_id, '_')[-1]) DESC
+    LIMIT $limit
+    MATCH (p:Person)-[:PARTICIPATED_IN]->(cs)
+    MATCH (turn)-[:RAISED_IN]->(cs)
+    WITH cs, collect(DISTINCT p.name) AS participants, collect(turn) AS turns
+    UNWIND turns AS turn
+    WITH cs, participants, turn
+    ORDER BY turn.turn_number ASC
+    RETURN
+        cs.session_id AS session_id,
+        cs.outcome AS outcome,
+        cs.quality_score AS quality_score,
+        participants,
+        collect({
+            turn_number: turn.turn_number,
+            speaker_name: [(turn)<-[:MADE_BY]-(s:Person) | s.name][0],
+            turn_type: labels(turn)[0],
+            text: turn.text
+        }) AS dialogue_flow
+    ORDER BY toInteger(split(session_id, '_')[-1]) ASC
+"""
+
+
+# ==============================================================================
+# 1. OUTPUT VERIFICATION
+# ==============================================================================
+def find_duplicate_turns(records, turns_per_call=None):
+    """
+    Checks call records for repeated turns or participants and, if `turns_per_call`
+    is given, for calls whose dialogue does not have exactly that many turns.
+    Returns a list of problems (empty when the records are clean).
+    """
+    problems = []
+    for record in records:
+        turn_counts = Counter(turn["turn_number"] for turn in record["dialogue_flow"])
+        repeated = sorted(n for n, count in turn_counts.items() if count > 1)
+        if repeated:
+            problems.append(f"{record['session_id']}: turns repeated {repeated}")
+        if len(set(record["participants"])) != len(record["participants"]):
+            problems.append(f"{record['session_id']}: participants repeated")
+        if turns_per_call is not None and len(turn_counts) != turns_per_call:
+            problems.append(f"{record['session_id']}: {len(turn_counts)} distinct turns, expected {turns_per_call}")
+        turn_numbers = [turn["turn_number"] for turn in record["dialogue_flow"]]
+        if turn_numbers != sorted(turn_numbers):
+            problems.append(f"{record['session_id']}: turns out of order")
+    return problems
+
+
+# ==============================================================================
+# 2. MEASUREMENTS
+# ==============================================================================
+def _measure_query(graph, query, limit, samples):
+    timings_ms = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        records = graph.query(query, params={"limit": limit})
+        timings_ms.append((time.perf_counter() - start) * 1000)
+
+    return records, {
+        "ms_median": round(statistics.median(timings_ms), 2),
+        "payload_bytes": len(json.dumps(records)),
+        "turn_rows": sum(len(record["dialogue_flow"]) for record in records)
+    }
+
+
+def run_call_record_benchmark(database, turn_counts=(10, 40), limits=(10, 100, 1000), samples=10):
+    """
+    For every turns-per-call value, builds a synthetic calls graph in a scratch database
+    and measures the legacy and the subquery call-record query for every limit:
+    median latency, JSON payload size and number of turn rows, plus a deduplication check.
+    The scratch database is wiped before and after the run.
+    """
+    if not database or database == NEO4J_DATABASE1:
+        raise ValueError("Refusing to benchmark against the calls database. Set NEO4J_BENCHMARK_DATABASE to a scratch database.")
+
+    graph = connect_to_database(database)
+    rows = []
+    try:
+        for turns_per_call in turn_counts:
+            _wipe(graph)
+            ensure_calls_schema(graph)
+            generate_synthetic_calls(graph, max(limits), turns_per_call)
+
+            for limit in limits:
+                _, legacy = _measure_query(graph, LEGACY_LAST_N_CALL_RECORDS_QUERY, limit, samples)
+                records, current = _measure_query(graph, LAST_N_CALL_RECORDS_QUERY, limit, samples)
+                problems = find_duplicate_turns(records, turns_per_call)
+
+                rows.append({
+                    "calls": limit,
+                    "turns_per_call": turns_per_call,
+                    "legacy": legacy,
+                    "subquery": current,
+                    "speedup": round(legacy["ms_median"] / current["ms_median"], 1) if current["ms_median"] else None,
+                    "payload_reduction": round(1 - current["payload_bytes"] / legacy["payload_bytes"], 3) if legacy["payload_bytes"] else None,
+                    "deduplicated": not problems,
+                    "problems": problems[:5]
+                })
+                print(f"{limit} calls x {turns_per_call} turns: legacy {legacy['ms_median']} ms / {legacy['payload_bytes']} B, "
+                      f"subquery {current['ms_median']} ms / {current['payload_bytes']} B, deduplicated: {not problems}")
+    finally:
+        _wipe(graph)
+        drop_calls_schema(graph)
+        graph._driver.close()
+
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark and verify the call-record query on synthetic data.")
+    parser.add_argument("--database", default=NEO4J_BENCHMARK_DATABASE, help="Scratch database (wiped!)")
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 40], help="Turns per call to test")
+    parser.add_argument("--limits", type=int, nargs="+", default=[10, 100, 1000], help="Number of calls fetched")
+    parser.add_argument("--samples", type=int, default=10)
+    args = parser.parse_args()
+
+    print(json.dumps(run_call_record_benchmark(args.database, args.turns, args.limits, args.samples), indent=2))
@@ -0,0 +1,87 @@
+import argparse
+import json
+import statistics
+import time
+from utils.graphConnection import get_graph_connection
+from utils.graphRAG import CALL_RECORDS_BY_SESSION_QUERY, LAST_N_CALL_RECORDS_QUERY, fetch_call_records
+
+
+# ==============================================================================
+# 1. REBUILD SNAPSHOTS FOR EXISTING CALLS
+# ==============================================================================
+def rebuild_call_record_snapshots(graph, batch_size=500, overwrite=False):
+    """
+    Writes `record_snapshot` for calls ingested before snapshots existed (or for every
+    call with `overwrite=True`), `batch_size` calls per round trip, in session order.
+    Returns the number of snapshots written.
+    """
+    written = 0
+    last_session_num = -1
+
+    while True:
+        batch = graph.query("""
+        MATCH (cs:CallSession)
+        WHERE cs.session_num > $after AND ($overwrite OR cs.record_snapshot IS NULL)
+        RETURN cs.session_id AS session_id, cs.session_num AS session_num
+        ORDER BY cs.session_num
+        LIMIT $batch_size
+        """, params={"after": last_session_num, "overwrite": overwrite, "batch_size": batch_size})
+
+        if not batch:
+            break
+
+        session_ids = [row["session_id"] for row in batch]
+        records = graph.query(CALL_RECORDS_BY_SESSION_QUERY, params={"session_ids": session_ids})
+        graph.query("""
+        UNWIND $snapshots AS snapshot
+        MATCH (cs:CallSession {session_id: snapshot.session_id})
+        SET cs.record_snapshot = snapshot.record_snapshot
+        """, params={"snapshots": [
+            {"session_id": record["session_id"], "record_snapshot": json.dumps(record)}
+            for record in records
+        ]})
+
+        written += len(records)
+        last_session_num = batch[-1]["session_num"]
+        print(f"Wrote {written} call record snapshots (up to session {last_session_num}).")
+
+    return written
+
+
+# ==============================================================================
+# 2. SNAPSHOT VS GRAPH AGGREGATION TIMING
+# ==============================================================================
+def compare_call_record_reads(graph, limits=(10, 100, 1000), samples=10):
+    """
+    Times the snapshot read (fetch_call_records) against the full graph aggregation
+    for each limit. Read-only.
+    """
+    def median_ms(run):
+        timings = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - start) * 1000)
+        return round(statistics.median(timings), 2)
+
+    return [
+        {
+            "calls": limit,
+            "snapshot_ms_median": median_ms(lambda: fetch_call_records(graph, limit)),
+            "graph_aggregation_ms_median": median_ms(lambda: graph.query(LAST_N_CALL_RECORDS_QUERY, params={"limit": limit}))
+        }
+        for limit in limits
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the per-call record snapshots of the calls graph.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--overwrite", action="store_true", help="Rebuild every snapshot, not only missing ones")
+    parser.add_argument("--compare", action="store_true", help="Afterwards, time snapshot reads against the graph query")
+    args = parser.parse_args()
+
+    graph = get_graph_connection(1)
+    print(f"Snapshots written: {rebuild_call_record_snapshots(graph, args.batch_size, args.overwrite)}")
+    if args.compare:
+        print(json.dumps(compare_call_record_reads(graph), indent=2))
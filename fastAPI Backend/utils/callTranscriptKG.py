@@ -1,8 +1,18 @@
 import json
 from langchain_neo4j import Neo4jGraph
-from utils.graphConnection import get_graph_connection
+from utils.graphConnection import get_graph_connection, run_in_transaction
+from utils.sessionSequence import allocate_session_ids, session_num_from_id
+from utils.transcriptWindows import split_into_windows, merge_window_extractions
+from utils.icpClassifier import classify_icp_locally, ICP_LOCAL_MIN_CONFIDENCE
+from utils.extractionCache import extraction_cache_key, get_cached_extraction, store_extraction
+from utils.callCounters import INCREMENT_CALL_COUNTER_QUERY, GLOBAL_COUNTER_NAME, ANALYSIS_THRESHOLD, crossed_thresholds, segment_threshold
+from utils.thresholdNotifier import notify_threshold_crossings
+from utils.llmCache import cached_llm_call
 import json
 import hashlib
+import time
+from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from typing import List, Literal, Optional
 from openai import OpenAI
 from pydantic import BaseModel, ValidationError
@@ -13,6 +23,30 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
+# Write the whole call in one UNWIND-based transaction instead of one round trip per turn.
+# Set BATCHED_INGESTION=false to fall back to the turn-by-turn ingest_dialogue_flow.
+BATCHED_INGESTION = os.getenv("BATCHED_INGESTION", "true").lower() == "true"
+
+# Part of the extraction cache key. Bump this whenever the NER or ICP prompts
+# (or their models) change, so cached extractions from the old prompts are not reused.
+EXTRACTION_PROMPT_VERSION = "ner-v1+icp-v1+gpt-5-mini"
+
+# Run the NER extraction and the ICP classification LLM calls at the same time.
+# Set PARALLEL_EXTRACTION=false to run them one after the other.
+PARALLEL_EXTRACTION = os.getenv("PARALLEL_EXTRACTION", "true").lower() == "true"
+# One classification per transcript in flight, so the pool defaults to the job queue's KG_WORKERS
+ICP_CLASSIFIER_WORKERS = int(os.getenv("ICP_CLASSIFIER_WORKERS", os.getenv("KG_WORKERS", "4")))
+# Seconds STEP 3 waits for the parallel classification before falling back
+ICP_CLASSIFICATION_TIMEOUT_SECONDS = float(os.getenv("ICP_CLASSIFICATION_TIMEOUT_SECONDS", "60"))
+_icp_executor = ThreadPoolExecutor(max_workers=ICP_CLASSIFIER_WORKERS, thread_name_prefix="icp-classifier")
+
+# Long-transcript mode: transcripts longer than LONG_TRANSCRIPT_CHARS are split into
+# overlapping windows on speaker boundaries and extracted in parallel.
+LONG_TRANSCRIPT_CHARS = int(os.getenv("LONG_TRANSCRIPT_CHARS", "12000"))
+NER_WINDOW_CHARS = int(os.getenv("NER_WINDOW_CHARS", "6000"))
+NER_WINDOW_OVERLAP_UTTERANCES = int(os.getenv("NER_WINDOW_OVERLAP_UTTERANCES", "2"))
+NER_WINDOW_WORKERS = int(os.getenv("NER_WINDOW_WORKERS", "4"))
+
 
 # ==============================================================================
 # 1. THE BULLETPROOF VALIDATOR (PYDANTIC MODELS) - UPDATED
@@ -22,6 +56,7 @@ class CallSession(BaseModel):
     outcome: Literal["Meeting Scheduled", "Rejected", "Gatekeeper Block", "Voicemail", "Follow-up Required", "Wrong Person", "Call Dropped"]
     product_focus: str
     matched_icp_segment: Optional[str] = None
+    icp_classification_path: Optional[str] = None  # keywords / model / llm / cache / no_recipient / timeout
 
 class Participant(BaseModel):
     name: str
@@ -168,18 +203,23 @@ def ingest_dialogue_flow(graph: Neo4jGraph, validated_data: DialogueGraphData, q
     session_query = """
     MERGE (cs:CallSession {session_id: $session_id})
     SET cs += $session_details,
+        cs.session_num = $session_num,
         cs.quality_score = $quality_score,
-        cs.quality_status = $quality_status
+        cs.quality_status = $quality_status,
+        cs.record_snapshot = $record_snapshot
     MERGE (p:Product {name: $product_name})
     MERGE (cs)-[:FOCUSES_ON]->(p)
     """
     graph.query(session_query, params={
         'session_id': validated_data.call_session.session_id,
+        'session_num': session_num_from_id(validated_data.call_session.session_id),
         'session_details': validated_data.call_session.dict(),
         'quality_score': quality_report['final_score'],
         'quality_status': quality_report['status'],
+        'record_snapshot': json.dumps(build_call_record(validated_data, quality_report)),
         'product_name': validated_data.call_session.product_focus
     })
+    counter = graph.query(INCREMENT_CALL_COUNTER_QUERY, params={'counter_name': GLOBAL_COUNTER_NAME, 'threshold': ANALYSIS_THRESHOLD})
     print(f"Ingested CallSession {validated_data.call_session.session_id} with score {quality_report['final_score']}")
 
     # 2. Ensure all participants from the list exist as nodes and are linked to the call
@@ -256,6 +296,185 @@ def ingest_dialogue_flow(graph: Neo4jGraph, validated_data: DialogueGraphData, q
             last_customer_objection_id = current_turn_node_id
 
     print(f"Built dialogue chain for CallSession {validated_data.call_session.session_id}")
+    return counter[0] if counter else None
+
+
+# ==============================================================================
+# 3(B). BATCHED INGESTION - ONE TRANSACTION, UNWIND OVER PRECOMPUTED TURNS
+# ==============================================================================
+def get_recipient(validated_data: DialogueGraphData):
+    """
+    Returns the first participant with the "Recipient" role, or None.
+    """
+    return next((p for p in validated_data.participants if p.role == "Recipient"), None)
+
+
+def build_turn_rows(validated_data: DialogueGraphData):
+    """
+    Precomputes everything the batched ingestion needs from the validated data:
+    one row per turn (in chronological order), the NEXT chain and the
+    Agent_Response -> Customer_Objection links, all expressed as row indexes.
+    """
+    turn_rows = []
+    next_links = []
+    response_links = []
+    last_customer_objection_idx = None
+
+    for idx, turn in enumerate(sorted(validated_data.dialogue_turns, key=lambda x: x.turn_number)):
+        turn_rows.append({
+            'idx': idx,
+            'label': "".join(filter(str.isalnum, turn.turn_type)),
+            'speaker_name': turn.speaker_name,
+            'text': turn.text,
+            'turn_number': turn.turn_number
+        })
+
+        if idx > 0:
+            next_links.append({'from': idx - 1, 'to': idx})
+
+        if turn.turn_type == "Agent_Response" and last_customer_objection_idx is not None:
+            response_links.append({'from': idx, 'to': last_customer_objection_idx})
+            last_customer_objection_idx = None
+
+        if turn.turn_type == "Customer_Objection":
+            last_customer_objection_idx = idx
+
+    return turn_rows, next_links, response_links
+
+
+def build_call_record(validated_data: DialogueGraphData, quality_report: dict):
+    """
+    Builds the compact call record stored on the CallSession as `record_snapshot`.
+    Same shape as a row of LAST_N_CALL_RECORDS_QUERY, so readers can use either.
+    """
+    turn_rows, _, _ = build_turn_rows(validated_data)
+    return {
+        'session_id': validated_data.call_session.session_id,
+        'outcome': validated_data.call_session.outcome,
+        'quality_score': quality_report['final_score'],
+        'participants': list(dict.fromkeys(p.name for p in validated_data.participants)),
+        'dialogue_flow': [
+            {
+                'turn_number': row['turn_number'],
+                'speaker_name': row['speaker_name'],
+                'turn_type': row['label'],
+                'text': row['text']
+            }
+            for row in turn_rows
+        ]
+    }
+
+
+def write_dialogue_flow(tx, validated_data: DialogueGraphData, quality_report: dict):
+    """
+    Writes one call (session, product, participants, turns, NEXT chain and
+    RESPONDS_TO links) using the given transaction, and bumps the global call counter
+    and the segment counter in the same transaction.
+    Returns the number of turns written and the counter values after this call.
+    """
+    session_id = validated_data.call_session.session_id
+
+    # 1. Session, product and participants in a single statement
+    session_query = """
+    MERGE (cs:CallSession {session_id: $session_id})
+    SET cs += $session_details,
+        cs.session_num = $session_num,
+        cs.quality_score = $quality_score,
+        cs.quality_status = $quality_status,
+        cs.record_snapshot = $record_snapshot
+    MERGE (p:Product {name: $product_name})
+    MERGE (cs)-[:FOCUSES_ON]->(p)
+    WITH cs
+    UNWIND $participants AS participant_data
+    MERGE (person:Person {name: participant_data.name})
+    SET person.role = participant_data.role
+    MERGE (person)-[:PARTICIPATED_IN]->(cs)
+    """
+    tx.run(session_query, {
+        'session_id': session_id,
+        'session_num': session_num_from_id(session_id),
+        'session_details': validated_data.call_session.dict(),
+        'quality_score': quality_report['final_score'],
+        'quality_status': quality_report['status'],
+        'record_snapshot': json.dumps(build_call_record(validated_data, quality_report)),
+        'product_name': validated_data.call_session.product_focus,
+        'participants': [p.dict() for p in validated_data.participants]
+    }).consume()
+    global_counter = tx.run(INCREMENT_CALL_COUNTER_QUERY, {'counter_name': GLOBAL_COUNTER_NAME, 'threshold': ANALYSIS_THRESHOLD}).single()
+
+    turn_rows, next_links, response_links = build_turn_rows(validated_data)
+
+    # 2. Turns - one UNWIND per turn type, since labels cannot be parameterized.
+    # This is bounded by the number of turn types, not the length of the call.
+    turn_node_ids = {}
+    for label, rows in groupby(sorted(turn_rows, key=lambda r: r['label']), key=lambda r: r['label']):
+        turn_query = f"""
+        MATCH (cs:CallSession {{session_id: $session_id}})
+        UNWIND $turns AS turn
+        MERGE (speaker:Person {{name: turn.speaker_name}})
+        CREATE (turn_node:{label} {{
+            text: turn.text,
+            turn_number: turn.turn_number
+        }})
+        CREATE (speaker)-[:MADE_BY]->(turn_node)
+        CREATE (turn_node)-[:RAISED_IN]->(cs)
+        RETURN turn.idx AS idx, elementId(turn_node) AS node_id
+        """
+        for record in tx.run(turn_query, {'session_id': session_id, 'turns': list(rows)}):
+            turn_node_ids[record['idx']] = record['node_id']
+
+    # 3. NEXT chain and RESPONDS_TO links, resolved to the element ids created above
+    def resolve(links):
+        return [
+            {'from': turn_node_ids[link['from']], 'to': turn_node_ids[link['to']]}
+            for link in links
+            if link['from'] in turn_node_ids and link['to'] in turn_node_ids
+        ]
+
+    tx.run("""
+    UNWIND $links AS link
+    MATCH (p) WHERE elementId(p) = link.from
+    MATCH (c) WHERE elementId(c) = link.to
+    CREATE (p)-[:NEXT]->(c)
+    """, {'links': resolve(next_links)}).consume()
+
+    tx.run("""
+    UNWIND $links AS link
+    MATCH (r) WHERE elementId(r) = link.from
+    MATCH (o) WHERE elementId(o) = link.to
+    CREATE (r)-[:RESPONDS_TO]->(o)
+    """, {'links': resolve(response_links)}).consume()
+
+    # 4. Link the recipient to its ICP segment now that the Person node exists
+    recipient = get_recipient(validated_data)
+    matched_segment = validated_data.call_session.matched_icp_segment
+    segment_counter = None
+    if recipient and matched_segment and matched_segment != "General":
+        segment_counter = tx.run(LINK_ICP_QUERY, {
+            'recipient_name': recipient.name, 'segment': matched_segment, 'threshold': segment_threshold(matched_segment)
+        }).single()
+
+    return {
+        "turns_written": len(turn_node_ids),
+        "counters": {
+            "global": global_counter.data() if global_counter else None,
+            "segment": segment_counter.data() if segment_counter else None
+        }
+    }
+
+
+def ingest_dialogue_flow_batched(graph: Neo4jGraph, validated_data: DialogueGraphData, quality_report: dict):
+    """
+    Batched version of ingest_dialogue_flow: the whole call (including the
+    recipient's ICP link) is written in one explicit transaction, so it either
+    lands completely or not at all.
+    """
+    written = run_in_transaction(
+        graph, lambda tx: write_dialogue_flow(tx, validated_data, quality_report)
+    )
+    print(f"Ingested CallSession {validated_data.call_session.session_id} with score {quality_report['final_score']} "
+          f"and {written['turns_written']} turns in one transaction")
+    return written
 
 
 # ==============================================================================
@@ -263,34 +482,20 @@ def ingest_dialogue_flow(graph: Neo4jGraph, validated_data: DialogueGraphData, q
 # ==============================================================================
 def get_next_session_id(graph: Neo4jGraph) -> int:
     """
-    Queries the graph to find the highest existing session_id and returns the next number.
-    """
-    query = """
-    MATCH (cs:CallSession)
-    // We extract the numeric part of the session_id
-    WITH toInteger(split(cs.session_id, '_')[-1]) AS session_num
-    RETURN max(session_num) AS max_id
+    Atomically allocates the next session number from the Sequence counter node.
+    Two concurrent callers (e.g. two uvicorn workers) can never receive the same ID.
     """
-    try:
-        result = graph.query(query)
-        if result and result[0]['max_id'] is not None:
-            # If there are existing calls, return the max ID + 1
-            return result[0]['max_id'] + 1
-        else:
-            # If the graph is empty, start at 1
-            return 1
-    except Exception as e:
-        print(f"Could not query for max session ID. Defaulting to 1. Error: {e}")
-        return 1
-    
+    return allocate_session_ids(graph, 1)[0]
+
 
 
 # ==============================================================================
 # 5. FUNCTION TO BUILD THE DIALOGUE FLOW JSON USING THE NER PROMPT
 # ==============================================================================
-def dialogue_flow_ner(apiClient_key, transcript_text):
+def dialogue_flow_ner(apiClient_key, transcript_text, context_note=None):
     """
     Create the dialogue flow of the raw transcript text into the graph.
+    `context_note` is appended to the prompt when only a window of the call is sent.
     """
 
     ner_system_prompt = """You are a master data architect. Your task is to convert a call transcript into a structured JSON object representing the dialogue flow. Follow the schema and definitions with extreme precision.
@@ -408,15 +613,21 @@ Example of a Perfect Output Structure:
     user_prompt = f"""Transcript:
     {transcript_text}
 """
+    if context_note:
+        user_prompt = f"{context_note}\n\n{user_prompt}"
 
     
     client = OpenAI(api_key=apiClient_key)
-    response = client.responses.create(
-        model="gpt-5-mini",
-        instructions=ner_system_prompt,
-        input=user_prompt,
+    output = cached_llm_call(
+        lambda: client.responses.create(
+            model="gpt-5-mini",
+            instructions=ner_system_prompt,
+            input=user_prompt,
+        ),
+        text=lambda response: response.output_text,
+        model="gpt-5-mini", params={}, prompt={"instructions": ner_system_prompt, "input": user_prompt},
+        tag="dialogue_flow_ner"
     )
-    output = response.output_text
     clean_text = re.sub(r"^```json\s*|\s*```$", "", output.strip())
     
     
@@ -424,12 +635,67 @@ Example of a Perfect Output Structure:
     # return json.loads(clean_text)
 
 
+def extract_dialogue_flow(apiClient_key, transcript_text):
+    """
+    Returns the NER JSON text for a transcript. Short transcripts go through a single
+    dialogue_flow_ner call. Long ones are split into overlapping windows on speaker
+    boundaries, extracted in parallel and stitched back into one chronological
+    sequence, so latency follows the longest window and outputs are never truncated.
+    """
+    if len(transcript_text) <= LONG_TRANSCRIPT_CHARS:
+        return dialogue_flow_ner(apiClient_key, transcript_text)
+
+    windows = split_into_windows(transcript_text, NER_WINDOW_CHARS, NER_WINDOW_OVERLAP_UTTERANCES)
+    if len(windows) == 1:
+        return dialogue_flow_ner(apiClient_key, transcript_text)
+
+    print(f"Long transcript ({len(transcript_text)} chars): extracting {len(windows)} windows in parallel.")
+
+    def extract_window(args):
+        index, window = args
+        note = (f"NOTE: This is part {index + 1} of {len(windows)} of a longer call. It may start or end mid-conversation. "
+                f"Only use 'Opening' for the agent's first lines of the whole call and 'Closing' for its final lines. "
+                f"Number the turns of this part starting from 1, with exactly one turn per speaker block, "
+                f"including the first blocks even if they look incomplete.")
+        output = dialogue_flow_ner(apiClient_key, window["text"], context_note=note)
+        try:
+            return json.loads(output)
+        except Exception as e:
+            raise ValueError(f"Window {index + 1}/{len(windows)} returned invalid JSON: {str(e)}")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(NER_WINDOW_WORKERS, len(windows)))) as executor:
+        window_outputs = list(executor.map(extract_window, enumerate(windows)))
+
+    # The first `overlap` turns of each window repeat the end of the previous window
+    merged = merge_window_extractions(window_outputs, [window["overlap"] for window in windows])
+    print(f"Stitched {len(merged['dialogue_turns'])} turns from {len(windows)} windows.")
+    return json.dumps(merged)
+
+
 # ==============================================================================
 # 6. **NEW**: THE ICP CLASSIFIER AND LINKER
 # ==============================================================================
-def classify_and_link_icp(graph, api_key, transcript_text, recipient_name):
+# Links the recipient to its ICP segment and bumps the segment's call counter
+# (notified_at_count works as for INCREMENT_CALL_COUNTER_QUERY)
+LINK_ICP_QUERY = """
+MATCH (p:Person {name: $recipient_name})
+MATCH (ic:IdealTargetCustomer {segment: $segment})
+MERGE (p)-[:MATCHES_PROFILE]->(ic)
+SET ic.completed_call_count = coalesce(ic.completed_call_count, 0) + 1
+SET ic.notified_at_count = coalesce(
+    ic.notified_at_count,
+    CASE WHEN ic.completed_call_count - coalesce(ic.acknowledged_call_count, 0) >= $threshold THEN ic.completed_call_count END
+)
+RETURN ic.segment AS segment, ic.completed_call_count AS count,
+       coalesce(ic.acknowledged_call_count, 0) AS acknowledged_count,
+       ic.notified_at_count AS notified_at_count
+"""
+
+
+def classify_icp_segment(api_key, transcript_text):
     """
-    Classifies a transcript against existing ICPs in the graph and links the recipient.
+    Classifies a transcript into one of the ICP segments (or "General") using the LLM.
+    Does not touch the graph, so it can run before the call is ingested.
     """
 
     # Step A: Classify the transcript using the LLM
@@ -475,25 +741,58 @@ Rules:
     """
 
     client = OpenAI(api_key=api_key)
-    response = client.responses.create(
-        model="gpt-5-mini",
-        instructions=system_classification_prompt,
-        input=user_prompt,
+    matched_segment = cached_llm_call(
+        lambda: client.responses.create(
+            model="gpt-5-mini",
+            instructions=system_classification_prompt,
+            input=user_prompt,
+        ),
+        text=lambda response: response.output_text,
+        model="gpt-5-mini", params={}, prompt={"instructions": system_classification_prompt, "input": user_prompt},
+        tag="classify_icp_segment"
     )
-    matched_segment = response.output_text
     
     print(f"LLM classified recipient profile as: {matched_segment}")
+    return matched_segment
 
-    # Step B: Create the relationship in the graph and increment the counter
+
+def classify_icp(api_key, transcript_text):
+    """
+    Classifies a transcript into an ICP segment, trying the in-process keyword/model
+    classifier first and only calling the LLM when it is not confident enough.
+
+    Returns {"segment": ..., "path": "keywords" | "model" | "llm", "confidence": float or None}.
+    """
+    local = classify_icp_locally(transcript_text)
+    if local and local["segment"] and local["confidence"] >= ICP_LOCAL_MIN_CONFIDENCE:
+        print(f"Local classifier ({local['path']}) matched '{local['segment']}' with confidence {local['confidence']}")
+        return {"segment": local["segment"], "path": local["path"], "confidence": local["confidence"]}
+
+    return {"segment": classify_icp_segment(api_key, transcript_text), "path": "llm", "confidence": None}
+
+
+def link_recipient_to_icp(graph, recipient_name, matched_segment):
+    """
+    Creates the MATCHES_PROFILE relationship and increments the segment's call counter.
+    Returns the segment counter after the update. "General" calls are not linked to any segment.
+    """
     if matched_segment != "General":
-        link_query = """
-        MATCH (p:Person {name: $recipient_name})
-        MATCH (ic:IdealTargetCustomer {segment: $segment})
-        MERGE (p)-[:MATCHES_PROFILE]->(ic)
-        SET ic.completed_call_count = coalesce(ic.completed_call_count, 0) + 1
-        """
-        graph.query(link_query, params={'recipient_name': recipient_name, 'segment': matched_segment})
+        result = graph.query(LINK_ICP_QUERY, params={
+            'recipient_name': recipient_name, 'segment': matched_segment, 'threshold': segment_threshold(matched_segment)
+        })
         print(f"Linked '{recipient_name}' to '{matched_segment}' and incremented counter.")
+        return result[0] if result else None
+    return None
+
+
+def classify_and_link_icp(graph, api_key, transcript_text, recipient_name):
+    """
+    Classifies a transcript against existing ICPs in the graph and links the recipient.
+    """
+    matched_segment = classify_icp_segment(api_key, transcript_text)
+
+    # Step B: Create the relationship in the graph and increment the counter
+    link_recipient_to_icp(graph, recipient_name, matched_segment)
         
     return matched_segment
 
@@ -501,24 +800,128 @@ Rules:
 # ==============================================================================
 # FINAL MAIN WORKFLOW FUNCTION - UPDATED WITH YOUR IDEA
 # ==============================================================================
-def process_single_transcript(graph, api_key, raw_transcript_text, session_id, path):
+
+# Every step of process_single_transcript, in order. These are the same names
+# returned in "step_failed" when a step fails.
+PIPELINE_STEPS = [
+    "extraction",
+    "json_parsing",
+    "validation",
+    "speaker_normalization",
+    "icp_enrichment",
+    "quality_scoring",
+    "graph_ingestion"
+]
+
+
+def _report_step(on_step, step, status):
+    """
+    Forwards a step transition ("running" / "completed") to the optional on_step callback.
+    Failures are reported by the caller through the "step_failed" field of the result.
+    """
+    if on_step is not None:
+        on_step(step, status)
+
+
+def _step_reporter(on_step, timings_ms):
+    """
+    Returns a report(step, status) function that forwards to on_step and records
+    how long each step took (in ms) into timings_ms.
+    """
+    started = {}
+
+    def report(step, status):
+        if status == "running":
+            started[step] = time.perf_counter()
+        elif step in started:
+            timings_ms[step] = round((time.perf_counter() - started.pop(step)) * 1000, 2)
+        _report_step(on_step, step, status)
+
+    return report
+
+
+def _timed_classification(api_key, transcript_text, timings_ms):
+    start = time.perf_counter()
+    try:
+        return classify_icp(api_key, transcript_text)
+    finally:
+        timings_ms["icp_classification"] = round((time.perf_counter() - start) * 1000, 2)
+
+
+def _discard_classification(icp_future):
+    """
+    Drops a parallel ICP classification whose result will not be used (failed extraction
+    or no recipient). A classification that already started still finishes in its worker.
+    """
+    if icp_future is not None:
+        icp_future.cancel()
+
+
+def _join_classification(icp_future, api_key, transcript_text, timings_ms, session_id):
+    """
+    Waits up to ICP_CLASSIFICATION_TIMEOUT_SECONDS for the parallel classification.
+    One still queued behind other transcripts' classifications runs inline instead;
+    one stuck in its LLM call is abandoned and the call is classified as "General".
+    """
+    try:
+        return icp_future.result(timeout=ICP_CLASSIFICATION_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        if icp_future.cancel():
+            print(f"[call_transcript_{session_id}] ICP classification still queued after {ICP_CLASSIFICATION_TIMEOUT_SECONDS}s. Classifying inline.")
+            return _timed_classification(api_key, transcript_text, timings_ms)
+        print(f"[call_transcript_{session_id}] ICP classification timed out after {ICP_CLASSIFICATION_TIMEOUT_SECONDS}s. Segment set to 'General'.")
+        return {"segment": "General", "path": "timeout", "confidence": None}
+
+
+def prepare_transcript(api_key, raw_transcript_text, session_id, path, on_step=None):
+    """
+    Runs every step that does not write to Neo4j: extraction, parsing, validation,
+    speaker normalization, ICP classification and scoring.
+
+    Returns {"status": True, "validated_data": ..., "quality_report": ...} on success,
+    or the usual {"status": False, "message": ..., "step_failed": ...} dict on failure.
+    """
     
+    # Identical transcripts (e.g. n8n retries after a timeout) reuse the cached LLM output
+    cache_key = extraction_cache_key(raw_transcript_text, EXTRACTION_PROMPT_VERSION)
+    cached = get_cached_extraction(cache_key)
+
+    timings_ms = {}
+    report = _step_reporter(on_step, timings_ms)
+
+    # The ICP classification only needs the raw transcript, so in parallel mode it
+    # starts now and runs while the NER call below is in flight. Its result is
+    # joined in STEP 3 (and discarded if extraction fails or the call has no recipient).
+    icp_future = None
+    if PARALLEL_EXTRACTION and not (cached and cached["icp_segment"]):
+        icp_future = _icp_executor.submit(_timed_classification, api_key, raw_transcript_text, timings_ms)
+
     # STEP 1: EXTRACT (LLM Call 1 - The Heavy Lifter)
     try:
-        llm_output = dialogue_flow_ner(api_key, raw_transcript_text)
+        report("extraction", "running")
+        if cached:
+            llm_output = cached["llm_output"]
+            print(f"[call_transcript_{session_id}] Extraction cache hit. Skipping NER LLM call.")
+        else:
+            llm_output = extract_dialogue_flow(api_key, raw_transcript_text)
+        report("extraction", "completed")
     except Exception as e:
         error_message = f"[call_transcript_{session_id}] STEP 1 FAILED: Could not extract dialogue flow from transcript. Error: {str(e)}"
         print(error_message)
+        _discard_classification(icp_future)
         return {"status": False, "message": error_message, "step_failed": "extraction"}
     
     # Inject the correct sequential ID
     try:
+        report("json_parsing", "running")
         data = json.loads(llm_output)
         data['call_session']['session_id'] = f"call_transcript_{session_id}"
         llm_output_json_with_id = json.dumps(data)
+        report("json_parsing", "completed")
     except Exception as e:
         error_message = f"[call_transcript_{session_id}] STEP 1 FAILED: Could not parse LLM output as JSON. Error: {str(e)}"
         print(error_message)
+        _discard_classification(icp_future)
         return {"status": False, "message": error_message, "step_failed": "json_parsing"}
 
     # Save raw LLM output to a file for auditing
@@ -533,19 +936,24 @@ def process_single_transcript(graph, api_key, raw_transcript_text, session_id, p
 
     # STEP 2(A): VALIDATE the initial structure
     try:
+        report("validation", "running")
         validated_data = DialogueGraphData.parse_raw(llm_output_json_with_id)
         print(f"[{validated_data.call_session.session_id}] Initial Pydantic Validation SUCCESSFUL.")
+        report("validation", "completed")
     except ValidationError as e:
         error_message = f"[call_transcript_{session_id}] STEP 2 FAILED: Pydantic validation failed. Error: {str(e)}"
         print(error_message)
+        _discard_classification(icp_future)
         return {"status": False, "message": error_message, "step_failed": "validation"}
     except Exception as e:
         error_message = f"[call_transcript_{session_id}] STEP 2 FAILED: Unexpected error during validation. Error: {str(e)}"
         print(error_message)
+        _discard_classification(icp_future)
         return {"status": False, "message": error_message, "step_failed": "validation"}
     
     # STEP 2(B): NORMALIZE SPEAKER NAMES
     try:
+        report("speaker_normalization", "running")
         participant_names = {p.name.lower().strip(): p.name for p in validated_data.participants}
         for turn in validated_data.dialogue_turns:
             norm = turn.speaker_name.lower().strip()
@@ -555,26 +963,55 @@ def process_single_transcript(graph, api_key, raw_transcript_text, session_id, p
                 print(f"WARNING: Speaker '{turn.speaker_name}' not found in participants "
                       f"for session '{validated_data.call_session.session_id}' "
                       f"(turn {turn.turn_number})")
+        report("speaker_normalization", "completed")
     except Exception as e:
         error_message = f"[{validated_data.call_session.session_id}] STEP 2 FAILED: Speaker name normalization failed. Error: {str(e)}"
         print(error_message)
+        _discard_classification(icp_future)
         return {"status": False, "message": error_message, "step_failed": "speaker_normalization"}
 
-    # STEP 3: **NEW** - CLASSIFY and ENRICH the validated data object
+    # STEP 3: CLASSIFY and ENRICH the validated data object.
+    # The recipient is linked to the segment at ingestion time, once its Person node exists.
     try:
-        recipient = next((p for p in validated_data.participants if p.role == "Recipient"), None)
+        report("icp_enrichment", "running")
+        recipient = get_recipient(validated_data)
+        matched_segment = None
+        icp_classification = None
         if recipient:
-            # This function returns the name of the matched segment (e.g., "Healthcare-Enterprise")
-            matched_segment = classify_and_link_icp(graph, api_key, raw_transcript_text, recipient.name)
+            # This returns the matched segment (e.g., "Healthcare-Enterprise") and how it was decided
+            if cached and cached["icp_segment"]:
+                icp_classification = {"segment": cached["icp_segment"], "path": "cache", "confidence": None}
+            elif icp_future is not None:
+                icp_classification = _join_classification(icp_future, api_key, raw_transcript_text, timings_ms, session_id)
+            else:
+                icp_classification = _timed_classification(api_key, raw_transcript_text, timings_ms)
+            matched_segment = icp_classification["segment"]
             
-            # We add the result directly to our data object.
+            # We add the result directly to our data object. The path tells the local
+            # classifier which labels came from the LLM and can be trained on.
             validated_data.call_session.matched_icp_segment = matched_segment
+            validated_data.call_session.icp_classification_path = icp_classification["path"]
             print(f"[{validated_data.call_session.session_id}] Data enriched with ICP segment: '{matched_segment}'")
+        else:
+            # Without a recipient there is no profile to classify
+            _discard_classification(icp_future)
+            matched_segment = "General"
+            icp_classification = {"segment": matched_segment, "path": "no_recipient", "confidence": None}
+            validated_data.call_session.matched_icp_segment = matched_segment
+            validated_data.call_session.icp_classification_path = icp_classification["path"]
+            print(f"[{validated_data.call_session.session_id}] No recipient extracted. ICP classification skipped, segment set to 'General'.")
+        report("icp_enrichment", "completed")
     except Exception as e:
         error_message = f"[{validated_data.call_session.session_id}] STEP 3 FAILED: ICP classification and enrichment failed. Error: {str(e)}"
         print(error_message)
         return {"status": False, "message": error_message, "step_failed": "icp_enrichment"}
 
+    # Only outputs that passed validation and classification are cached. A timed-out
+    # classification is not, so a retry of the same transcript classifies it again.
+    cached_segment = None if icp_classification["path"] == "timeout" else matched_segment
+    if not cached or (cached_segment and not cached["icp_segment"]):
+        store_extraction(cache_key, llm_output, cached_segment)
+
     # Save enriched data to a file for auditing
     try:
         with open(f"{path}/call_transcript_{session_id}_enriched.json", "w") as f:
@@ -587,8 +1024,10 @@ def process_single_transcript(graph, api_key, raw_transcript_text, session_id, p
 
     # STEP 4: SCORE the now-enriched, clean data
     try:
+        report("quality_scoring", "running")
         quality_report = score_dialogue_extraction(validated_data)
         print(f"[{validated_data.call_session.session_id}] Quality Score Calculated: {quality_report['final_score']}")
+        report("quality_scoring", "completed")
     except Exception as e:
         error_message = f"[{validated_data.call_session.session_id}] STEP 4 FAILED: Quality scoring failed. Error: {str(e)}"
         print(error_message)
@@ -604,9 +1043,43 @@ def process_single_transcript(graph, api_key, raw_transcript_text, session_id, p
         print(error_message)
         # Continue processing even if file save fails
 
+    return {
+        "status": True,
+        "validated_data": validated_data,
+        "quality_report": quality_report,
+        "extraction_cache": "hit" if cached else "miss",
+        "icp_classification": icp_classification,
+        "timings_ms": timings_ms
+    }
+
+
+def process_single_transcript(graph, api_key, raw_transcript_text, session_id, path, on_step=None):
+
+    # STEPS 1-4: EXTRACT, VALIDATE, CLASSIFY and SCORE (no graph writes)
+    prepared = prepare_transcript(api_key, raw_transcript_text, session_id, path, on_step=on_step)
+    if not prepared.get("status"):
+        return prepared
+
+    validated_data = prepared["validated_data"]
+    quality_report = prepared["quality_report"]
+    timings_ms = prepared["timings_ms"]
+    report = _step_reporter(on_step, timings_ms)
+
     # STEP 5: INGEST the final, enriched data
     try:
-        ingest_dialogue_flow(graph, validated_data, quality_report)
+        report("graph_ingestion", "running")
+        ingest_start = time.perf_counter()
+        if BATCHED_INGESTION:
+            counters = ingest_dialogue_flow_batched(graph, validated_data, quality_report)["counters"]
+        else:
+            counters = {"global": ingest_dialogue_flow(graph, validated_data, quality_report), "segment": None}
+            recipient = get_recipient(validated_data)
+            if recipient and validated_data.call_session.matched_icp_segment:
+                counters["segment"] = link_recipient_to_icp(graph, recipient.name, validated_data.call_session.matched_icp_segment)
+        ingest_latency_ms = round((time.perf_counter() - ingest_start) * 1000, 2)
+        print(f"[{validated_data.call_session.session_id}] Graph write latency: {ingest_latency_ms} ms "
+              f"({'batched' if BATCHED_INGESTION else 'turn-by-turn'})")
+        report("graph_ingestion", "completed")
     except Exception as e:
         error_message = f"[{validated_data.call_session.session_id}] STEP 5 FAILED: Graph ingestion failed. Error: {str(e)}"
         print(error_message)
@@ -619,7 +1092,12 @@ def process_single_transcript(graph, api_key, raw_transcript_text, session_id, p
         "status": True, 
         "message": message,
         "session_id": validated_data.call_session.session_id,
-        "quality_score": quality_report['final_score']
+        "quality_score": quality_report['final_score'],
+        "ingest_latency_ms": ingest_latency_ms,
+        "extraction_cache": prepared["extraction_cache"],
+        "icp_classification": prepared["icp_classification"],
+        "threshold_crossings": crossed_thresholds(counters),
+        "timings_ms": timings_ms
     }
     return result
 
@@ -628,7 +1106,21 @@ def process_single_transcript(graph, api_key, raw_transcript_text, session_id, p
 # MAIN EXECUTION BLOCK
 # ==============================================================================
 
-def construct_graph(call_transcript):
+# Audit files (raw / enriched / quality report) are written under this folder, one sub-folder per call
+CALL_OUTPUTS_DIR = "/home/GraphRAG/call outputs"
+
+
+def get_output_path(session_id):
+    """
+    Returns (and creates if needed) the audit folder for a call.
+    """
+    path = f"{CALL_OUTPUTS_DIR}/call_{session_id}"
+    if not os.path.exists(path):
+        os.makedirs(path)
+    return path
+
+
+def construct_graph(call_transcript, on_step=None):
 
     try:
         graph = get_graph_connection(1)
@@ -645,13 +1137,15 @@ def construct_graph(call_transcript):
     print(f"\n--- Processing Transcript # {current_session_id} ---")
 
     # create seprate path to save outputs
-    path = f"/home/GraphRAG/call outputs/call_{current_session_id}"
-    if not os.path.exists(path):
-        os.makedirs(path)
+    path = get_output_path(current_session_id)
 
-    result = process_single_transcript(graph, OPENAI_API_KEY, call_transcript, current_session_id, path)
+    result = process_single_transcript(graph, OPENAI_API_KEY, call_transcript, current_session_id, path, on_step=on_step)
     print(f"Result: {result}")
 
+    # Push an event the moment this call crosses a threshold (instead of waiting for a poll)
+    if result.get("threshold_crossings"):
+        notify_threshold_crossings(result["threshold_crossings"])
+
     return result
 
 if __name__ == "__main__":
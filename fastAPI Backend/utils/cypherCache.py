@@ -0,0 +1,380 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from fastapi import HTTPException
+from langchain_openai import ChatOpenAI
+from utils.graphConnection import get_graph_connection, run_read_query
+from utils.llmCache import cached_llm_call
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+# --- Question-to-Cypher cache settings ---
+CYPHER_CACHE_PATH = os.getenv("CYPHER_CACHE_PATH", "/home/GraphRAG/cache/cypher_cache.sqlite3")
+CYPHER_GENERATION_MODEL = os.getenv("CYPHER_GENERATION_MODEL", "gpt-5-mini")
+# How long the schema version is trusted before the labels/types/keys are read again
+SCHEMA_VERSION_TTL_SECONDS = float(os.getenv("SCHEMA_VERSION_TTL_SECONDS", "300"))
+# Rows returned by a natural-language query
+NL_QUERY_MAX_ROWS = int(os.getenv("NL_QUERY_MAX_ROWS", "200"))
+
+# Early rejection of Cypher that writes; every query also runs in a read transaction, which the
+# server enforces. Keywords used as property names (n.set), labels (:Create) or map keys are allowed.
+WRITE_CLAUSE_PATTERN = re.compile(
+    r"(?<![.:$])\b(CREATE|MERGE|DELETE|DETACH|SET|REMOVE|DROP|LOAD\s+CSV|FOREACH|GRANT|DENY|REVOKE)\b(?!\s*:)|\bCALL\s+(apoc|db|dbms|gds)\.",
+    re.IGNORECASE
+)
+# String literals and backticked names are blanked before the check ('Delete account' is not a clause)
+LITERAL_PATTERN = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`")
+NUMBER_PATTERN = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+CYPHER_GENERATION_PROMPT = """Task: Generate a Cypher statement to query a Neo4j graph database.
+Instructions:
+Use only the node labels, relationship types and properties in the schema.
+Do not use any other relationship types or properties that are not provided.
+Only read data: never use CREATE, MERGE, SET, DELETE, REMOVE or DROP.
+Schema:
+{schema}
+Note: Do not include any explanations or apologies in your responses.
+Do not respond to any questions that might ask anything else than for you to construct a Cypher statement.
+Do not include any text except the generated Cypher statement.
+
+The question is:
+{question}"""
+
+# Templates registered in code (see register_template); templates pinned through the API override them
+_builtin_templates = {}
+_stats = {"pinned_hits": 0, "cached_hits": 0, "misses": 0, "generations": 0, "validation_failures": 0}
+_stats_lock = threading.Lock()
+_init_lock = threading.Lock()
+_initialized = False
+_schema_version = {"value": None, "checked_at": 0.0}
+
+
+def _connect():
+    global _initialized
+    os.makedirs(os.path.dirname(CYPHER_CACHE_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(CYPHER_CACHE_PATH, timeout=30)
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS cypher_cache (
+                    normalized_question TEXT NOT NULL,
+                    schema_version TEXT NOT NULL,
+                    cypher TEXT NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (normalized_question, schema_version)
+                )
+                """)
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS cypher_templates (
+                    question_pattern TEXT PRIMARY KEY,
+                    cypher TEXT NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL
+                )
+                """)
+                conn.commit()
+                _initialized = True
+    return conn
+
+
+def _count(stat, amount=1):
+    with _stats_lock:
+        _stats[stat] += amount
+
+
+# ==============================================================================
+# 1. QUESTION NORMALIZATION AND SCHEMA VERSION
+# ==============================================================================
+def normalize_question(question):
+    """
+    Lowercases the question and strips punctuation and extra whitespace, so trivially
+    different phrasings of the same question share a cache entry.
+    """
+    text = re.sub(r"[^\w\s.$]", " ", question.lower())
+    text = re.sub(r"(?<!\d)\.|\.(?!\d)", " ", text)
+    return " ".join(text.split())
+
+
+def question_pattern(question):
+    """
+    Returns (pattern, params): the normalized question with every number replaced by
+    $num1, $num2, ... and the numbers themselves. Pinned templates match on the pattern,
+    so "last 10 calls" and "last 25 calls" use the same Cypher with a different $num1.
+    """
+    params = {}
+
+    def placeholder(match):
+        name = f"num{len(params) + 1}"
+        value = match.group(0)
+        params[name] = float(value) if "." in value else int(value)
+        return f"${name}"
+
+    return NUMBER_PATTERN.sub(placeholder, normalize_question(question)), params
+
+
+def get_schema_version(graph, force=False):
+    """
+    Returns a short hash of the labels, relationship types and property keys of the
+    graph. Cached for SCHEMA_VERSION_TTL_SECONDS; the three procedure calls are cheap.
+    """
+    now = time.time()
+    if not force and _schema_version["value"] and now - _schema_version["checked_at"] < SCHEMA_VERSION_TTL_SECONDS:
+        return _schema_version["value"]
+
+    labels = sorted(row["label"] for row in graph.query("CALL db.labels() YIELD label RETURN label"))
+    types = sorted(row["relationshipType"] for row in graph.query("CALL db.relationshipTypes() YIELD relationshipType RETURN relationshipType"))
+    keys = sorted(row["propertyKey"] for row in graph.query("CALL db.propertyKeys() YIELD propertyKey RETURN propertyKey"))
+    payload = json.dumps({"labels": labels, "types": types, "keys": keys})
+    _schema_version.update(value=hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16], checked_at=now)
+    return _schema_version["value"]
+
+
+# ==============================================================================
+# 2. PINNED TEMPLATES
+# ==============================================================================
+def register_template(question, cypher):
+    """
+    Registers a built-in template for a question (numbers become $num1, $num2, ...).
+    """
+    _builtin_templates[question_pattern(question)[0]] = cypher
+
+
+def pin_template(question, cypher):
+    """
+    Pins a hand-tuned Cypher template for a question. It is used instead of generated
+    Cypher for every schema version until it is unpinned.
+    """
+    validate_cypher(cypher)
+    pattern = question_pattern(question)[0]
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO cypher_templates (question_pattern, cypher, hits, created_at) VALUES (?, ?, 0, ?)",
+            (pattern, cypher, time.time())
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return pattern
+
+
+def unpin_template(question):
+    """
+    Removes a pinned template. Returns True if one existed.
+    """
+    pattern = question_pattern(question)[0]
+    conn = _connect()
+    try:
+        deleted = conn.execute("DELETE FROM cypher_templates WHERE question_pattern = ?", (pattern,)).rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    return bool(deleted)
+
+
+def list_templates():
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT question_pattern, cypher, hits, created_at FROM cypher_templates ORDER BY hits DESC").fetchall()
+    finally:
+        conn.close()
+    pinned = [{"question_pattern": p, "cypher": c, "hits": h, "created_at": t, "source": "pinned"} for p, c, h, t in rows]
+    builtin = [{"question_pattern": p, "cypher": c, "source": "builtin"} for p, c in _builtin_templates.items()]
+    return pinned + builtin
+
+
+def _find_template(pattern):
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT cypher FROM cypher_templates WHERE question_pattern = ?", (pattern,)).fetchone()
+        if row is not None:
+            conn.execute("UPDATE cypher_templates SET hits = hits + 1 WHERE question_pattern = ?", (pattern,))
+            conn.commit()
+            return row[0]
+    finally:
+        conn.close()
+    return _builtin_templates.get(pattern)
+
+
+# ==============================================================================
+# 3. GENERATED CYPHER CACHE
+# ==============================================================================
+def _find_cached(normalized, schema_version):
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT cypher FROM cypher_cache WHERE normalized_question = ? AND schema_version = ?",
+            (normalized, schema_version)
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE cypher_cache SET hits = hits + 1, last_used = ? WHERE normalized_question = ? AND schema_version = ?",
+                (time.time(), normalized, schema_version)
+            )
+            conn.commit()
+            return row[0]
+    finally:
+        conn.close()
+    return None
+
+
+def _store_cached(normalized, schema_version, cypher):
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO cypher_cache (normalized_question, schema_version, cypher, hits, created_at, last_used) VALUES (?, ?, ?, 0, ?, ?)",
+            (normalized, schema_version, cypher, now, now)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def extract_cypher(text):
+    """
+    Returns the Cypher statement from an LLM answer (drops ``` fences and a "cypher" tag).
+    """
+    match = re.search(r"```(?:cypher)?\s*(.*?)```", text, re.DOTALL | re.IGNORECASE)
+    return (match.group(1) if match else text).strip().rstrip(";").strip()
+
+
+def validate_cypher(cypher, graph=None):
+    """
+    Rejects Cypher that writes to the graph and, given a graph, Cypher that does not
+    compile (checked with EXPLAIN, which does not run the query).
+    """
+    if not cypher or WRITE_CLAUSE_PATTERN.search(LITERAL_PATTERN.sub("''", cypher)):
+        raise HTTPException(status_code=400, detail="Only read-only Cypher can be run or cached.")
+    if graph is not None:
+        try:
+            graph.query(f"EXPLAIN {cypher}")
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Generated Cypher is not valid: {str(e)}")
+
+
+def generate_cypher(question, graph):
+    """
+    Asks the LLM for a Cypher statement answering the question (one round trip).
+    """
+    # Only a miss needs the full schema text, so the refresh happens here and not per query
+    if not graph.schema:
+        graph.refresh_schema()
+    llm = ChatOpenAI(model=CYPHER_GENERATION_MODEL, temperature=0, openai_api_key=OPENAI_API_KEY)
+    prompt = CYPHER_GENERATION_PROMPT.format(schema=graph.schema, question=question)
+    _count("generations")
+    return extract_cypher(cached_llm_call(
+        lambda: llm.invoke(prompt),
+        text=lambda response: response.content,
+        model=CYPHER_GENERATION_MODEL, params={"temperature": 0}, prompt=prompt, tag="cypher_generation"
+    ))
+
+
+# ==============================================================================
+# 4. NATURAL-LANGUAGE QUERY
+# ==============================================================================
+def run_nl_query(question, database=1, max_rows=NL_QUERY_MAX_ROWS):
+    """
+    Answers a question about the graph with rows from a Cypher query: a pinned template
+    if one matches, else Cypher generated earlier for the same question and schema
+    version, else newly generated Cypher, which is validated and cached once it ran.
+    Whatever the source, the query runs in a read transaction.
+    """
+    graph = get_graph_connection(database)
+    pattern, params = question_pattern(question)
+    normalized = normalize_question(question)
+    schema_version = get_schema_version(graph)
+
+    cypher = _find_template(pattern)
+    if cypher is not None:
+        source = "pinned"
+        _count("pinned_hits")
+    else:
+        params = {}
+        cypher = _find_cached(normalized, schema_version)
+        if cypher is not None:
+            source = "cached"
+            _count("cached_hits")
+        else:
+            source = "generated"
+            _count("misses")
+            cypher = generate_cypher(question, graph)
+            try:
+                validate_cypher(cypher, graph)
+            except HTTPException:
+                _count("validation_failures")
+                raise
+
+    try:
+        results = run_read_query(graph, cypher, params)
+    except Exception as e:
+        if "access mode" in str(e).lower():
+            raise HTTPException(status_code=400, detail="Only read-only Cypher can be run or cached.")
+        raise
+    if source == "generated":
+        _store_cached(normalized, schema_version, cypher)
+
+    return {
+        "question": question,
+        "cypher": cypher,
+        "params": params,
+        "source": source,
+        "schema_version": schema_version,
+        "row_count": len(results),
+        "results": results[:max_rows]
+    }
+
+
+def get_cypher_cache_stats():
+    """
+    Returns hit/miss counters for this process and the most used cached questions.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["pinned_hits"] + stats["cached_hits"] + stats["misses"]
+    stats["hit_rate"] = round((stats["pinned_hits"] + stats["cached_hits"]) / lookups, 4) if lookups else 0.0
+    stats["schema_version"] = _schema_version["value"]
+
+    try:
+        conn = _connect()
+        try:
+            stats["cached_questions"] = conn.execute("SELECT COUNT(*) FROM cypher_cache").fetchone()[0]
+            stats["pinned_templates"] = conn.execute("SELECT COUNT(*) FROM cypher_templates").fetchone()[0]
+            stats["top_questions"] = [
+                {"question": q, "schema_version": v, "hits": h}
+                for q, v, h in conn.execute(
+                    "SELECT normalized_question, schema_version, hits FROM cypher_cache ORDER BY hits DESC LIMIT 10"
+                ).fetchall()
+            ]
+        finally:
+            conn.close()
+    except Exception:
+        stats["cached_questions"] = None
+        stats["pinned_templates"] = None
+        stats["top_questions"] = []
+    stats["builtin_templates"] = len(_builtin_templates)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ask a question about the calls graph through the Cypher cache.")
+    parser.add_argument("question")
+    parser.add_argument("--pin", help="Pin this Cypher template for the question instead of asking")
+    args = parser.parse_args()
+
+    if args.pin:
+        print(f"Pinned template for: {pin_template(args.question, args.pin)}")
+    else:
+        print(json.dumps(run_nl_query(args.question), indent=2, default=str))
@@ -0,0 +1,148 @@
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Recent events kept per topic so a reconnecting client (Last-Event-ID) does not miss any
+EVENT_STREAM_HISTORY = int(os.getenv("EVENT_STREAM_HISTORY", "100"))
+# Events buffered per subscriber before the oldest ones are dropped
+EVENT_STREAM_QUEUE_SIZE = int(os.getenv("EVENT_STREAM_QUEUE_SIZE", "100"))
+# Seconds between keep-alive comments, so proxies do not close idle streams
+EVENT_STREAM_KEEPALIVE_SECONDS = float(os.getenv("EVENT_STREAM_KEEPALIVE_SECONDS", "15"))
+# Finished topics (e.g. one per analysis run) whose history is kept; older ones are dropped
+EVENT_STREAM_MAX_FINISHED_TOPICS = int(os.getenv("EVENT_STREAM_MAX_FINISHED_TOPICS", "200"))
+
+_event_ids = itertools.count(1)
+_subscribers = {}
+_history = {}
+# Finished topics, oldest first; a topic finishing again moves to the end instead of repeating
+_finished_topics = OrderedDict()
+_lock = threading.Lock()
+
+
+# ==============================================================================
+# 1. PUBLISHING (SAFE FROM ANY THREAD)
+# ==============================================================================
+def _offer(queue, event):
+    # Runs on the subscriber's event loop. A slow subscriber loses its oldest events, never blocks publishers.
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+def publish_event(topic, event_type, data, final=False):
+    """
+    Publishes an event to every subscriber of `topic` and returns it.
+    `final=True` marks the last event of a topic (e.g. a finished run); streams end after it.
+    """
+    event = {
+        "id": next(_event_ids),
+        "topic": topic,
+        "event": event_type,
+        "data": data,
+        "final": final,
+        "published_at": time.time()
+    }
+
+    with _lock:
+        _history.setdefault(topic, deque(maxlen=EVENT_STREAM_HISTORY)).append(event)
+        subscribers = list(_subscribers.get(topic, ()))
+        if final:
+            _finished_topics[topic] = None
+            _finished_topics.move_to_end(topic)
+            while len(_finished_topics) > EVENT_STREAM_MAX_FINISHED_TOPICS:
+                _history.pop(_finished_topics.popitem(last=False)[0], None)
+
+    for loop, queue in subscribers:
+        try:
+            loop.call_soon_threadsafe(_offer, queue, event)
+        except RuntimeError:
+            # The subscriber's loop is already closed
+            pass
+    return event
+
+
+def get_recent_events(topic, after_id=0):
+    """
+    Returns the buffered events of a topic with an id greater than `after_id`.
+    """
+    with _lock:
+        return [event for event in _history.get(topic, ()) if event["id"] > after_id]
+
+
+def has_final_event(topic):
+    """
+    True when the buffered history of `topic` already ends with a final event.
+    """
+    with _lock:
+        history = _history.get(topic)
+        return bool(history) and history[-1]["final"]
+
+
+# ==============================================================================
+# 2. SERVER-SENT EVENTS STREAM
+# ==============================================================================
+def format_sse(event):
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+
+async def event_stream(topic, last_event_id=None, replay=False):
+    """
+    Async generator of Server-Sent Events for a topic, for use with a StreamingResponse.
+    Replays the buffered events after `last_event_id` (the Last-Event-ID header of a
+    reconnecting client), then streams new events until a final event or disconnect.
+    `replay=True` sends a new client every buffered event of the topic first.
+    """
+    if replay and last_event_id is None:
+        last_event_id = 0
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=EVENT_STREAM_QUEUE_SIZE)
+    subscriber = (loop, queue)
+
+    with _lock:
+        _subscribers.setdefault(topic, set()).add(subscriber)
+        backlog = [event for event in _history.get(topic, ()) if last_event_id is not None and event["id"] > last_event_id]
+        # A stream opened after its topic already finished replays the final event and ends
+        finished = [event for event in _history.get(topic, ()) if event["final"]]
+
+    try:
+        last_sent = last_event_id or 0
+        for event in backlog or finished[-1:]:
+            yield format_sse(event)
+            last_sent = event["id"]
+            if event["final"]:
+                return
+
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=EVENT_STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+
+            if event["id"] <= last_sent:
+                continue
+            yield format_sse(event)
+            last_sent = event["id"]
+            if event["final"]:
+                return
+    finally:
+        with _lock:
+            topic_subscribers = _subscribers.get(topic)
+            if topic_subscribers is not None:
+                topic_subscribers.discard(subscriber)
+                if not topic_subscribers:
+                    del _subscribers[topic]
+
+
+def subscriber_count(topic):
+    with _lock:
+        return len(_subscribers.get(topic, ()))
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# --- Extraction cache settings ---
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", "/home/GraphRAG/cache/extraction_cache.sqlite3")
+# Maximum number of cached transcripts; the least recently used ones are evicted first
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "5000"))
+
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _connect():
+    global _initialized
+    os.makedirs(os.path.dirname(EXTRACTION_CACHE_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(EXTRACTION_CACHE_PATH, timeout=30)
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS extraction_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    llm_output TEXT NOT NULL,
+                    icp_segment TEXT,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_extraction_cache_last_access ON extraction_cache (last_access)")
+                conn.commit()
+                _initialized = True
+    return conn
+
+
+def _count(stat, amount=1):
+    with _stats_lock:
+        _stats[stat] += amount
+
+
+def normalize_transcript(transcript_text):
+    """
+    Normalizes whitespace so that re-sent copies of the same transcript
+    (trailing spaces, CRLF line endings, blank lines) hash to the same key.
+    """
+    lines = (re.sub(r"\s+", " ", line).strip() for line in transcript_text.replace("\r\n", "\n").split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def extraction_cache_key(transcript_text, prompt_version):
+    """
+    Returns the cache key for a transcript: a SHA-256 over the prompt version and the normalized text.
+    """
+    payload = f"{prompt_version}\n{normalize_transcript(transcript_text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ==============================================================================
+# CACHE READ / WRITE
+# ==============================================================================
+def get_cached_extraction(cache_key):
+    """
+    Returns {"llm_output": str, "icp_segment": str or None} for a cached transcript, or None.
+    """
+    if not EXTRACTION_CACHE_ENABLED:
+        return None
+
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT llm_output, icp_segment FROM extraction_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE extraction_cache SET last_access = ? WHERE cache_key = ?", (time.time(), cache_key))
+                conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"WARNING: Extraction cache lookup failed. Error: {e}")
+        return None
+
+    if row is None:
+        _count("misses")
+        return None
+
+    _count("hits")
+    return {"llm_output": row[0], "icp_segment": row[1]}
+
+
+def store_extraction(cache_key, llm_output, icp_segment):
+    """
+    Stores (or refreshes) the extraction for a transcript and evicts the least
+    recently used entries beyond EXTRACTION_CACHE_MAX_ENTRIES.
+    """
+    if not EXTRACTION_CACHE_ENABLED:
+        return
+
+    try:
+        now = time.time()
+        conn = _connect()
+        try:
+            conn.execute("""
+            INSERT INTO extraction_cache (cache_key, llm_output, icp_segment, created_at, last_access)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(cache_key) DO UPDATE SET
+                llm_output = excluded.llm_output,
+                icp_segment = excluded.icp_segment,
+                last_access = excluded.last_access
+            """, (cache_key, llm_output, icp_segment, now, now))
+            evicted = conn.execute("""
+            DELETE FROM extraction_cache WHERE cache_key IN (
+                SELECT cache_key FROM extraction_cache
+                ORDER BY last_access DESC
+                LIMIT -1 OFFSET ?
+            )
+            """, (EXTRACTION_CACHE_MAX_ENTRIES,)).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        _count("stores")
+        if evicted:
+            _count("evictions", evicted)
+    except Exception as e:
+        print(f"WARNING: Could not store extraction in cache. Error: {e}")
+
+
+def get_extraction_cache_stats():
+    """
+    Returns hit/miss counters for this process plus the current number of cached transcripts.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    stats["enabled"] = EXTRACTION_CACHE_ENABLED
+    stats["max_entries"] = EXTRACTION_CACHE_MAX_ENTRIES
+
+    try:
+        conn = _connect()
+        try:
+            stats["entries"] = conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+        finally:
+            conn.close()
+    except Exception:
+        stats["entries"] = None
+
+    return stats
+
+
+if __name__ == "__main__":
+    print(json.dumps(get_extraction_cache_stats(), indent=2))
@@ -1,6 +1,7 @@
-
 from langchain_community.graphs import Neo4jGraph
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -14,26 +15,154 @@ NEO4J_PASSWORDD = os.getenv("NEO4J_PASSWORDD")
 NEO4J_DATABASE1 = os.getenv("NEO4J_DATABASE1")
 NEO4J_DATABASE2 = os.getenv("NEO4J_DATABASE2")
 
+# --- Driver pool settings (one long-lived driver per database) ---
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))
+NEO4J_CONNECTION_TIMEOUT = float(os.getenv("NEO4J_CONNECTION_TIMEOUT", "30"))
+NEO4J_CONNECTION_ACQUISITION_TIMEOUT = float(os.getenv("NEO4J_CONNECTION_ACQUISITION_TIMEOUT", "60"))
+NEO4J_MAX_CONNECTION_LIFETIME = float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600"))
 
-def get_graph_connection(databaseNo):
-    """
-    Returns a Neo4jGraph instance for the calls database.
-    """
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+
+def _driver_config():
+    return {
+        "max_connection_pool_size": NEO4J_MAX_POOL_SIZE,
+        "connection_timeout": NEO4J_CONNECTION_TIMEOUT,
+        "connection_acquisition_timeout": NEO4J_CONNECTION_ACQUISITION_TIMEOUT,
+        "max_connection_lifetime": NEO4J_MAX_CONNECTION_LIFETIME,
+    }
+
+
+def _database_name(databaseNo):
     if databaseNo == 1:
-        NEO4J_DATABASE = NEO4J_DATABASE1
+        return NEO4J_DATABASE1
     elif databaseNo == 2:
-        NEO4J_DATABASE = NEO4J_DATABASE2
+        return NEO4J_DATABASE2
     else:
         raise ValueError("Invalid database number. Use 1 or 2.")
-    
+
+
+def connect_to_database(database, refresh_schema=False):
+    """
+    Returns a new, unshared Neo4jGraph instance for an arbitrary database on the same
+    server (e.g. a scratch database for benchmarks). The caller owns its driver.
+    """
     return Neo4jGraph(
         url=NEO4J_URL,
         username=NEO4J_USERNAME,
         password=NEO4J_PASSWORDD,
-        database=NEO4J_DATABASE
+        database=database,
+        refresh_schema=refresh_schema,
+        driver_config=_driver_config()
     )
 
-if __name__ == "__main__":
-    graph = get_graph_connection(1)
-    print(graph)  # Print the Neo4jGraph instance details
 
+def get_graph_connection(databaseNo):
+    """
+    Returns the shared Neo4jGraph instance for a database (1 = calls, 2 = PDFs).
+
+    The instance (and its driver connection pool) is created once per process and
+    reused by every request. The schema is not refreshed on creation; callers that
+    need graph.schema (e.g. GraphCypherQAChain) call graph.refresh_schema() themselves.
+    """
+    graph = _graphs.get(databaseNo)
+    if graph is not None:
+        return graph
+
+    with _graphs_lock:
+        graph = _graphs.get(databaseNo)
+        if graph is None:
+            graph = connect_to_database(_database_name(databaseNo))
+            _graphs[databaseNo] = graph
+            print(f"Opened Neo4j driver for database {databaseNo} ({graph._database}).")
+        return graph
+
+
+def init_graph_connections(database_numbers=(1, 2)):
+    """
+    Opens the shared drivers at application startup so the first request does not pay for it.
+    A database that cannot be reached is reported and retried lazily on first use.
+    """
+    for databaseNo in database_numbers:
+        try:
+            get_graph_connection(databaseNo).query("RETURN 1 AS ok")
+        except Exception as e:
+            print(f"WARNING: Could not connect to Neo4j database {databaseNo}: {e}")
+            close_graph_connections([databaseNo])
+
+
+def close_graph_connections(database_numbers=None):
+    """
+    Closes the shared drivers (all of them by default). Called on application shutdown.
+    """
+    with _graphs_lock:
+        for databaseNo in list(database_numbers or _graphs.keys()):
+            graph = _graphs.pop(databaseNo, None)
+            if graph is not None:
+                try:
+                    graph._driver.close()
+                except Exception as e:
+                    print(f"WARNING: Error while closing Neo4j driver for database {databaseNo}: {e}")
+
+
+def run_in_transaction(graph, work):
+    """
+    Runs `work(tx)` inside a single explicit write transaction on the graph's
+    database and returns whatever `work` returns.
+    """
+    with graph._driver.session(database=graph._database) as session:
+        return session.execute_write(work)
+
+
+def run_read_query(graph, query, params=None):
+    """
+    Runs `query` in a read transaction on the graph's database and returns its rows as
+    dicts (like graph.query). The server rejects any write the query attempts.
+    """
+    with graph._driver.session(database=graph._database) as session:
+        return session.execute_read(lambda tx: tx.run(query, params or {}).data())
+
+
+# ==============================================================================
+# PER-REQUEST SETUP COST MEASUREMENT
+# ==============================================================================
+def measure_connection_setup(iterations=20):
+    """
+    Compares what every request used to pay (new Neo4jGraph with driver + schema
+    refresh, then one query) with the pooled path (shared instance, one query).
+    """
+    fresh_ms = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        graph = Neo4jGraph(
+            url=NEO4J_URL,
+            username=NEO4J_USERNAME,
+            password=NEO4J_PASSWORDD,
+            database=NEO4J_DATABASE1
+        )
+        graph.query("RETURN 1 AS ok")
+        fresh_ms.append((time.perf_counter() - start) * 1000)
+        graph._driver.close()
+
+    get_graph_connection(1).query("RETURN 1 AS ok")  # warm the pool
+    pooled_ms = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        get_graph_connection(1).query("RETURN 1 AS ok")
+        pooled_ms.append((time.perf_counter() - start) * 1000)
+
+    fresh_avg = sum(fresh_ms) / iterations
+    pooled_avg = sum(pooled_ms) / iterations
+    return {
+        "iterations": iterations,
+        "fresh_connection_avg_ms": round(fresh_avg, 2),
+        "pooled_connection_avg_ms": round(pooled_avg, 2),
+        "setup_cost_removed_ms": round(fresh_avg - pooled_avg, 2)
+    }
+
+
+if __name__ == "__main__":
+    import json
+    print(json.dumps(measure_connection_setup(), indent=2))
+    close_graph_connections()
@@ -2,12 +2,29 @@ from fastapi import FastAPI, HTTPException, Body
 from langchain_anthropic import ChatAnthropic
 from pydantic import BaseModel
 from langchain_openai import ChatOpenAI
-from langchain.chains import GraphCypherQAChain
 from langchain_community.graphs import Neo4jGraph
 import json
 import os
 import requests
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from utils.graphConnection import get_graph_connection
+from utils.promptEncoding import encode_call_records
+from utils.referenceIndex import retrieve_reference_passages, format_reference_passages
+from utils.scriptSections import splice_improved_sections, parse_script, flagged_sections
+from utils.llmCache import cached_llm_call, llm_cache_bypass, track_token_usage
+from utils.cypherCache import register_template, run_nl_query
+from utils.eventStream import publish_event, has_final_event
+from utils.analysisRuns import ANALYSIS_STEPS, create_run, update_run, save_step_output, get_run, save_fingerprint, find_fingerprint
+from utils.sessionSequence import get_max_session_num
+from utils.incrementalAnalysis import (
+    ANALYSIS_MODE, INCREMENTAL_MAX_CALLS, load_insight_state, update_insight_state,
+    rekey_insight_state, save_insight_state, merge_window_analytics, format_insight_state
+)
+from utils.callAnalytics import compute_call_analytics, format_call_analytics, ANALYSIS_WINDOW_CALLS, ANALYSIS_SAMPLE_CALLS
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -16,6 +33,131 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 
+# Step 4 mode: "parallel" = one Claude request per flagged section, "single" = one request for all sections
+SCRIPT_GENERATION_MODE = os.getenv("SCRIPT_GENERATION_MODE", "parallel")
+# Claude requests running at the same time in parallel mode
+SCRIPT_GENERATION_CONCURRENCY = int(os.getenv("SCRIPT_GENERATION_CONCURRENCY", "4"))
+# Output budget of one per-section request (a single section is much shorter than all of them)
+SECTION_MAX_TOKENS = int(os.getenv("SECTION_MAX_TOKENS", "2048"))
+# Background /update-script runs executing at the same time
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "2"))
+
+_analysis_executor = None
+# Runs currently executing in this process, so a run is never resumed twice at once
+_active_runs = set()
+_active_runs_lock = threading.Lock()
+
+
+# Builds the complete record of each call in `cs` from the raw graph.
+# Participants and turns are built in independent subqueries, so they never
+# multiply each other's rows, and the turns are read by walking the NEXT chain.
+CALL_RECORD_PROJECTION = """
+    // Participants of each call (one row per call)
+    CALL {
+        WITH cs
+        MATCH (p:Person)-[:PARTICIPATED_IN]->(cs)
+        RETURN collect(DISTINCT p.name) AS participants
+    }
+
+    // Dialogue of each call (one row per call): start at every turn without an
+    // incoming NEXT (normally just the first one; more only if the chain is broken)
+    // and walk the chain to its end
+    CALL {
+        WITH cs
+        MATCH (head)-[:RAISED_IN]->(cs)
+        WHERE NOT EXISTS { ()-[:NEXT]->(head) }
+        MATCH chain = (head)-[:NEXT*0..]->(tail)
+        WHERE NOT EXISTS { (tail)-[:NEXT]->() }
+        WITH head, nodes(chain) AS chain_turns
+        UNWIND range(0, size(chain_turns) - 1) AS position
+        WITH head, position, chain_turns[position] AS turn
+        OPTIONAL MATCH (speaker:Person)-[:MADE_BY]->(turn)
+        WITH head, position, turn, speaker
+        ORDER BY head.turn_number, position
+        RETURN collect({
+            turn_number: turn.turn_number,
+            speaker_name: speaker.name,
+            turn_type: labels(turn)[0], // e.g., 'CustomerObjection'
+            text: turn.text
+        }) AS dialogue_flow
+    }
+
+    RETURN
+        cs.session_id AS session_id,
+        cs.outcome AS outcome,
+        cs.quality_score AS quality_score,
+        participants,
+        dialogue_flow
+    ORDER BY cs.session_num ASC // Final sort for readability
+"""
+
+# This Cypher query fetches all data related to the most recent calls from the raw graph
+LAST_N_CALL_RECORDS_QUERY = """
+    // Latest calls first, served in order from the session_num index
+    MATCH (cs:CallSession)
+    WHERE cs.session_num IS NOT NULL
+    WITH cs
+    ORDER BY cs.session_num DESC
+    LIMIT $limit
+""" + CALL_RECORD_PROJECTION
+
+# Same records for specific sessions (used for calls without a snapshot)
+CALL_RECORDS_BY_SESSION_QUERY = """
+    MATCH (cs:CallSession)
+    WHERE cs.session_id IN $session_ids
+    WITH cs
+""" + CALL_RECORD_PROJECTION
+
+# Range read of the precomputed per-call snapshots written at ingestion time
+LAST_N_CALL_SNAPSHOTS_QUERY = """
+    MATCH (cs:CallSession)
+    WHERE cs.session_num IS NOT NULL AND cs.session_num >= $from_session
+    WITH cs
+    ORDER BY cs.session_num DESC
+    LIMIT $limit
+    RETURN cs.session_id AS session_id, cs.record_snapshot AS record_snapshot
+    ORDER BY cs.session_num ASC
+"""
+
+
+# Hand-tuned Cypher for the question get_last10_calls_graph asks, so it never needs an LLM round trip
+LAST_CALLS_QUESTION = "give me complete call records for last 10 calls"
+
+
+def register_query_templates():
+    """
+    Registers the built-in question-to-Cypher templates of this module with the Cypher
+    cache. Called once at application startup.
+    """
+    register_template(LAST_CALLS_QUESTION, LAST_N_CALL_RECORDS_QUERY.replace("$limit", "$num1"))
+
+
+def fetch_call_records(graph, limit, from_session=0):
+    """
+    Returns the records of the last `limit` calls (from `from_session` on), oldest first. Each call is read from
+    its `record_snapshot`; calls ingested before snapshots existed are rebuilt from the
+    graph (run `python -m utils.callRecordSnapshots` once to backfill them).
+    """
+    rows = graph.query(LAST_N_CALL_SNAPSHOTS_QUERY, params={"limit": limit, "from_session": from_session})
+
+    missing = [row["session_id"] for row in rows if not row["record_snapshot"]]
+    rebuilt = {}
+    if missing:
+        print(f"{len(missing)} call(s) have no snapshot yet; rebuilding them from the graph.")
+        rebuilt = {
+            record["session_id"]: record
+            for record in graph.query(CALL_RECORDS_BY_SESSION_QUERY, params={"session_ids": missing})
+        }
+        dropped = [session_id for session_id in missing if session_id not in rebuilt]
+        if dropped:
+            print(f"WARNING: {len(dropped)} call(s) could not be rebuilt from the graph and are left out: {', '.join(dropped)}")
+
+    return [
+        json.loads(row["record_snapshot"]) if row["record_snapshot"] else rebuilt[row["session_id"]]
+        for row in rows
+        if row["record_snapshot"] or row["session_id"] in rebuilt
+    ]
+
 
 def get_last_n_call_records(limit):
     """
@@ -35,48 +177,8 @@ def get_last_n_call_records(limit):
         # Establish the graph connection
         graph = get_graph_connection(1)
 
-        # This Cypher query fetches all data related to the most recent calls
-        query = """
-        // 1. Find all CallSession nodes
-        MATCH (cs:CallSession)
-        
-        // 2. Order them by session_id's numeric part to get the latest first
-        WITH cs
-        ORDER BY toInteger(split(cs.session_id, '_')[-1]) DESC
-        LIMIT $limit // 3. Limit to the number of calls requested
-        
-        // 4. For these latest calls, find all the participants
-        MATCH (p:Person)-[:PARTICIPATED_IN]->(cs)
-        
-        // 5. And find all the dialogue turns associated with these calls
-        MATCH (turn)-[:RAISED_IN]->(cs)
-        
-        // 6. Collect all data into a structured format for each call
-        // We collect participants and turns separately for each call session
-        WITH cs, collect(DISTINCT p.name) AS participants, collect(turn) AS turns
-        
-        // 7. Unwind the turns again so we can order them
-        UNWIND turns AS turn
-        WITH cs, participants, turn
-        ORDER BY turn.turn_number ASC
-        
-        // 8. Collect the ordered turns and return the final structure
-        RETURN 
-            cs.session_id AS session_id,
-            cs.outcome AS outcome,
-            cs.quality_score AS quality_score,
-            participants,
-            collect({
-                turn_number: turn.turn_number, 
-                speaker_name: [(turn)<-[:MADE_BY]-(s:Person) | s.name][0], // Find the speaker
-                turn_type: labels(turn)[0], // e.g., 'CustomerObjection'
-                text: turn.text
-            }) AS dialogue_flow
-        ORDER BY toInteger(split(session_id, '_')[-1]) ASC // Final sort for readability
-        """
-
         # Execute the query
-        result = graph.query(query, params={"limit": limit})
+        result = fetch_call_records(graph, limit)
         
         if not result:
             print("No call records found in the database.")
@@ -94,32 +196,30 @@ def get_last_n_call_records(limit):
 
 def get_last10_calls_graph():
     try:
-        llm = ChatOpenAI(model="gpt-5-mini", temperature=0, openai_api_key=OPENAI_API_KEY)
-        calls_graph = get_graph_connection(1)
-        callschain = GraphCypherQAChain.from_llm(
-            graph=calls_graph, llm=llm,
-            verbose=True, allow_dangerous_requests=True
-        )
-
-        response = callschain.invoke({"query": "give me complete call records for last 10 calls"})
-        result = response['result']
-        print(result)
+        # Served by the template from register_query_templates through the question-to-Cypher cache
+        response = run_nl_query(LAST_CALLS_QUESTION)
+        result = response['results']
+        print(f"Retrieved {response['row_count']} call record(s) ({response['source']} Cypher).")
 
         return result
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to connect to Calls Graph database: {str(e)}")
 
 
 
-def call_script_analysis(call_records, vapi_script):
+def call_script_analysis(call_records, vapi_script, call_analytics=None, insight_state=None):
     """
     Analyzes call records against the VAPI script using OpenAI GPT-4o-mini.
     Returns insights on what improvements can be made to the specific sections.
     
     Args:
-        call_records (list): List of call records from the database
+        call_records (list): List of call records from the database (a small sample of full dialogues)
         vapi_script (str): The complete VAPI script content
+        call_analytics (dict): Aggregated statistics over a larger window of calls (see callAnalytics)
+        insight_state (dict): Per-section assessments of earlier runs (incremental mode, see incrementalAnalysis)
         
     Returns:
         str: Analysis and improvement insights from OpenAI
@@ -144,15 +244,29 @@ def call_script_analysis(call_records, vapi_script):
             "SECTION 12; type='commitment-check' id='close_1' style='meeting-request'"
         ]
         
+        if insight_state:
+            previous_assessments = f"""**PREVIOUS ASSESSMENTS (earlier calls, already analyzed):**
+        {format_insight_state(insight_state)}
+        Keep an assessment unless the new calls or the updated statistics give new evidence; use "NOT EVALUATED" for sections the new calls did not exercise.
+        """
+            records_intro = f"Here are {len(call_records)} of the calls ingested since the previous analysis (full dialogues, for wording and tone):"
+        else:
+            previous_assessments = ""
+            records_intro = f"Here are the last {len(call_records)} call records from our database (full dialogues, for wording and tone):"
+
         # Create the analysis prompt
         analysis_prompt = f"""
         You are an expert sales script analyst specializing in cold calling optimization and conversion rate improvement.
         
         CRITICAL INSTRUCTION: Only recommend improvements for sections that show clear evidence of poor performance or missed opportunities in the actual call data. If a section is performing well or not being used, explicitly state "NO IMPROVEMENT NEEDED" and explain why.
         
+        **AGGREGATED CALL STATISTICS:**
+        {format_call_analytics(call_analytics) if call_analytics else "Not available - use the call records below."}
+        
+        {previous_assessments}
         **CALL RECORDS DATA:**
-        Here are the last 10 call records from our database:
-        {json.dumps(call_records, indent=2)}
+        {records_intro}
+        {encode_call_records(call_records)}
         
         **CURRENT VAPI SCRIPT:**
         {vapi_script}
@@ -177,6 +291,7 @@ def call_script_analysis(call_records, vapi_script):
         
         1. **Evidence-Based Performance Analysis**: 
            - Analyze actual call outcomes, quality scores, and dialogue patterns from the data
+           - Base frequencies and success rates on the aggregated statistics (they cover many more calls than the dialogues)
            - Don't rely too much on the quality scores alone; focus on real dialogue and outcomes
            - Look for sections that were actually used vs. those that weren't needed
            - Identify patterns where specific sections led to positive or negative outcomes
@@ -235,9 +350,11 @@ def call_script_analysis(call_records, vapi_script):
         """
         
         # Get analysis from OpenAI
-        analysis_response = llm.invoke(analysis_prompt)
-        
-        return analysis_response.content
+        return cached_llm_call(
+            lambda: llm.invoke(analysis_prompt),
+            text=lambda response: response.content,
+            model="gpt-5-mini", params={"temperature": 0}, prompt=analysis_prompt, tag="call_script_analysis"
+        )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Call script analysis failed: {str(e)}")
@@ -248,11 +365,9 @@ def get_pdf_context(llm_insights):
     Extracts relevant reference data from the reference file based on LLM insights.
     Only extracts material that directly supports the specific improvements identified.
     
-    IMPORTANT: Reference material only contains these 4 sections:
-    - objection-response: tell-them-why-you-are-asking
-    - objection-response: i-have-to-think-about-it  
-    - close-enhancement: guarantee-close
-    - writing-structure: why_what_how_structure
+    The reference file is split into chunks and indexed locally with BM25 (see
+    referenceIndex); the index is rebuilt when the file changes. Each improvement
+    area of the analysis is one query, so this is a local lookup instead of an LLM pass.
     
     Args:
         llm_insights (str): The analysis insights from OpenAI containing specific improvement recommendations
@@ -261,93 +376,133 @@ def get_pdf_context(llm_insights):
         str: Relevant reference material extracted based on the insights, or indication if no relevant material found
     """
     try:
-        # Read the reference file
-        reference_file_path = '/home/GraphRAG/reference.txt'
-        
-        try:
-            with open(reference_file_path, 'r', encoding='utf-8') as f:
-                reference_content = f.read()
-        except FileNotFoundError:
-            return "Reference file not found. Cannot extract contextual information."
-        except Exception as e:
-            return f"Error reading reference file: {str(e)}"
-        
-        # Initialize the LLM for context extraction
-        llm = ChatOpenAI(model="gpt-5-mini", temperature=0, openai_api_key=OPENAI_API_KEY)
-        
-        # Create prompt to extract relevant reference material
-        context_extraction_prompt = f"""
-        You are a reference material extraction specialist. Your task is to extract relevant sections from the available reference material that can help with the improvements identified in the VAPI script analysis.
-        
-        INSTRUCTIONS:
-        1. The reference material contains 4 sections:
-           - objection-response: tell-them-why-you-are-asking (helps with explaining why you ask questions)
-           - objection-response: i-have-to-think-about-it (handles thinking/hesitation objections)
-           - close-enhancement: guarantee-close (techniques for stronger closes)
-           - writing-structure: why_what_how_structure (framework for hooks, messaging structure)
-        
-        2. Extract any sections that could be helpful for the identified improvements, even if not a perfect match
-        
-        3. Look for general principles, techniques, or approaches that could be adapted to address the issues
-        
-        **VAPI SCRIPT ANALYSIS INSIGHTS:**
-        {llm_insights}
-        
-        **AVAILABLE REFERENCE MATERIAL (ONLY 4 SECTIONS):**
-        {reference_content}
-        
-        **EXTRACTION APPROACH:**
-        
-        1. **Review the Step 2 analysis** to understand:
-           - Which sections need improvement
-           - What specific issues were identified
-           - What kind of improvements are needed
-        
-        2. **Extract helpful reference material**:
-           - Look for direct matches between issues and reference sections
-           - Also consider general principles that could be adapted
-           - Extract techniques that could inspire improvements even if not exact matches
-        
-        3. **Be inclusive in extraction**:
-           - Extract any content that could provide helpful guidance
-           - Include principles, techniques, and approaches that could be adapted
-           - Don't worry about perfect matches - focus on potential value
-        
-        **OUTPUT FORMAT:**
+        passages = retrieve_reference_passages(llm_insights)
+        print(f"Retrieved {len(passages)} reference passage(s) from the local index.")
+        return format_reference_passages(passages)
+
+    except FileNotFoundError:
+        return "Reference file not found. Cannot extract contextual information."
+    except Exception as e:
+        return f"Error extracting PDF context: {str(e)}"
+
+
+def generate_vapi_script(vapi_script, call_records, llm_insights, reference_material):
+    """
+    STEP 4: Uses Claude to generate improved VAPI script sections.
+    
+    In "parallel" mode (SCRIPT_GENERATION_MODE) every section flagged as NEEDS IMPROVEMENT
+    gets its own request, so the wall-clock time is that of the slowest section.
+    Falls back to one request for all sections when no flagged section can be matched.
+    
+    Args:
+        vapi_script (str): The original VAPI script (primary reference)
+        call_records (list): Call records from the database (for context)
+        llm_insights (str): Step 2 analysis insights (definitive improvement guide)
+        reference_material (str): Reference material from PDF (improvement techniques)
         
-        ## EXTRACTION SUMMARY
-        **Sections Needing Improvement**: [List from Step 2 analysis]
-        **Available Reference Sections**: 4 sections (objection-response x2, close-enhancement x1, writing-structure x1)
+    Returns:
+        str: Side-by-side comparison of original vs improved sections
+    """
+    if SCRIPT_GENERATION_MODE == "parallel":
+        model = parse_script(vapi_script)
+        flagged = {number: block for number, block in flagged_sections(llm_insights).items() if model.section(number)}
+        if flagged:
+            return generate_vapi_sections_parallel(model, flagged)
+        print("No flagged sections matched the script; generating all sections in one request.")
+
+    return generate_vapi_script_single(vapi_script, call_records, llm_insights, reference_material)
+
+
+def generate_vapi_section(section, insight_block):
+    """
+    Rewrites one flagged section with Claude. The request carries only that section,
+    its block of the Step 2 analysis and the reference passages retrieved for it.
+    """
+    llm_claude = ChatAnthropic(model='claude-sonnet-4-20250514', temperature=0, max_tokens=SECTION_MAX_TOKENS, anthropic_api_key=ANTHROPIC_API_KEY)
+    reference_material = format_reference_passages(retrieve_reference_passages(insight_block))
+
+    section_prompt = f"""
+        You are a VAPI script improvement specialist. Your job is to make a surgical improvement to ONE section of the client's script, while respecting and preserving the client's original work.
         
-        ## EXTRACTED REFERENCE MATERIAL
+        **1. THE SECTION TO IMPROVE (study it carefully to understand the client's style):**
+        {section.render()}
         
-        ### [Reference Section Name]: [Section Topic]
-        **Relevant for**: [Which improvement issues this could help with]
-        **Content**: 
-        [Extract the relevant content]
+        **2. THE REFERENCE MATERIAL (techniques to apply):**
+        {reference_material}
         
-        **How this helps**: [Brief explanation of how this content could be applied to the identified issues]
+        **3. IMPROVEMENT GUIDE (what needs fixing in this section):**
+        {insight_block}
         
-        [Repeat for each relevant reference section found]
+        **CRITICAL INSTRUCTIONS:**
+        - Fix only the specific issues mentioned in the improvement guide.
+        - Preserve the client's humor, energy, personality and tone.
+        - Apply the reference techniques where they fit; otherwise apply general principles inspired by them.
+        - Keep the SECTION tag, its number and its attributes exactly as they are.
         
-        ## SUMMARY
-        [Brief summary of what was extracted and how it can help with the improvements needed]
+        **OUTPUT FORMAT (EXACT FORMAT REQUIRED):**
         
-        Note: Focus on extracting helpful content rather than finding perfect matches. The goal is to provide Claude with useful reference material for making improvements.
-        """
+        Section {section.number}:
         
-        # Get context extraction from OpenAI
-        context_response = llm.invoke(context_extraction_prompt)
+        Before:
+        {section.render()}
         
-        return context_response.content
+        After:
+        {section.header}
+        [your improved content - preserving tone while fixing the specific issue]
+        {section.footer}
         
-    except Exception as e:
-        return f"Error extracting PDF context: {str(e)}"
+        No extra explanations or commentary."""
 
+    return cached_llm_call(
+        lambda: llm_claude.invoke(section_prompt),
+        text=lambda response: response.content,
+        model="claude-sonnet-4-20250514", params={"temperature": 0, "max_tokens": SECTION_MAX_TOKENS},
+        prompt=section_prompt, tag="generate_vapi_section"
+    )
 
-def generate_vapi_script(vapi_script, call_records, llm_insights, reference_material):
+
+def generate_vapi_sections_parallel(model, flagged):
     """
-    STEP 4: Uses Claude to generate improved VAPI script sections.
+    Runs generate_vapi_section for every flagged section ({number: analysis block}) with at most
+    SCRIPT_GENERATION_CONCURRENCY requests at a time, and combines the outputs in section order
+    in the same format as the single-request mode. If any section fails the whole step fails,
+    so the run is not completed with part of the flagged sections silently unchanged; the
+    sections that succeeded are in the LLM cache and are not regenerated on resume.
+    """
+    start = time.perf_counter()
+
+    def improve(number):
+        section_start = time.perf_counter()
+        try:
+            output = generate_vapi_section(model.section(number), flagged[number])
+            print(f"Section {number} improved in {time.perf_counter() - section_start:.1f}s.")
+            return number, output, None
+        except Exception as e:
+            print(f"WARNING: Section {number} could not be improved: {e}")
+            return number, None, str(e)
+
+    with ThreadPoolExecutor(max_workers=max(1, SCRIPT_GENERATION_CONCURRENCY)) as executor:
+        # Each worker runs in a copy of this context, so an llm_cache_bypass() around the run applies
+        futures = [executor.submit(contextvars.copy_context().run, improve, number) for number in sorted(flagged)]
+        results = [future.result() for future in futures]
+
+    failed = [(number, error) for number, output, error in results if not output]
+    if failed:
+        errors = "; ".join(f"section {number}: {error or 'empty output'}" for number, error in failed)
+        raise HTTPException(
+            status_code=500,
+            detail=f"VAPI script generation with Claude failed for {len(failed)}/{len(flagged)} sections: {errors}"
+        )
+
+    outputs = [output for _, output, _ in results]
+    print(f"Improved {len(outputs)}/{len(flagged)} sections in {time.perf_counter() - start:.1f}s "
+          f"(concurrency {SCRIPT_GENERATION_CONCURRENCY}).")
+    return "IMPROVED SECTIONS:\n\n" + "\n\n".join(output.strip() for output in outputs)
+
+
+def generate_vapi_script_single(vapi_script, call_records, llm_insights, reference_material):
+    """
+    STEP 4 (single request): Uses Claude to generate all improved VAPI script sections at once.
     
     Claude will use Step 2 insights as the definitive guide and apply reference material
     techniques to improve only the specific sections identified, while preserving
@@ -418,9 +573,12 @@ def generate_vapi_script(vapi_script, call_records, llm_insights, reference_mate
         - Use the exact format shown above"""
         
         # Get improved script from Claude
-        claude_response = llm_claude.invoke(claude_prompt)
-        
-        return claude_response.content
+        return cached_llm_call(
+            lambda: llm_claude.invoke(claude_prompt),
+            text=lambda response: response.content,
+            model="claude-sonnet-4-20250514", params={"temperature": 0, "max_tokens": 8192},
+            prompt=claude_prompt, tag="generate_vapi_script"
+        )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"VAPI script generation with Claude failed: {str(e)}")
@@ -428,10 +586,12 @@ def generate_vapi_script(vapi_script, call_records, llm_insights, reference_mate
 
 def rebuild_vapi_script(original_script, improved_sections_output):
     """
-    STEP 5: Rebuilds the complete VAPI script with improved sections using OpenAI.
+    STEP 5: Rebuilds the complete VAPI script with improved sections.
     
-    Takes the original script and Claude's improved sections output, then creates
-    a complete new script with the improvements integrated.
+    Parses the original script into its <SECTION n; ...> blocks, takes the "After:"
+    versions from Claude's output and splices them in by section number (section ids
+    are not unique, e.g. close_1). Everything outside the replaced section bodies,
+    including the section tags, is kept byte for byte and validated.
     
     Args:
         original_script (str): The complete original VAPI script
@@ -441,47 +601,14 @@ def rebuild_vapi_script(original_script, improved_sections_output):
         str: Complete rebuilt VAPI script with improvements integrated
     """
     try:
-        # Initialize OpenAI for script rebuilding
-        llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, openai_api_key=OPENAI_API_KEY)
-        
-        rebuild_prompt = f"""
-        You are a VAPI script rebuilder. Your task is to take the original complete script and replace specific sections with their improved versions.
-        
-        **ORIGINAL COMPLETE VAPI SCRIPT:**
-        {original_script}
-        
-        **IMPROVED SECTIONS TO INTEGRATE:**
-        {improved_sections_output}
-        
-        **INSTRUCTIONS:**
-        
-        1. **Preserve the complete script structure** - Keep everything exactly as it is in the original script
-        
-        2. **Replace only improved sections** - Look for sections in the improved sections output that have "After:" versions and replace those specific sections in the original script
-        
-        3. **Maintain exact formatting** - Keep all indentation, spacing, JSON structure, and formatting exactly as in the original
-        
-        4. **Keep section tags intact** - Preserve all SECTION attributes and numbering exactly as they appear
-        
-        5. **Leave everything else unchanged** - All other content, comments, role definitions, context, etc. should remain identical to the original
-        
-        **EXAMPLE OF WHAT TO DO:**
-        If improved sections shows:
-        ```
-        Section 2:
-        Before: <SECTION 2; ...>original content</SECTION 2>
-        After: <SECTION 2; ...>improved content</SECTION 2>
-        ```
-        Then replace that exact Section 2 in the original script with the "After" version.
-        
-        **OUTPUT REQUIREMENT:**
-        Return ONLY the complete rebuilt VAPI script with no additional commentary, explanations, or formatting markers. Just the pure script content that can be directly used.
-        """
-        
-        # Get rebuilt script from OpenAI
-        rebuild_response = llm.invoke(rebuild_prompt)
-        
-        return rebuild_response.content
+        rebuilt_script, report = splice_improved_sections(original_script, improved_sections_output)
+
+        print(f"Spliced sections {report['updated']} into the script "
+              f"(unchanged: {report['unchanged']}, not in script: {report['unknown']}).")
+        if not report["updated"]:
+            print("WARNING: No improved sections could be applied; the original script is kept.")
+
+        return rebuilt_script
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"VAPI script rebuilding failed: {str(e)}")
@@ -534,80 +661,406 @@ def update_script_in_vapi(vapi_script):
         raise HTTPException(status_code=500, detail=f"Updating script in VAPI failed: {str(e)}")
 
 
-def script_analysis(vapi_script):
-    """
-    Main function to perform complete VAPI script analysis and improvement workflow.
-    This implements steps 1-5: fetch calls → analyze → extract references → improve with Claude → rebuild script
-    """
-    try:
-        # --- Step 1: Get last 10 Calls ---
-        print("Step 1: Fetching last 10 call records...")
-        # recent_calls = get_last10_calls_graph()
-        recent_calls = get_last_n_call_records(10)
-        
-        if not recent_calls:
-            print("No call records found. Cannot proceed with analysis.")
-            return {"error": "No call records found in database"}
+def _no_improvements_needed(llm_insights):
+    return "Improvement Needed: No" in llm_insights or "Sections: None" in llm_insights or "Sections: []" in llm_insights
 
-        # --- Step 2: Analyze calls against VAPI script ---
-        print("Step 2: Analyzing call records against VAPI script...")
-        llm_insights = call_script_analysis(recent_calls, vapi_script)
 
-        print("Analysis completed successfully!")
+# Each step takes the script and the outputs of the earlier steps and returns its own
+# output (JSON-serializable), which is persisted under the run ID before the next step starts.
+def _step_call_data_fetch(vapi_script, outputs):
+    if ANALYSIS_MODE == "incremental":
+        incremental = _fetch_new_calls(vapi_script)
+        if incremental is not None:
+            return incremental
 
-        if "Improvement Needed: No" in llm_insights or "Sections: None" in llm_insights or "Sections: []" in llm_insights:
-            print("No improvements needed as per analysis. Exiting workflow.")
-            return {
-                "status": "success",
-                "call_records_count": len(recent_calls),
-                "step_2_analysis": llm_insights,
-                "step_3_reference_material": "N/A - No improvements needed",
-                "step_4_improved_script": "N/A - No improvements needed",
-                "step_5_rebuilt_script": "N/A - No improvements needed",
-                "vapi_update_status": "N/A - No improvements needed",
-                "workflow_steps_completed": ["call_data_fetch", "script_analysis"]
-            }      
+    print(f"Step 1: Aggregating the last {ANALYSIS_WINDOW_CALLS} calls and fetching the last {ANALYSIS_SAMPLE_CALLS} call records...")
+    # recent_calls = get_last10_calls_graph()
+    recent_calls = get_last_n_call_records(ANALYSIS_SAMPLE_CALLS)
+    if not recent_calls:
+        return {"recent_calls": [], "call_analytics": None}
+
+    call_analytics = compute_call_analytics(get_graph_connection(1), ANALYSIS_WINDOW_CALLS)
+    return {"recent_calls": recent_calls, "call_analytics": call_analytics, "mode": "window", "new_calls_count": call_analytics["calls"]}
+
+
+def _fetch_new_calls(vapi_script):
+    # Incremental mode: only the calls after the state's high-water mark. Returns None (= analyze
+    # a full window) when there is no state for this script, which then starts one, or when no
+    # call was ingested since, in which case the existing state and its counters are kept.
+    state = load_insight_state(vapi_script)
+    if state is None:
+        print("Step 1: No incremental state for this script yet; analyzing a full window.")
+        return None
+
+    graph = get_graph_connection(1)
+    from_session = state["last_session_num"] + 1
+    to_session = get_max_session_num(graph)
+    if to_session < from_session:
+        print("Step 1: No calls since the previous incremental run; re-analyzing a full window with the saved state kept.")
+        return None
+
+    print(f"Step 1: Aggregating the calls since the previous run (sessions {from_session}-{to_session})...")
+    window_analytics = compute_call_analytics(graph, from_session=from_session, to_session=to_session)
+    recent_calls = fetch_call_records(graph, INCREMENTAL_MAX_CALLS, from_session=from_session)
+    return {
+        "recent_calls": recent_calls,
+        "call_analytics": merge_window_analytics(state, window_analytics),
+        "mode": "incremental",
+        "new_calls_count": window_analytics["calls"],
+        "insight_state": state
+    }
 
-        # --- Step 3: Extract relevant reference material ---
-        print("Step 3: Extracting relevant reference material based on insights...")
-        pdf_context = get_pdf_context(llm_insights)
-        
-        print("Reference extraction completed successfully!")
-        
-        # --- Step 4: Generate improved script with Claude ---
-        print("Step 4: Generating improved VAPI script sections with Claude...")
-        improved_script = generate_vapi_script(vapi_script, recent_calls, llm_insights, pdf_context)
-        
-        print("Claude script improvement completed successfully!")
-        
-        # --- Step 5: Rebuild complete VAPI script ---
-        print("Step 5: Rebuilding complete VAPI script with improvements...")
-        rebuilt_script = rebuild_vapi_script(vapi_script, improved_script)
-        
-        print("Complete script rebuilding completed successfully!")
 
+def _step_script_analysis(vapi_script, outputs):
+    print("Step 2: Analyzing call records against VAPI script...")
+    fetched = outputs["call_data_fetch"]
+    llm_insights = call_script_analysis(fetched["recent_calls"], vapi_script, fetched["call_analytics"], fetched.get("insight_state"))
+    print("Analysis completed successfully!")
+    return {"llm_insights": llm_insights}
 
-        # Optionally, update the rebuilt script back to VAPI system
-        print("Updating rebuilt script back to VAPI system...")
-        update_response = update_script_in_vapi(rebuilt_script)
-        status_code = update_response.get("status_code", "No status code returned")
 
-        print(f"VAPI update response: {status_code}")
+def _step_reference_extraction(vapi_script, outputs):
+    print("Step 3: Extracting relevant reference material based on insights...")
+    pdf_context = get_pdf_context(outputs["script_analysis"]["llm_insights"])
+    print("Reference extraction completed successfully!")
+    return {"pdf_context": pdf_context}
 
-        # Return comprehensive results
+
+def _step_claude_improvement(vapi_script, outputs):
+    print("Step 4: Generating improved VAPI script sections with Claude...")
+    improved_script = generate_vapi_script(
+        vapi_script,
+        outputs["call_data_fetch"]["recent_calls"],
+        outputs["script_analysis"]["llm_insights"],
+        outputs["reference_extraction"]["pdf_context"]
+    )
+    print("Claude script improvement completed successfully!")
+    return {"improved_script": improved_script}
+
+
+def _step_script_rebuild(vapi_script, outputs):
+    print("Step 5: Rebuilding complete VAPI script with improvements...")
+    rebuilt_script = rebuild_vapi_script(vapi_script, outputs["claude_improvement"]["improved_script"])
+    print("Complete script rebuilding completed successfully!")
+    return {"rebuilt_script": rebuilt_script}
+
+
+def _step_vapi_update(vapi_script, outputs):
+    # Optionally, update the rebuilt script back to VAPI system
+    print("Updating rebuilt script back to VAPI system...")
+    update_response = update_script_in_vapi(outputs["script_rebuild"]["rebuilt_script"])
+    status_code = update_response.get("status_code", "No status code returned")
+    print(f"VAPI update response: {status_code}")
+    return {"status_code": status_code}
+
+
+ANALYSIS_STEP_FUNCTIONS = {
+    "call_data_fetch": _step_call_data_fetch,
+    "script_analysis": _step_script_analysis,
+    "reference_extraction": _step_reference_extraction,
+    "claude_improvement": _step_claude_improvement,
+    "script_rebuild": _step_script_rebuild,
+    "vapi_update": _step_vapi_update,
+}
+
+
+def _analysis_result(run_id, outputs):
+    fetched = outputs["call_data_fetch"]
+    llm_insights = outputs["script_analysis"]["llm_insights"]
+
+    if _no_improvements_needed(llm_insights):
         return {
             "status": "success",
-            "call_records_count": len(recent_calls),
+            "run_id": run_id,
+            "call_records_count": len(fetched["recent_calls"]),
+            "analyzed_calls_count": fetched["call_analytics"]["calls"],
+            "analysis_mode": fetched.get("mode", "window"),
+            "new_calls_count": fetched.get("new_calls_count"),
             "step_2_analysis": llm_insights,
-            "step_3_reference_material": pdf_context,
-            "step_4_improved_script": improved_script,
-            "step_5_rebuilt_script": rebuilt_script,
-            "vapi_update_status": status_code,
-            "workflow_steps_completed": ["call_data_fetch", "script_analysis", "reference_extraction", "claude_improvement", "script_rebuild", "vapi_update"]
+            "step_3_reference_material": "N/A - No improvements needed",
+            "step_4_improved_script": "N/A - No improvements needed",
+            "step_5_rebuilt_script": "N/A - No improvements needed",
+            "vapi_update_status": "N/A - No improvements needed",
+            "workflow_steps_completed": ["call_data_fetch", "script_analysis"]
         }
 
+    return {
+        "status": "success",
+        "run_id": run_id,
+        "call_records_count": len(fetched["recent_calls"]),
+        "analyzed_calls_count": fetched["call_analytics"]["calls"],
+        "analysis_mode": fetched.get("mode", "window"),
+        "new_calls_count": fetched.get("new_calls_count"),
+        "step_2_analysis": llm_insights,
+        "step_3_reference_material": outputs["reference_extraction"]["pdf_context"],
+        "step_4_improved_script": outputs["claude_improvement"]["improved_script"],
+        "step_5_rebuilt_script": outputs["script_rebuild"]["rebuilt_script"],
+        "vapi_update_status": outputs["vapi_update"]["status_code"],
+        "workflow_steps_completed": list(ANALYSIS_STEPS)
+    }
+
+
+def _save_insight_state(vapi_script, outputs):
+    # Incremental mode: the next run only needs the calls after this run, plus this state.
+    # Saved once the run has completed, so a failed (or later resumed) run never advances it.
+    fetched = outputs["call_data_fetch"]
+    llm_insights = outputs["script_analysis"]["llm_insights"]
+    to_session = fetched["call_analytics"]["window"]["to_session"]
+
+    if fetched.get("mode") == "incremental":
+        state = update_insight_state(
+            fetched["insight_state"], vapi_script, llm_insights, fetched["call_analytics"], to_session, fetched["new_calls_count"]
+        )
+    else:
+        previous = load_insight_state(vapi_script)
+        if previous is None:
+            # First run for this script: the window becomes the baseline
+            state = update_insight_state(None, vapi_script, llm_insights, fetched["call_analytics"], to_session, fetched["call_analytics"]["calls"])
+        else:
+            # No calls since the saved state: new assessments, same statistics and counters
+            state = update_insight_state(
+                previous, vapi_script, llm_insights, previous["analytics"], previous["last_session_num"], 0
+            )
+
+    if "vapi_update" in outputs:
+        # VAPI now runs the rebuilt script, which is what the next run will be given
+        state = rekey_insight_state(state, vapi_script, outputs["script_rebuild"]["rebuilt_script"])
+    save_insight_state(state)
+
+
+def _run_analysis_steps(run_id, vapi_script, outputs, on_step=None):
+    """
+    Runs every step without a persisted output, in order, saving each output as soon
+    as the step completes. A failure marks the run as failed at that step.
+    on_step(step, status, details) is called at every step boundary with the step's
+    duration and token usage.
+    """
+    outputs = dict(outputs)
+    notify = on_step or (lambda step, status, details: None)
+    update_run(run_id, "running")
+
+    for step in ANALYSIS_STEPS:
+        if step in outputs:
+            print(f"Run {run_id}: reusing the saved output of step '{step}'.")
+            notify(step, "skipped", {})
+            continue
+
+        notify(step, "started", {})
+        started = time.time()
+        try:
+            with track_token_usage() as token_usage:
+                output = ANALYSIS_STEP_FUNCTIONS[step](vapi_script, outputs)
+        except Exception as e:
+            error = getattr(e, "detail", None) or str(e)
+            update_run(run_id, "failed", failed_step=step, error=error)
+            notify(step, "failed", {"duration_seconds": round(time.time() - started, 3), "token_usage": token_usage, "error": error})
+            raise HTTPException(
+                status_code=500,
+                detail=f"Complete script analysis workflow failed at step '{step}' (resume with run_id {run_id}): {error}"
+            )
+
+        duration = round(time.time() - started, 3)
+        if step == "call_data_fetch" and not output["recent_calls"]:
+            # Not saved, so resuming the run fetches again once calls exist
+            print("No call records found. Cannot proceed with analysis.")
+            update_run(run_id, "failed", failed_step=step, error="No call records found in database")
+            notify(step, "failed", {"duration_seconds": duration, "token_usage": token_usage, "error": "No call records found in database"})
+            return {"error": "No call records found in database", "run_id": run_id}
+
+        save_step_output(run_id, step, output, duration)
+        outputs[step] = output
+        notify(step, "completed", {"duration_seconds": duration, "token_usage": token_usage})
+
+        if step == "script_analysis" and _no_improvements_needed(output["llm_insights"]):
+            print("No improvements needed as per analysis. Exiting workflow.")
+            break
+
+    result = _analysis_result(run_id, outputs)
+    update_run(run_id, "completed", result=result)
+    # The calls this run saw end at the top of its analytics window
+    save_fingerprint(vapi_script, outputs["call_data_fetch"]["call_analytics"]["window"]["to_session"], _analysis_settings(), run_id)
+    if ANALYSIS_MODE == "incremental":
+        _save_insight_state(vapi_script, outputs)
+    return result
+
+
+def _analysis_settings():
+    # Settings that change what a run produces for the same script and calls
+    return f"mode={ANALYSIS_MODE};window={ANALYSIS_WINDOW_CALLS};sample={ANALYSIS_SAMPLE_CALLS};generation={SCRIPT_GENERATION_MODE}"
+
+
+def find_unchanged_run(vapi_script):
+    """
+    Returns the completed run that analyzed this exact script when no call has been
+    ingested since, or None. Costs one index lookup and one sqlite read.
+    """
+    try:
+        max_session_num = get_max_session_num(get_graph_connection(1))
+        run_id = find_fingerprint(vapi_script, max_session_num, _analysis_settings())
+    except Exception as e:
+        print(f"WARNING: Could not check for an unchanged previous run: {e}")
+        return None
+
+    if run_id is None:
+        return None
+    run = get_run(run_id, include_outputs=False)
+    if run is None or run["status"] != "completed" or not run["result"]:
+        return None
+    return run
+
+
+def script_analysis(vapi_script, force=False):
+    """
+    Main function to perform complete VAPI script analysis and improvement workflow.
+    This implements steps 1-6: fetch calls → analyze → extract references → improve with Claude → rebuild script → update VAPI.
+    Every step's output is saved under the returned run_id; a failed run continues with resume_script_analysis.
+    If the script is unchanged and no call was ingested since a completed run, that run's
+    result is returned instead (force=True always runs).
+    """
+    if not force:
+        previous = find_unchanged_run(vapi_script)
+        if previous is not None:
+            print(f"Script and calls unchanged since run {previous['run_id']}; returning its result.")
+            return {**previous["result"], "unchanged_since_run": previous["run_id"]}
+
+    run_id = create_run(vapi_script)
+    print(f"Started script analysis run {run_id}")
+    with _exclusive_run(run_id):
+        return _run_analysis_steps(run_id, vapi_script, {})
+
+
+def resume_script_analysis(run_id):
+    """
+    Continues a run from its first incomplete step, reusing the saved outputs of the
+    steps before it. A completed run returns its stored result without running anything.
+    """
+    run = get_run(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Analysis run '{run_id}' not found.")
+
+    if run["status"] == "completed":
+        return run["result"]
+
+    print(f"Resuming script analysis run {run_id} from step '{run['next_step']}'")
+    with _exclusive_run(run_id):
+        return _run_analysis_steps(run_id, run["vapi_script"], run["outputs"])
+
+
+def _claim_run(run_id):
+    """
+    Marks a run as executing in this process; 409 if it already is (in the background
+    or in a blocking request).
+    """
+    with _active_runs_lock:
+        if run_id in _active_runs:
+            raise HTTPException(status_code=409, detail=f"Analysis run '{run_id}' is already running.")
+        _active_runs.add(run_id)
+
+
+def _release_run(run_id):
+    with _active_runs_lock:
+        _active_runs.discard(run_id)
+
+
+@contextmanager
+def _exclusive_run(run_id):
+    _claim_run(run_id)
+    try:
+        yield
+    finally:
+        _release_run(run_id)
+
+
+# ==============================================================================
+# BACKGROUND RUNS WITH PROGRESS EVENTS
+# ==============================================================================
+def analysis_events_topic(run_id):
+    """
+    Returns the event stream topic a background run publishes its progress on.
+    """
+    return f"analysis:{run_id}"
+
+
+def _get_analysis_executor():
+    global _analysis_executor
+    if _analysis_executor is None:
+        _analysis_executor = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix="script-analysis")
+    return _analysis_executor
+
+
+def _run_in_background(run_id, vapi_script, outputs, bypass_cache):
+    topic = analysis_events_topic(run_id)
+
+    def on_step(step, status, details):
+        publish_event(topic, f"step_{status}", {"run_id": run_id, "step": step, **details})
+
+    try:
+        with llm_cache_bypass(bypass_cache):
+            result = _run_analysis_steps(run_id, vapi_script, outputs, on_step)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Complete script analysis workflow failed: {str(e)}")
+        error = getattr(e, "detail", None) or str(e)
+        print(f"Background script analysis run {run_id} failed: {error}")
+        publish_event(topic, "run_failed", {"run_id": run_id, "error": error}, final=True)
+        return
+    finally:
+        _release_run(run_id)
+
+    event = "run_failed" if result.get("error") else "run_completed"
+    publish_event(topic, event, {"run_id": run_id, "result": result}, final=True)
+
+
+def _publish_completed_run(run_id, result):
+    # Lets a stream opened for an already completed run replay its result. Skipped while the
+    # topic's history still ends with its final event, so repeated requests do not re-publish it.
+    topic = analysis_events_topic(run_id)
+    if not has_final_event(topic):
+        publish_event(topic, "run_completed", {"run_id": run_id, "result": result}, final=True)
+
+
+def start_script_analysis(vapi_script=None, run_id=None, bypass_cache=False, force=False):
+    """
+    Starts a run in the background (or, with `run_id`, resumes one) and returns
+    (run ID, whether a run was started) right away. Progress is published on
+    analysis_events_topic(run_id): step_started / step_completed / step_skipped /
+    step_failed events, then a final run_completed or run_failed event carrying the
+    result. An unchanged script and call set returns the previous run's ID, whose
+    stream replays its result (unless force=True).
+    """
+    if run_id is None and not force:
+        previous = find_unchanged_run(vapi_script)
+        if previous is not None:
+            print(f"Script and calls unchanged since run {previous['run_id']}; not starting a new run.")
+            _publish_completed_run(previous["run_id"], {**previous["result"], "unchanged_since_run": previous["run_id"]})
+            return previous["run_id"], False
+
+    if run_id is None:
+        run_id = create_run(vapi_script)
+        outputs = {}
+    else:
+        run = get_run(run_id)
+        if run is None:
+            raise HTTPException(status_code=404, detail=f"Analysis run '{run_id}' not found.")
+        if run["status"] == "completed":
+            _publish_completed_run(run_id, run["result"])
+            return run_id, False
+        vapi_script, outputs = run["vapi_script"], run["outputs"]
+
+    _claim_run(run_id)
+
+    publish_event(analysis_events_topic(run_id), "run_started", {"run_id": run_id, "steps": list(ANALYSIS_STEPS)})
+    _get_analysis_executor().submit(_run_in_background, run_id, vapi_script, outputs, bypass_cache)
+    print(f"Queued script analysis run {run_id}")
+    return run_id, True
+
+
+def shutdown_analysis_runner(wait=True):
+    """
+    Stops accepting background runs and (optionally) waits for running ones to finish.
+    """
+    global _analysis_executor
+    executor, _analysis_executor = _analysis_executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
 
 if __name__ == "__main__":
     # Test the complete workflow (Steps 1-6)
@@ -620,6 +1073,7 @@ if __name__ == "__main__":
     print("COMPLETE VAPI SCRIPT IMPROVEMENT WORKFLOW")
     print("="*80)
     print(f"Status: {result.get('status')}")
+    print(f"Run ID: {result.get('run_id')}")
     print(f"Call Records Analyzed: {result.get('call_records_count')}")
     print(f"Steps Completed: {result.get('workflow_steps_completed')}")
     
@@ -0,0 +1,131 @@
+import argparse
+import json
+import os
+from utils.graphConnection import get_graph_connection
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+# ==============================================================================
+# 1. SCHEMA DEFINITION FOR THE CALLS GRAPH
+# ==============================================================================
+# Every MERGE / MATCH key used by the ingestion and analysis queries. Uniqueness
+# constraints are backed by a range index, so they also serve the lookups.
+CALLS_CONSTRAINTS = [
+    ("call_session_id_unique", "CallSession", "session_id"),
+    ("call_session_num_unique", "CallSession", "session_num"),
+    ("person_name_unique", "Person", "name"),
+    ("product_name_unique", "Product", "name"),
+    ("icp_segment_unique", "IdealTargetCustomer", "segment"),
+    ("sequence_name_unique", "Sequence", "name"),
+    ("call_counter_name_unique", "CallCounter", "name"),
+]
+
+# Plain range indexes for properties that are filtered on but not unique
+CALLS_INDEXES = [
+    ("call_session_outcome_index", "CallSession", "outcome"),
+    ("call_session_icp_segment_index", "CallSession", "matched_icp_segment"),
+]
+
+# How long startup waits for new indexes to come online. Populating an index on a large
+# graph can take longer; queries then run without it until it is online.
+SCHEMA_AWAIT_SECONDS = int(os.getenv("SCHEMA_AWAIT_SECONDS", "30"))
+
+
+def _constraint_query(name, label, prop):
+    return f"CREATE CONSTRAINT {name} IF NOT EXISTS FOR (n:{label}) REQUIRE n.{prop} IS UNIQUE"
+
+
+def _index_query(name, label, prop):
+    return f"CREATE INDEX {name} IF NOT EXISTS FOR (n:{label}) ON (n.{prop})"
+
+
+# ==============================================================================
+# 2. IDEMPOTENT BOOTSTRAP
+# ==============================================================================
+def ensure_calls_schema(graph, await_online=True):
+    """
+    Creates the constraints and indexes of the calls graph if they do not exist yet
+    and (optionally) waits until they are online. Safe to run on every startup.
+
+    A uniqueness constraint cannot be created while duplicate values exist; in that
+    case a plain range index is created instead so lookups are still index-backed,
+    and the problem is reported in the returned summary.
+    """
+    summary = {"created_or_present": [], "fallback_indexes": [], "errors": []}
+
+    for name, label, prop in CALLS_CONSTRAINTS:
+        try:
+            graph.query(_constraint_query(name, label, prop))
+            summary["created_or_present"].append(name)
+        except Exception as e:
+            print(f"WARNING: Could not create constraint {name} ({label}.{prop}). Falling back to a range index. Error: {e}")
+            fallback_name = f"{name}_fallback_index"
+            try:
+                graph.query(_index_query(fallback_name, label, prop))
+                summary["fallback_indexes"].append(fallback_name)
+            except Exception as index_error:
+                summary["errors"].append(f"{name}: {str(index_error)}")
+
+    for name, label, prop in CALLS_INDEXES:
+        try:
+            graph.query(_index_query(name, label, prop))
+            summary["created_or_present"].append(name)
+        except Exception as e:
+            summary["errors"].append(f"{name}: {str(e)}")
+
+    if await_online:
+        try:
+            graph.query(f"CALL db.awaitIndexes({SCHEMA_AWAIT_SECONDS})")
+        except Exception as e:
+            print(f"WARNING: Calls graph indexes not online after {SCHEMA_AWAIT_SECONDS}s; they keep populating "
+                  f"in the background (check with python -m utils.graphSchema --status). Error: {e}")
+
+    summary["indexes"] = get_schema_status(graph)
+    summary["all_online"] = all(index["state"] == "ONLINE" for index in summary["indexes"])
+    print(f"Calls graph schema ready: {len(summary['created_or_present'])} constraints/indexes, "
+          f"all online: {summary['all_online']}")
+    return summary
+
+
+def get_schema_status(graph):
+    """
+    Returns the state of the indexes managed by this module (including constraint-backed ones).
+    """
+    managed = {name for name, _, _ in CALLS_CONSTRAINTS + CALLS_INDEXES}
+    managed |= {f"{name}_fallback_index" for name, _, _ in CALLS_CONSTRAINTS}
+
+    result = graph.query("""
+    SHOW INDEXES
+    YIELD name, state, type, labelsOrTypes, properties, owningConstraint
+    RETURN name, state, type, labelsOrTypes, properties, owningConstraint
+    """)
+    return [
+        row for row in result
+        if row["name"] in managed or row.get("owningConstraint") in managed
+    ]
+
+
+def drop_calls_schema(graph):
+    """
+    Drops every constraint and index managed by this module. Only used by the benchmark.
+    """
+    for name, _, _ in CALLS_CONSTRAINTS:
+        graph.query(f"DROP CONSTRAINT {name} IF EXISTS")
+        graph.query(f"DROP INDEX {name}_fallback_index IF EXISTS")
+    for name, _, _ in CALLS_INDEXES:
+        graph.query(f"DROP INDEX {name} IF EXISTS")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create and check the calls graph constraints and indexes.")
+    parser.add_argument("--status", action="store_true", help="Only print the current index states")
+    args = parser.parse_args()
+
+    graph = get_graph_connection(1)
+    if args.status:
+        print(json.dumps(get_schema_status(graph), indent=2, default=str))
+    else:
+        print(json.dumps(ensure_calls_schema(graph), indent=2, default=str))
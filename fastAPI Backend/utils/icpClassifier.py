@@ -0,0 +1,351 @@
+import glob
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from utils.transcriptWindows import split_speaker_utterances, AGENT_SPEAKER_LABELS
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# --- Local ICP classifier settings ---
+ICP_LOCAL_CLASSIFIER = os.getenv("ICP_LOCAL_CLASSIFIER", "true").lower() == "true"
+# Below this confidence the call is sent to the LLM classifier instead
+ICP_LOCAL_MIN_CONFIDENCE = float(os.getenv("ICP_LOCAL_MIN_CONFIDENCE", "0.75"))
+# Already-labelled enriched outputs used to train the optional naive Bayes model
+ICP_TRAINING_GLOB = os.getenv("ICP_TRAINING_GLOB", "/home/GraphRAG/call outputs/*/*_enriched.json")
+# The model is retrained this often, so calls labelled since the last training are used
+ICP_MODEL_RETRAIN_SECONDS = float(os.getenv("ICP_MODEL_RETRAIN_SECONDS", "3600"))
+# Naive Bayes posteriors are overconfident. The model only answers above this posterior, and its
+# confidence is the precision it reached above it on held-out calls (every ICP_MODEL_HOLDOUT_EVERY-th)
+ICP_MODEL_MIN_POSTERIOR = float(os.getenv("ICP_MODEL_MIN_POSTERIOR", "0.9"))
+ICP_MODEL_HOLDOUT_EVERY = int(os.getenv("ICP_MODEL_HOLDOUT_EVERY", "5"))
+# Fewer confident held-out predictions than this leave the precision unknown and the model unused
+ICP_MODEL_MIN_HOLDOUT = int(os.getenv("ICP_MODEL_MIN_HOLDOUT", "10"))
+# Without any title or industry clue the LLM rules fall back to pain points. Locally that is
+# only trusted when the called party repeats one segment's pain points this many times and
+# no other segment's pain point comes up; such an answer gets ICP_PAIN_POINT_CONFIDENCE.
+ICP_PAIN_POINT_MIN_MENTIONS = int(os.getenv("ICP_PAIN_POINT_MIN_MENTIONS", "2"))
+ICP_PAIN_POINT_CONFIDENCE = float(os.getenv("ICP_PAIN_POINT_CONFIDENCE", "0.8"))
+
+# Answer for calls that fit none of the segments (same as the LLM classifier)
+GENERAL_SEGMENT = "General"
+
+
+# ==============================================================================
+# 1. SEGMENT DEFINITIONS (same as the LLM classification prompt)
+# ==============================================================================
+# Job titles and industry keywords are the evidence; pain points add weight to a segment
+# with a title or industry clue, and decide on their own only when repeated and uncontested.
+ICP_SEGMENTS = {
+    "Retail-Enterprise": {
+        "titles": ["vp procurement", "vice president of procurement", "chief security officer", "property manager",
+                   "director of loss prevention", "loss prevention manager", "store manager"],
+        "industries": ["retail", "retailer", "store chain", "stores", "consumer goods", "property management",
+                       "shopping center", "shopping mall", "mall", "franchise"],
+        "pain_points": ["cost", "vendor lock-in", "lock in", "integration", "compliance"]
+    },
+    "Healthcare-Enterprise": {
+        "titles": ["cio", "cto", "director it security", "director of it security", "ccsfp", "chief medical officer",
+                   "hospital administrator"],
+        "industries": ["hospital", "hospitals", "healthcare", "health care", "health system", "clinic", "clinics",
+                       "medical center", "patients"],
+        "pain_points": ["hipaa", "patient data", "interoperability", "ehr"]
+    },
+    "Manufacturing-Enterprise": {
+        "titles": ["coo", "vp safety", "vice president of safety", "head of logistics", "plant manager",
+                   "operations manager", "ehs manager"],
+        "industries": ["factory", "factories", "manufacturing", "manufacturer", "industrial", "plant", "warehouse",
+                       "production line"],
+        "pain_points": ["downtime", "workforce compliance", "legacy system", "osha"]
+    },
+    "Financial-SME": {
+        "titles": ["head of security", "executive protection", "lawyer", "attorney", "managing partner",
+                   "general counsel", "paralegal"],
+        "industries": ["finance", "financial services", "financial firm", "bank", "banking", "family office", "law firm", "legal practice",
+                       "wealth management", "investment firm", "credit union"],
+        "pain_points": ["vendor support", "budget"]
+    },
+    "Film-Entertainment": {
+        "titles": ["studio exec", "studio executive", "producer", "head of distribution", "showrunner",
+                   "talent manager"],
+        "industries": ["studio", "studios", "entertainment", "media", "film", "movie", "production company",
+                       "streaming"],
+        "pain_points": ["ip leakage", "leak", "production delays", "talent management"]
+    }
+}
+
+SIGNAL_WEIGHTS = {"titles": 3, "industries": 2, "pain_points": 1}
+# Score at which a single uncontested segment is considered fully confident
+STRONG_SCORE = 4
+
+_patterns = {
+    segment: {
+        kind: [(term, re.compile(r"\b" + re.escape(term) + r"\b")) for term in terms]
+        for kind, terms in definition.items()
+    }
+    for segment, definition in ICP_SEGMENTS.items()
+}
+
+
+def _confidence(scores):
+    """
+    Confidence = share of the top segment in the total score, scaled down when
+    the top score itself is weak (e.g. a single industry keyword).
+    """
+    total = sum(scores.values())
+    if not total:
+        return None, 0.0
+    segment, top = max(scores.items(), key=lambda item: item[1])
+    return segment, round((top / total) * min(1.0, top / STRONG_SCORE), 3)
+
+
+def counterpart_text(transcript_text):
+    """
+    Returns what the called party (recipient or gatekeeper) said in a raw transcript.
+    Our agent's lines are left out: its pitch names industries and pain points for every
+    prospect. Empty when the transcript has no speaker markers.
+    """
+    return "\n".join(
+        text for speaker, text in split_speaker_utterances(transcript_text)
+        if speaker is not None and speaker not in AGENT_SPEAKER_LABELS
+    )
+
+
+def pain_point_segment(text):
+    """
+    Returns (segment, mentions, matched_terms) when exactly one segment's pain points
+    occur in `text`, else (None, 0, []).
+    """
+    text = text.lower()
+    hits = {}
+    for segment, kinds in _patterns.items():
+        terms = [(term, len(pattern.findall(text))) for term, pattern in kinds["pain_points"]]
+        terms = [(term, count) for term, count in terms if count]
+        if terms:
+            hits[segment] = terms
+    if len(hits) != 1:
+        return None, 0, []
+    segment, terms = next(iter(hits.items()))
+    return segment, sum(count for _, count in terms), [term for term, _ in terms]
+
+
+def score_segments(text):
+    """
+    Returns ({segment: score}, matched_terms) for the segments with at least one
+    title or industry keyword in `text`; their pain-point keywords add to the score.
+    """
+    text = text.lower()
+    scores = Counter()
+    matched = defaultdict(list)
+
+    for segment, kinds in _patterns.items():
+        points_by_kind = Counter()
+        terms = []
+        for kind, patterns in kinds.items():
+            for term, pattern in patterns:
+                hits = len(pattern.findall(text))
+                if not hits:
+                    continue
+                # Repeated mentions add a little, but one strong clue is worth more than many weak ones
+                points_by_kind[kind] += SIGNAL_WEIGHTS[kind] * (1 + math.log(hits))
+                terms.append(term)
+        if points_by_kind["titles"] or points_by_kind["industries"]:
+            scores[segment] = sum(points_by_kind.values())
+            matched[segment] = terms
+
+    return scores, dict(matched)
+
+
+# ==============================================================================
+# 2. OPTIONAL NAIVE BAYES MODEL TRAINED ON LABELLED CALL OUTPUTS
+# ==============================================================================
+_STOPWORDS = {"the", "and", "you", "that", "this", "for", "with", "are", "have", "was", "your", "our", "can",
+              "not", "but", "what", "all", "just", "will", "about", "they", "would", "there", "from", "yes", "okay"}
+
+_model = None
+_model_trained_at = None
+_model_lock = threading.Lock()
+
+
+def _tokenize(text):
+    return [t for t in re.findall(r"[a-z][a-z\-]{2,}", text.lower()) if t not in _STOPWORDS]
+
+
+def load_training_examples(pattern=ICP_TRAINING_GLOB):
+    """
+    Returns [(segment, counterpart text)] from enriched call outputs labelled by the LLM
+    classifier. Labels from this module (or from the cache, whose source is unknown) are
+    skipped so the model is never trained on its own answers. Outputs without an
+    icp_classification_path predate the local classifier, so the LLM labelled them.
+    """
+    examples = []
+    for file_path in sorted(glob.glob(pattern)):
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"WARNING: Skipping ICP training file {file_path}. Error: {e}")
+            continue
+
+        call_session = data.get("call_session") or {}
+        segment = call_session.get("matched_icp_segment")
+        if call_session.get("icp_classification_path", "llm") != "llm":
+            continue
+        if segment not in ICP_SEGMENTS and segment != GENERAL_SEGMENT:
+            continue
+
+        # Same view of the call as at prediction time: what the recipient and gatekeeper said
+        counterparts = {p.get("name") for p in data.get("participants", []) if p.get("role") in ("Recipient", "Gatekeeper")}
+        text = " ".join(turn.get("text", "") for turn in data.get("dialogue_turns", []) if turn.get("speaker_name") in counterparts)
+        examples.append((segment, text))
+    return examples
+
+
+def _fit(examples):
+    class_docs = Counter()
+    token_counts = defaultdict(Counter)
+    for segment, text in examples:
+        class_docs[segment] += 1
+        token_counts[segment].update(_tokenize(text))
+
+    vocabulary = set()
+    for counts in token_counts.values():
+        vocabulary.update(counts)
+
+    return {
+        "class_docs": dict(class_docs),
+        "token_counts": {segment: dict(counts) for segment, counts in token_counts.items()},
+        "token_totals": {segment: sum(counts.values()) for segment, counts in token_counts.items()},
+        "vocabulary_size": len(vocabulary)
+    }
+
+
+def _posterior(model, text):
+    """
+    Returns (segment, posterior probability) from the naive Bayes model.
+    """
+    tokens = _tokenize(text)
+    total_docs = sum(model["class_docs"].values())
+    log_probs = {}
+    for segment, docs in model["class_docs"].items():
+        counts = model["token_counts"][segment]
+        denominator = model["token_totals"][segment] + model["vocabulary_size"]
+        log_prob = math.log(docs / total_docs)
+        for token in tokens:
+            log_prob += math.log((counts.get(token, 0) + 1) / denominator)
+        log_probs[segment] = log_prob
+
+    best = max(log_probs.values())
+    normalizer = sum(math.exp(lp - best) for lp in log_probs.values())
+    segment = max(log_probs, key=log_probs.get)
+    return segment, round(1.0 / normalizer, 3)
+
+
+def train_icp_model(pattern=ICP_TRAINING_GLOB):
+    """
+    Trains a multinomial naive Bayes model (the segments plus "General") on LLM-labelled
+    call outputs and calibrates it on held-out calls: "holdout_precision" is the share of
+    held-out predictions above ICP_MODEL_MIN_POSTERIOR that matched the LLM label.
+    Returns None when fewer than two classes are labelled, since a one-class model
+    would always answer with that class.
+    """
+    examples = load_training_examples(pattern)
+    if len({segment for segment, _ in examples}) < 2:
+        return None
+
+    every = max(2, ICP_MODEL_HOLDOUT_EVERY)
+    held_out = examples[::every]
+    training = [example for i, example in enumerate(examples) if i % every]
+    confident = correct = 0
+    if len({segment for segment, _ in training}) >= 2:
+        holdout_model = _fit(training)
+        for segment, text in held_out:
+            predicted, posterior = _posterior(holdout_model, text)
+            if posterior >= ICP_MODEL_MIN_POSTERIOR:
+                confident += 1
+                correct += int(predicted == segment)
+
+    model = _fit(examples)
+    model["holdout_confident"] = confident
+    model["holdout_precision"] = round(correct / confident, 3) if confident >= ICP_MODEL_MIN_HOLDOUT else None
+    return model
+
+
+def _get_model():
+    global _model, _model_trained_at
+    if _model_trained_at is None or time.time() - _model_trained_at > ICP_MODEL_RETRAIN_SECONDS:
+        with _model_lock:
+            if _model_trained_at is None or time.time() - _model_trained_at > ICP_MODEL_RETRAIN_SECONDS:
+                _model = train_icp_model()
+                _model_trained_at = time.time()
+                if _model:
+                    print(f"Trained local ICP model on {sum(_model['class_docs'].values())} LLM-labelled calls "
+                          f"(held-out precision: {_model['holdout_precision']}).")
+    return _model
+
+
+def predict_with_model(model, text):
+    """
+    Returns (segment, calibrated confidence) from the naive Bayes model: the held-out
+    precision when the posterior clears ICP_MODEL_MIN_POSTERIOR, else 0.0.
+    """
+    segment, posterior = _posterior(model, text)
+    if model["holdout_precision"] is None or posterior < ICP_MODEL_MIN_POSTERIOR:
+        return segment, 0.0
+    return segment, model["holdout_precision"]
+
+
+# ==============================================================================
+# 3. LOCAL CLASSIFICATION ENTRY POINT
+# ==============================================================================
+def classify_icp_locally(transcript_text):
+    """
+    Classifies a transcript without calling an LLM, from what the recipient and
+    gatekeeper said. Title and industry keywords come first; without them, a repeated
+    and uncontested pain point (see pain_point_segment); the model may also answer "General".
+
+    Returns {"segment": ..., "confidence": ..., "path": "keywords" | "model", "matched_terms": [...]}
+    for the most confident local answer, or None if the local classifier is disabled or
+    the transcript has no speaker markers to tell the called party apart.
+    Callers compare "confidence" against ICP_LOCAL_MIN_CONFIDENCE to decide whether to fall back.
+    """
+    if not ICP_LOCAL_CLASSIFIER:
+        return None
+
+    text = counterpart_text(transcript_text)
+    if not text:
+        return None
+
+    scores, matched = score_segments(text)
+    segment, confidence = _confidence(scores)
+    best = {
+        "segment": segment,
+        "confidence": confidence,
+        "path": "keywords",
+        "matched_terms": matched.get(segment, [])
+    }
+
+    if not scores:
+        pain_segment, mentions, terms = pain_point_segment(text)
+        if pain_segment and mentions >= ICP_PAIN_POINT_MIN_MENTIONS:
+            best = {"segment": pain_segment, "confidence": ICP_PAIN_POINT_CONFIDENCE, "path": "keywords", "matched_terms": terms}
+
+    if confidence < ICP_LOCAL_MIN_CONFIDENCE:
+        model = _get_model()
+        if model:
+            model_segment, model_confidence = predict_with_model(model, text)
+            if model_confidence > confidence:
+                best = {"segment": model_segment, "confidence": model_confidence, "path": "model", "matched_terms": []}
+
+    return best
+
+
+if __name__ == "__main__":
+    import sys
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        print(json.dumps(classify_icp_locally(f.read()), indent=2))
@@ -0,0 +1,165 @@
+import argparse
+import json
+import os
+import re
+import time
+from utils.analysisRuns import load_analysis_state, save_analysis_state, clear_analysis_state, script_hash
+from utils.callAnalytics import merge_call_analytics
+from utils.scriptSections import parse_script, ScriptSectionError
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# "window" = every run analyzes the last ANALYSIS_WINDOW_CALLS calls from scratch,
+# "incremental" = every run analyzes only the calls ingested since the previous run
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "window")
+# New calls passed as full dialogues in incremental mode (the most recent ones); all new calls are aggregated
+INCREMENTAL_MAX_CALLS = int(os.getenv("INCREMENTAL_MAX_CALLS", "20"))
+# Characters kept of each section's evidence/action in the carried state
+INSIGHT_SUMMARY_CHARS = 400
+
+INSIGHT_STATE_NAME = "incremental_insights"
+# Status of a carried assessment whose section was rewritten after it was made
+STALE_STATUS = "STALE - SECTION CHANGED SINCE THIS ASSESSMENT"
+
+SECTION_BLOCK_PATTERN = re.compile(r"###\s*Section\s+(\d+)\s*:?\s*([^\n]*)\n(.*?)(?=\n\s*###?\s|\Z)", re.DOTALL | re.IGNORECASE)
+FIELD_PATTERN = re.compile(r"\*\*(Status|Evidence|Action)\*\*\s*:\s*(.*?)(?=\n\s*\*\*\w+\*\*\s*:|\Z)", re.DOTALL | re.IGNORECASE)
+
+
+def _cut(text):
+    text = " ".join(text.split())
+    return text if len(text) <= INSIGHT_SUMMARY_CHARS else text[:INSIGHT_SUMMARY_CHARS] + "..."
+
+
+# ==============================================================================
+# 1. PER-SECTION INSIGHTS FROM THE STEP 2 ANALYSIS
+# ==============================================================================
+def parse_section_insights(llm_insights):
+    """
+    Returns {section number: {"title", "status", "evidence", "action"}} for the
+    "### Section N: ..." blocks of the Step 2 analysis.
+    """
+    sections = {}
+    for match in SECTION_BLOCK_PATTERN.finditer(llm_insights):
+        fields = {name.lower(): _cut(value) for name, value in FIELD_PATTERN.findall(match.group(3))}
+        sections[int(match.group(1))] = {
+            "title": match.group(2).strip(),
+            "status": fields.get("status", "").strip("[] ").upper(),
+            "evidence": fields.get("evidence", ""),
+            "action": fields.get("action", "")
+        }
+    return sections
+
+
+# ==============================================================================
+# 2. STATE CARRIED BETWEEN RUNS
+# ==============================================================================
+def load_insight_state(vapi_script):
+    """
+    Returns the saved insight state if it belongs to this exact script, else None
+    (a script edited outside the pipeline invalidates the per-section insights, so the
+    next run starts over; scripts rebuilt by a run are carried over by rekey_insight_state).
+    """
+    state = load_analysis_state(INSIGHT_STATE_NAME)
+    if state is None or state.get("script_hash") != script_hash(vapi_script):
+        return None
+    return state
+
+
+def update_insight_state(state, vapi_script, llm_insights, call_analytics, to_session, new_calls):
+    """
+    Returns the state after a run: the running call statistics, the high-water mark of
+    analyzed sessions, and per section the latest status with how often it was flagged.
+    A section the new calls did not exercise keeps its earlier assessment. Counters of an
+    existing state are never reset: new_calls=0 re-assesses the calls it already covers.
+    """
+    previous_sections = (state or {}).get("sections", {})
+    sections = {}
+    for number, insight in parse_section_insights(llm_insights).items():
+        previous = previous_sections.get(str(number))
+        if previous and insight["status"].startswith("NOT EVALUATED"):
+            sections[str(number)] = previous
+            continue
+        flagged = (previous or {}).get("times_flagged", 0) + (1 if "NEEDS IMPROVEMENT" in insight["status"] else 0)
+        sections[str(number)] = {**insight, "times_flagged": flagged, "assessed_through_session": to_session}
+
+    return {
+        "script_hash": script_hash(vapi_script),
+        "last_session_num": to_session,
+        "runs": (state or {}).get("runs", 0) + 1,
+        "calls_analyzed": (state or {}).get("calls_analyzed", 0) + new_calls,
+        "analytics": call_analytics,
+        "sections": sections,
+        "updated_at": time.time()
+    }
+
+
+def rekey_insight_state(state, old_script, new_script):
+    """
+    Moves the state onto the script that replaced `old_script` (the rebuilt script pushed
+    to VAPI), so the next run continues from it. Sections whose text changed are marked
+    stale, because their assessment describes the old wording; the others, the running
+    statistics and the flag counts are kept.
+    """
+    try:
+        old_bodies = {section.number: section.body for section in parse_script(old_script).sections}
+        new_bodies = {section.number: section.body for section in parse_script(new_script).sections}
+        changed = {number for number in set(old_bodies) | set(new_bodies) if old_bodies.get(number) != new_bodies.get(number)}
+    except ScriptSectionError as e:
+        print(f"WARNING: Could not compare script sections ({e}); marking every section stale.")
+        changed = None
+
+    sections = {}
+    for number, insight in state["sections"].items():
+        if changed is None or int(number) in changed:
+            insight = {**insight, "status": STALE_STATUS}
+        sections[number] = insight
+    return {**state, "script_hash": script_hash(new_script), "sections": sections}
+
+
+def save_insight_state(state):
+    save_analysis_state(INSIGHT_STATE_NAME, state)
+
+
+def reset_insight_state():
+    """
+    Forgets the carried state; the next incremental run analyzes a full window again.
+    """
+    clear_analysis_state(INSIGHT_STATE_NAME)
+
+
+def merge_window_analytics(state, window_analytics):
+    """
+    Adds the statistics of the new calls to the running statistics of the state.
+    """
+    return merge_call_analytics(state.get("analytics"), window_analytics)
+
+
+def format_insight_state(state):
+    """
+    Renders the carried per-section assessments as a compact block for the analysis prompt.
+    """
+    lines = [
+        f"Assessments from {state['runs']} earlier run(s) covering {state['calls_analyzed']} calls "
+        f"(through session {state['last_session_num']}):"
+    ]
+    for number, insight in sorted(state["sections"].items(), key=lambda item: int(item[0])):
+        lines.append(
+            f"- Section {number} ({insight['title']}): {insight['status'] or 'UNKNOWN'}; flagged in {insight['times_flagged']} run(s). "
+            f"Evidence: {insight['evidence'] or '-'} Action: {insight['action'] or '-'}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or reset the state carried between incremental script analyses.")
+    parser.add_argument("--reset", action="store_true", help="Forget the state; the next run analyzes a full window")
+    args = parser.parse_args()
+
+    if args.reset:
+        reset_insight_state()
+        print("Incremental analysis state cleared.")
+    else:
+        state = load_analysis_state(INSIGHT_STATE_NAME)
+        print(json.dumps(state, indent=2) if state else "No incremental analysis state saved yet.")
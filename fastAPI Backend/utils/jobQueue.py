@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from utils.callTranscriptKG import construct_graph, PIPELINE_STEPS
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Number of transcripts processed at the same time
+KG_WORKERS = int(os.getenv("KG_WORKERS", "4"))
+# Jobs waiting or running before new enqueues are rejected with 503
+KG_MAX_PENDING_JOBS = int(os.getenv("KG_MAX_PENDING_JOBS", "100"))
+# Finished jobs kept in memory for GET /jobs/{id}; the oldest are dropped first
+KG_MAX_FINISHED_JOBS = int(os.getenv("KG_MAX_FINISHED_JOBS", "1000"))
+
+_executor = None
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _jobs_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=KG_WORKERS, thread_name_prefix="construct-kg")
+        return _executor
+
+
+def _pending_count():
+    return sum(1 for job in _jobs.values() if job["status"] in ("queued", "running"))
+
+
+def _evict_finished_jobs():
+    finished = [job_id for job_id, job in _jobs.items() if job["status"] in ("completed", "failed")]
+    for job_id in finished[:max(0, len(finished) - KG_MAX_FINISHED_JOBS)]:
+        del _jobs[job_id]
+
+
+def _update_job(job_id, **fields):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job.update(fields)
+
+
+def _set_step(job_id, step, status):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job["steps"][step] = status
+
+
+# ==============================================================================
+# WORKER
+# ==============================================================================
+def _run_job(job_id, transcript_text):
+    _update_job(job_id, status="running", started_at=time.time())
+
+    try:
+        result = construct_graph(transcript_text, on_step=lambda step, status: _set_step(job_id, step, status))
+    except (Exception, SystemExit) as e:
+        result = {"status": False, "message": f"Graph construction failed: {str(e)}", "step_failed": None}
+
+    if not result.get("status") and result.get("step_failed"):
+        _set_step(job_id, result["step_failed"], "failed")
+
+    _update_job(
+        job_id,
+        status="completed" if result.get("status") else "failed",
+        finished_at=time.time(),
+        result=result
+    )
+
+
+# ==============================================================================
+# PUBLIC API
+# ==============================================================================
+def enqueue_transcript(transcript_text):
+    """
+    Queues a transcript for construct_graph and returns its job ID immediately.
+    Raises a 503 HTTPException when too many jobs are already waiting.
+    """
+    executor = _get_executor()
+
+    with _jobs_lock:
+        if _pending_count() >= KG_MAX_PENDING_JOBS:
+            raise HTTPException(status_code=503, detail=f"Job queue is full ({KG_MAX_PENDING_JOBS} pending jobs). Try again later.")
+
+        job_id = uuid.uuid4().hex
+        _jobs[job_id] = {
+            "job_id": job_id,
+            "status": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "steps": {step: "pending" for step in PIPELINE_STEPS},
+            "result": None
+        }
+        _evict_finished_jobs()
+
+    executor.submit(_run_job, job_id, transcript_text)
+    print(f"Queued construct-kg job {job_id}")
+    return job_id
+
+
+def get_job(job_id):
+    """
+    Returns a snapshot of the job's status, or None if the job is unknown.
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        return {**job, "steps": dict(job["steps"])}
+
+
+def shutdown_job_queue(wait=True):
+    """
+    Stops accepting work and (optionally) waits for queued jobs to finish.
+    """
+    global _executor
+    with _jobs_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
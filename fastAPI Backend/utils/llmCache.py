@@ -0,0 +1,264 @@
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# --- LLM response cache settings ---
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "/home/GraphRAG/cache/llm_cache.sqlite3")
+# Total size of cached responses; the least recently used ones are evicted first
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+# Entries older than this are treated as misses and removed
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0, "bypassed": 0, "bytes_saved": 0}
+_stats_by_tag = defaultdict(lambda: {"hits": 0, "misses": 0, "bypassed": 0})
+_stats_lock = threading.Lock()
+_init_lock = threading.Lock()
+_initialized = False
+
+# Set by llm_cache_bypass(); read by every cached call made in the same context
+_bypass = contextvars.ContextVar("llm_cache_bypass", default=False)
+# Set by track_token_usage(); every cached call made in the same context adds its token usage
+_usage = contextvars.ContextVar("llm_token_usage", default=None)
+_usage_lock = threading.Lock()
+
+
+def _connect():
+    global _initialized
+    os.makedirs(os.path.dirname(LLM_CACHE_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(LLM_CACHE_PATH, timeout=30)
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    tag TEXT,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)")
+                conn.commit()
+                _initialized = True
+    return conn
+
+
+def _count(stat, tag=None, amount=1):
+    with _stats_lock:
+        _stats[stat] += amount
+        if tag and stat in ("hits", "misses", "bypassed"):
+            _stats_by_tag[tag][stat] += amount
+
+
+def llm_cache_key(model, params, prompt):
+    """
+    Returns the cache key of an LLM call: a SHA-256 over the model, its parameters
+    (temperature, max_tokens, ...) and the full prompt (string or messages).
+    """
+    payload = json.dumps({"model": model, "params": params, "prompt": prompt}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def llm_cache_bypass(enabled=True):
+    """
+    Within this block cached calls skip the lookup and call the model (the fresh
+    response still replaces the cached one). Thread pools must copy the context.
+    """
+    token = _bypass.set(enabled)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+@contextmanager
+def track_token_usage():
+    """
+    Yields a dict that sums the token usage of every cached call made inside the block
+    (including calls in thread pools that copy the context). Cache hits cost no tokens.
+    """
+    usage = {"llm_calls": 0, "cache_hits": 0, "input_tokens": 0, "output_tokens": 0}
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+def response_token_usage(response):
+    """
+    Returns (input_tokens, output_tokens) of a LangChain message (usage_metadata) or an
+    OpenAI Responses API result (usage); (0, 0) when the response carries no usage.
+    """
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata:
+        return metadata.get("input_tokens", 0), metadata.get("output_tokens", 0)
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        return getattr(usage, "input_tokens", 0) or 0, getattr(usage, "output_tokens", 0) or 0
+    return 0, 0
+
+
+def _record_usage(cache_hit=False, input_tokens=0, output_tokens=0):
+    usage = _usage.get()
+    if usage is None:
+        return
+    with _usage_lock:
+        usage["cache_hits" if cache_hit else "llm_calls"] += 1
+        usage["input_tokens"] += input_tokens
+        usage["output_tokens"] += output_tokens
+
+
+# ==============================================================================
+# CACHE READ / WRITE
+# ==============================================================================
+def get_cached_response(cache_key, tag=None):
+    """
+    Returns the cached response text, or None on a miss or an expired entry.
+    """
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is not None and time.time() - row[1] > LLM_CACHE_TTL_SECONDS:
+                conn.execute("DELETE FROM llm_cache WHERE cache_key = ?", (cache_key,))
+                conn.commit()
+                _count("expired")
+                row = None
+            elif row is not None:
+                conn.execute("UPDATE llm_cache SET last_access = ? WHERE cache_key = ?", (time.time(), cache_key))
+                conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"WARNING: LLM cache lookup failed. Error: {e}")
+        return None
+
+    if row is None:
+        _count("misses", tag)
+        return None
+
+    _count("hits", tag)
+    _count("bytes_saved", amount=len(row[0].encode("utf-8")))
+    return row[0]
+
+
+def store_response(cache_key, model, response, tag=None):
+    """
+    Stores (or refreshes) a response and evicts the least recently used entries
+    until the cache is back under LLM_CACHE_MAX_BYTES.
+    """
+    try:
+        now = time.time()
+        conn = _connect()
+        try:
+            conn.execute("""
+            INSERT INTO llm_cache (cache_key, model, tag, response, size, created_at, last_access)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(cache_key) DO UPDATE SET
+                response = excluded.response,
+                size = excluded.size,
+                created_at = excluded.created_at,
+                last_access = excluded.last_access
+            """, (cache_key, model, tag, response, len(response.encode("utf-8")), now, now))
+            evicted = conn.execute("""
+            DELETE FROM llm_cache WHERE cache_key IN (
+                SELECT cache_key FROM (
+                    SELECT cache_key, SUM(size) OVER (ORDER BY last_access DESC, cache_key) AS running_size
+                    FROM llm_cache
+                ) WHERE running_size > ?
+            )
+            """, (LLM_CACHE_MAX_BYTES,)).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        _count("stores")
+        if evicted:
+            _count("evictions", amount=evicted)
+    except Exception as e:
+        print(f"WARNING: Could not store LLM response in cache. Error: {e}")
+
+
+def cached_llm_call(call, model, params, prompt, tag=None, bypass=None, text=None):
+    """
+    Returns the text response of call(), served from the cache when the same model,
+    parameters and prompt were answered before. If `text` is given, call() returns the
+    raw response and text(response) its text, so the token usage can be recorded.
+    `bypass=True` (or an enclosing llm_cache_bypass()) forces a fresh call.
+    """
+    def fresh_call():
+        response = call()
+        if text is None:
+            _record_usage()
+            return response
+        _record_usage(False, *response_token_usage(response))
+        return text(response)
+
+    if not LLM_CACHE_ENABLED:
+        return fresh_call()
+
+    cache_key = llm_cache_key(model, params, prompt)
+    if bypass if bypass is not None else _bypass.get():
+        _count("bypassed", tag)
+    else:
+        cached = get_cached_response(cache_key, tag)
+        if cached is not None:
+            print(f"LLM cache hit ({tag or model}).")
+            _record_usage(cache_hit=True)
+            return cached
+
+    response = fresh_call()
+    if isinstance(response, str) and response:
+        store_response(cache_key, model, response, tag)
+    return response
+
+
+def get_llm_cache_stats():
+    """
+    Returns hit/miss/bypass counters and bytes saved for this process (overall and per
+    pipeline step), plus the current number and size of cached responses.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+        stats["by_step"] = {tag: dict(counts) for tag, counts in _stats_by_tag.items()}
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    stats["enabled"] = LLM_CACHE_ENABLED
+    stats["max_bytes"] = LLM_CACHE_MAX_BYTES
+    stats["ttl_seconds"] = LLM_CACHE_TTL_SECONDS
+
+    try:
+        conn = _connect()
+        try:
+            entries, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+            stats["entries"] = entries
+            stats["total_bytes"] = total_bytes
+        finally:
+            conn.close()
+    except Exception:
+        stats["entries"] = None
+        stats["total_bytes"] = None
+
+    return stats
+
+
+if __name__ == "__main__":
+    print(json.dumps(get_llm_cache_stats(), indent=2))
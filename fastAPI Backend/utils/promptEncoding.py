@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+from dotenv import load_dotenv
+
+# tiktoken is only needed for exact token counts; without it counts are estimated
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Load environment variables
+load_dotenv()
+
+# Encoding used for call records in analysis prompts: json / compact / lines
+PROMPT_ENCODING = os.getenv("PROMPT_ENCODING", "lines")
+# Model whose tokenizer is used for token reports
+PROMPT_TOKEN_MODEL = os.getenv("PROMPT_TOKEN_MODEL", "gpt-5-mini")
+
+# Short codes for the turn node labels (as returned by the call-record queries)
+TURN_TYPE_CODES = {
+    "Opening": "OPN",
+    "Closing": "CLS",
+    "GatekeeperDialogue": "GK",
+    "AgentQuestion": "AQ",
+    "AgentResponse": "AR",
+    "RapportBuilding": "RB",
+    "CustomerQuestion": "CQ",
+    "CustomerResponse": "CR",
+    "CustomerObjection": "OBJ",
+    "CustomerPainPoint": "PAIN",
+    "CustomerBuyingSignal": "BUY",
+    "TechnicalIssue": "TECH",
+}
+
+
+# ==============================================================================
+# 1. ENCODERS
+# ==============================================================================
+def encode_json(call_records):
+    """
+    The original prompt format: indented JSON.
+    """
+    return json.dumps(call_records, indent=2)
+
+
+def encode_compact(call_records):
+    """
+    Same JSON without indentation or spaces after separators.
+    """
+    return json.dumps(call_records, separators=(",", ":"))
+
+
+def encode_lines(call_records):
+    """
+    Line-oriented format: one header line per call, one line per turn, with short
+    codes for turn types and per-call speaker codes (S1, S2, ... in participant order).
+    A legend with the codes is written once at the top.
+    """
+    type_legend = " ".join(f"{code}={label}" for label, code in TURN_TYPE_CODES.items())
+    lines = [
+        "FORMAT: '# <session> | <outcome> | score <quality> | <speaker codes>' then '<turn>|<speaker>|<type>|<text>' per turn.",
+        f"TURN TYPES: {type_legend}",
+    ]
+
+    for record in call_records:
+        speakers = {}
+        for name in record.get("participants") or []:
+            speakers.setdefault(name, f"S{len(speakers) + 1}")
+        for turn in record.get("dialogue_flow") or []:
+            if turn.get("speaker_name") is not None:
+                speakers.setdefault(turn["speaker_name"], f"S{len(speakers) + 1}")
+
+        speaker_legend = " ".join(f"{code}={name}" for name, code in speakers.items())
+        lines.append(f"# {record.get('session_id')} | {record.get('outcome')} | score {record.get('quality_score')} | {speaker_legend}")
+
+        for turn in record.get("dialogue_flow") or []:
+            speaker = speakers.get(turn.get("speaker_name"), "?")
+            turn_type = TURN_TYPE_CODES.get(turn.get("turn_type"), turn.get("turn_type"))
+            text = " ".join(str(turn.get("text") or "").split())
+            lines.append(f"{turn.get('turn_number')}|{speaker}|{turn_type}|{text}")
+
+    return "\n".join(lines)
+
+
+ENCODERS = {
+    "json": encode_json,
+    "compact": encode_compact,
+    "lines": encode_lines,
+}
+
+
+def register_encoder(name, encoder):
+    """
+    Adds a prompt encoding (a function taking the call records and returning a string).
+    """
+    ENCODERS[name] = encoder
+
+
+def encode_call_records(call_records, encoding=None):
+    """
+    Serializes call records for a prompt using `encoding` (PROMPT_ENCODING by default).
+    """
+    encoding = encoding or PROMPT_ENCODING
+    if encoding not in ENCODERS:
+        raise ValueError(f"Unknown prompt encoding '{encoding}'. Available: {', '.join(ENCODERS)}")
+    return ENCODERS[encoding](call_records)
+
+
+# ==============================================================================
+# 2. TOKEN REPORT
+# ==============================================================================
+def count_tokens(text, model=PROMPT_TOKEN_MODEL):
+    """
+    Counts tokens with the model's tokenizer. Falls back to o200k_base for models
+    tiktoken does not know yet, and to a 4-characters-per-token estimate without tiktoken.
+    """
+    if tiktoken is None:
+        return len(text) // 4
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("o200k_base")
+    return len(encoding.encode(text))
+
+
+def token_report(call_records, model=PROMPT_TOKEN_MODEL):
+    """
+    Compares every registered encoding on the same call records: characters, tokens,
+    and tokens relative to the indented JSON baseline. Without tiktoken the token counts
+    are estimates and no ratio is reported: a characters/4 estimate says nothing about
+    how the tokenizer treats JSON punctuation versus the short codes of "lines".
+    """
+    baseline = count_tokens(encode_json(call_records), model)
+    report = {
+        "calls": len(call_records),
+        "model": model,
+        "exact_counts": tiktoken is not None,
+        "encodings": {}
+    }
+    for name in ENCODERS:
+        text = encode_call_records(call_records, name)
+        tokens = count_tokens(text, model)
+        report["encodings"][name] = {
+            "characters": len(text),
+            "tokens": tokens,
+            "tokens_per_call": round(tokens / len(call_records), 1) if call_records else 0,
+            "vs_json": round(tokens / baseline, 3) if baseline and tiktoken is not None else None
+        }
+    if tiktoken is None:
+        report["note"] = "tiktoken is not installed: token counts are characters/4 estimates and vs_json is omitted."
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare prompt encodings of call records by token count.")
+    parser.add_argument("records", nargs="?", default="calls.json", help="JSON file of call records (written by get_last_n_call_records)")
+    parser.add_argument("--model", default=PROMPT_TOKEN_MODEL)
+    parser.add_argument("--show", choices=list(ENCODERS), help="Also print the records in this encoding")
+    args = parser.parse_args()
+
+    with open(args.records, "r", encoding="utf-8") as f:
+        records = json.load(f)
+
+    print(json.dumps(token_report(records, args.model), indent=2))
+    if args.show:
+        print(encode_call_records(records, args.show))
@@ -0,0 +1,230 @@
+import argparse
+import math
+import os
+import re
+import threading
+from collections import Counter
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+REFERENCE_FILE_PATH = os.getenv("REFERENCE_FILE_PATH", "/home/GraphRAG/reference.txt")
+# Target size of a chunk; short sections stay a single chunk
+REFERENCE_CHUNK_CHARS = int(os.getenv("REFERENCE_CHUNK_CHARS", "1200"))
+# Passages returned per improvement area, and in total
+REFERENCE_TOP_K = int(os.getenv("REFERENCE_TOP_K", "3"))
+REFERENCE_MAX_PASSAGES = int(os.getenv("REFERENCE_MAX_PASSAGES", "8"))
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+SECTION_PATTERN = re.compile(r"<SECTION\s+([^>]*)>(.*?)</SECTION[^>]*>", re.DOTALL)
+ATTRIBUTE_PATTERN = re.compile(r"(\w+)='([^']*)'")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "has", "have", "i", "if", "in",
+    "into", "is", "it", "its", "me", "my", "of", "on", "or", "so", "that", "the", "their", "them", "then",
+    "there", "they", "this", "to", "was", "we", "were", "what", "when", "which", "who", "will", "with",
+    "you", "your", "our", "us", "can", "do", "not", "no", "yes",
+    # Words of the Step 2 output template, not of the improvement itself
+    "section", "status", "evidence", "action", "need", "improvement", "recommendation", "call", "data"
+}
+
+_index = None
+_index_lock = threading.Lock()
+
+
+# ==============================================================================
+# 1. PARSING AND CHUNKING
+# ==============================================================================
+def tokenize(text):
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS or len(token) < 2:
+            continue
+        # Light stemming so "objections"/"objection" and "asking"/"ask" match
+        for suffix in ("ing", "ed", "es", "s"):
+            if len(token) > len(suffix) + 3 and token.endswith(suffix):
+                token = token[:-len(suffix)]
+                break
+        if token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+def parse_reference_sections(content):
+    """
+    Returns the <SECTION type=... id=... category=...> blocks of the reference file
+    as dicts with their attributes and text.
+    """
+    return [
+        {"attributes": dict(ATTRIBUTE_PATTERN.findall(match.group(1))), "text": match.group(2).strip()}
+        for match in SECTION_PATTERN.finditer(content)
+    ]
+
+
+def chunk_section(section, chunk_chars=REFERENCE_CHUNK_CHARS):
+    """
+    Splits a section into chunks of roughly `chunk_chars` characters on line boundaries.
+    """
+    chunks, current = [], []
+    for line in section["text"].splitlines():
+        current.append(line)
+        if sum(len(l) for l in current) >= chunk_chars:
+            chunks.append("\n".join(current).strip())
+            current = []
+    if current and "\n".join(current).strip():
+        # A short tail is merged into the previous chunk instead of standing alone
+        if chunks and sum(len(l) for l in current) < chunk_chars // 3:
+            chunks[-1] = chunks[-1] + "\n" + "\n".join(current).strip()
+        else:
+            chunks.append("\n".join(current).strip())
+    return chunks
+
+
+# ==============================================================================
+# 2. BM25 INDEX
+# ==============================================================================
+class ReferenceIndex:
+    """
+    BM25 index over the chunks of the reference file. Each chunk also carries its
+    section's type and category as searchable terms.
+    """
+
+    def __init__(self, path, mtime, sections, chunk_chars=REFERENCE_CHUNK_CHARS):
+        self.path = path
+        self.mtime = mtime
+        self.sections = sections
+        self.chunks = []
+        for section_no, section in enumerate(sections):
+            label_terms = " ".join(section["attributes"].get(key, "") for key in ("type", "category")).replace("-", " ").replace("_", " ")
+            for chunk_no, text in enumerate(chunk_section(section, chunk_chars)):
+                self.chunks.append({
+                    "section_no": section_no,
+                    "chunk_no": chunk_no,
+                    "attributes": section["attributes"],
+                    "text": text,
+                    "terms": Counter(tokenize(text) + tokenize(label_terms) * 2)
+                })
+
+        self.avg_length = (sum(sum(c["terms"].values()) for c in self.chunks) / len(self.chunks)) if self.chunks else 0.0
+        document_frequency = Counter(term for chunk in self.chunks for term in chunk["terms"])
+        total = len(self.chunks)
+        self.idf = {
+            term: math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def score(self, query_terms, chunk):
+        length = sum(chunk["terms"].values())
+        score = 0.0
+        for term in set(query_terms):
+            tf = chunk["terms"].get(term, 0)
+            if not tf:
+                continue
+            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / self.avg_length)
+            score += self.idf[term] * tf * (BM25_K1 + 1) / norm
+        return score
+
+    def search(self, query, top_k=REFERENCE_TOP_K):
+        """
+        Returns the `top_k` best matching chunks (with their score) for a query text.
+        """
+        query_terms = tokenize(query)
+        scored = [(self.score(query_terms, chunk), chunk) for chunk in self.chunks]
+        scored = [item for item in scored if item[0] > 0]
+        scored.sort(key=lambda item: -item[0])
+        return [{**chunk, "score": round(score, 3)} for score, chunk in scored[:top_k]]
+
+
+def build_reference_index(path=REFERENCE_FILE_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    index = ReferenceIndex(path, os.path.getmtime(path), parse_reference_sections(content))
+    print(f"Reference index built: {len(index.sections)} sections, {len(index.chunks)} chunks from {path}")
+    return index
+
+
+def get_reference_index(path=REFERENCE_FILE_PATH):
+    """
+    Returns the shared index, rebuilding it when the reference file changed on disk.
+    """
+    global _index
+    mtime = os.path.getmtime(path)
+    index = _index
+    if index is not None and index.path == path and index.mtime == mtime:
+        return index
+
+    with _index_lock:
+        if _index is None or _index.path != path or _index.mtime != mtime:
+            _index = build_reference_index(path)
+        return _index
+
+
+# ==============================================================================
+# 3. QUERIES FROM THE STEP 2 ANALYSIS
+# ==============================================================================
+def improvement_queries(llm_insights):
+    """
+    Splits the Step 2 analysis into one query per section marked NEEDS IMPROVEMENT
+    (section heading, evidence and action). Falls back to the whole analysis.
+    """
+    blocks = re.split(r"\n(?=\s*###\s)", llm_insights)
+    queries = []
+    for block in blocks:
+        # The last block runs into the next "## ..." part of the analysis; cut it there
+        block = re.split(r"\n\s*##\s", block)[0]
+        heading = block.strip().splitlines()[0] if block.strip() else ""
+        if heading.lstrip().startswith("###") and "NEEDS IMPROVEMENT" in block.upper():
+            queries.append((heading.strip("# ").strip(), block))
+    return queries or [("analysis", llm_insights)]
+
+
+def retrieve_reference_passages(llm_insights, top_k=REFERENCE_TOP_K, max_passages=REFERENCE_MAX_PASSAGES, path=REFERENCE_FILE_PATH):
+    """
+    Returns the reference passages relevant to the improvement areas of the analysis,
+    best first, each with the improvement areas it was retrieved for.
+    """
+    index = get_reference_index(path)
+    passages = {}
+    for area, query in improvement_queries(llm_insights):
+        for hit in index.search(query, top_k):
+            key = (hit["section_no"], hit["chunk_no"])
+            passage = passages.setdefault(key, {**hit, "relevant_for": []})
+            passage["score"] = max(passage["score"], hit["score"])
+            passage["relevant_for"].append(area)
+    return sorted(passages.values(), key=lambda p: -p["score"])[:max_passages]
+
+
+def format_reference_passages(passages):
+    """
+    Renders the passages grouped by reference section, in document order.
+    """
+    if not passages:
+        return "No relevant reference material found for the identified improvements."
+
+    lines = ["## EXTRACTED REFERENCE MATERIAL", ""]
+    for passage in sorted(passages, key=lambda p: (p["section_no"], p["chunk_no"])):
+        attributes = passage["attributes"]
+        lines += [
+            f"### {attributes.get('type', 'reference')}: {attributes.get('category', attributes.get('id', ''))}",
+            f"**Relevant for**: {', '.join(dict.fromkeys(passage['relevant_for']))}",
+            "**Content**:",
+            passage["text"],
+            ""
+        ]
+    return "\n".join(lines).strip()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the local BM25 index over the reference file.")
+    parser.add_argument("query", help="Free text, e.g. an improvement area from the analysis")
+    parser.add_argument("--path", default=REFERENCE_FILE_PATH)
+    parser.add_argument("--top-k", type=int, default=REFERENCE_TOP_K)
+    args = parser.parse_args()
+
+    for hit in get_reference_index(args.path).search(args.query, args.top_k):
+        print(f"[{hit['score']}] {hit['attributes'].get('category')} #{hit['chunk_no']}: {hit['text'][:200]}...")
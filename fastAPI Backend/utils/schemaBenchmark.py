@@ -0,0 +1,189 @@
+import argparse
+import json
+import os
+import statistics
+import time
+from utils.graphConnection import connect_to_database, NEO4J_DATABASE1
+from utils.graphSchema import ensure_calls_schema, drop_calls_schema
+from utils.callTranscriptKG import (
+    DialogueGraphData, CallSession, Participant, DialogueTurn,
+    ingest_dialogue_flow_batched, score_dialogue_extraction
+)
+from utils.graphRAG import fetch_call_records
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Scratch database the benchmark is allowed to wipe. Never the calls database.
+NEO4J_BENCHMARK_DATABASE = os.getenv("NEO4J_BENCHMARK_DATABASE")
+
+SYNTHETIC_AGENT = "Synthetic Agent"
+SYNTHETIC_PRODUCT = "Synthetic Compliance Solution"
+SYNTHETIC_OUTCOMES = ["Meeting Scheduled", "Rejected", "Gatekeeper Block", "Voicemail", "Follow-up Required"]
+SYNTHETIC_SEGMENTS = ["Retail-Enterprise", "Healthcare-Enterprise", "Manufacturing-Enterprise", "Financial-SME", "Film-Entertainment"]
+
+
+# ==============================================================================
+# 1. SYNTHETIC GRAPH GENERATION
+# ==============================================================================
+def _wipe(graph):
+    graph.query("MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS")
+
+
+def generate_synthetic_calls(graph, calls, turns_per_call, chunk_size=1000):
+    """
+    Writes `calls` synthetic calls shaped like real ingested ones: a CallSession with
+    participants, a product link and a NEXT-chained dialogue of `turns_per_call` turns.
+    """
+    graph.query("""
+    MERGE (:Person {name: $agent, role: 'Agent'})
+    MERGE (:Product {name: $product})
+    WITH 1 AS ignored
+    UNWIND $segments AS segment
+    MERGE (:IdealTargetCustomer {segment: segment})
+    """, params={"agent": SYNTHETIC_AGENT, "product": SYNTHETIC_PRODUCT, "segments": SYNTHETIC_SEGMENTS})
+
+    for start in range(1, calls + 1, chunk_size):
+        end = min(start + chunk_size - 1, calls)
+        graph.query("""
+        MATCH (agent:Person {name: $agent})
+        MATCH (product:Product {name: $product})
+        UNWIND range($start, $end) AS i
+        CREATE (cs:CallSession {
+            session_id: 'call_transcript_' + i,
+            session_num: i,
+            outcome: $outcomes[i % size($outcomes)],
+            product_focus: $product,
+            matched_icp_segment: $segments[i % size($segments)],
+            quality_score: i % 80,
+            quality_status: 'Review Recommended'
+        })
+        CREATE (recipient:Person {name: 'Synthetic Recipient ' + i, role: 'Recipient'})
+        CREATE (agent)-[:PARTICIPATED_IN]->(cs)
+        CREATE (recipient)-[:PARTICIPATED_IN]->(cs)
+        CREATE (cs)-[:FOCUSES_ON]->(product)
+        WITH cs, agent, recipient
+        UNWIND range(1, $turns) AS n
+        CREATE (t:AgentQuestion {text: 'Synthetic line ' + n + ' of ' + cs.session_id, turn_number: n})
+        CREATE (t)-[:RAISED_IN]->(cs)
+        FOREACH (_ IN CASE WHEN n % 2 = 1 THEN [1] ELSE [] END | CREATE (agent)-[:MADE_BY]->(t))
+        FOREACH (_ IN CASE WHEN n % 2 = 0 THEN [1] ELSE [] END |
+            CREATE (recipient)-[:MADE_BY]->(t)
+            REMOVE t:AgentQuestion
+            SET t:CustomerResponse)
+        WITH cs, t ORDER BY t.turn_number
+        WITH cs, collect(t) AS turns
+        UNWIND range(0, size(turns) - 2) AS k
+        WITH turns[k] AS previous_turn, turns[k + 1] AS next_turn
+        CREATE (previous_turn)-[:NEXT]->(next_turn)
+        """, params={
+            "agent": SYNTHETIC_AGENT, "product": SYNTHETIC_PRODUCT, "start": start, "end": end,
+            "turns": turns_per_call, "outcomes": SYNTHETIC_OUTCOMES, "segments": SYNTHETIC_SEGMENTS
+        })
+        print(f"Generated synthetic calls {start}-{end}")
+
+
+def _synthetic_call(session_num, turns_per_call):
+    recipient = f"Synthetic Recipient {session_num}"
+    turns = [
+        DialogueTurn(
+            turn_number=n,
+            speaker_name=SYNTHETIC_AGENT if n % 2 else recipient,
+            text=f"Synthetic benchmark line {n}",
+            turn_type="Agent_Question" if n % 2 else ("Customer_Objection" if n % 4 == 0 else "Customer_Response")
+        )
+        for n in range(1, turns_per_call + 1)
+    ]
+    return DialogueGraphData(
+        call_session=CallSession(
+            session_id=f"call_transcript_{session_num}",
+            outcome="Rejected",
+            product_focus=SYNTHETIC_PRODUCT,
+            matched_icp_segment=SYNTHETIC_SEGMENTS[session_num % len(SYNTHETIC_SEGMENTS)]
+        ),
+        participants=[
+            Participant(name=SYNTHETIC_AGENT, role="Agent"),
+            Participant(name=recipient, role="Recipient")
+        ],
+        dialogue_turns=turns
+    )
+
+
+# ==============================================================================
+# 2. MEASUREMENTS
+# ==============================================================================
+def _measure(graph, next_session_num, samples, turns_per_call, record_limit):
+    ingest_ms = []
+    for offset in range(samples):
+        data = _synthetic_call(next_session_num + offset, turns_per_call)
+        start = time.perf_counter()
+        ingest_dialogue_flow_batched(graph, data, score_dialogue_extraction(data))
+        ingest_ms.append((time.perf_counter() - start) * 1000)
+
+    query_ms = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        fetch_call_records(graph, record_limit)
+        query_ms.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "ingest_ms_median": round(statistics.median(ingest_ms), 2),
+        "ingest_ms_p95": round(sorted(ingest_ms)[int(0.95 * (len(ingest_ms) - 1))], 2),
+        "call_records_ms_median": round(statistics.median(query_ms), 2),
+        "call_records_ms_p95": round(sorted(query_ms)[int(0.95 * (len(query_ms) - 1))], 2)
+    }
+
+
+def run_schema_benchmark(database, calls=10000, turns_per_call=20, samples=20, record_limit=10):
+    """
+    Builds a synthetic graph of `calls` calls in a scratch database and measures ingest
+    latency and get_last_n_call_records latency without and then with the calls schema.
+    The scratch database is wiped before and after the run.
+    """
+    if not database or database == NEO4J_DATABASE1:
+        raise ValueError("Refusing to benchmark against the calls database. Set NEO4J_BENCHMARK_DATABASE to a scratch database.")
+
+    graph = connect_to_database(database)
+    _wipe(graph)
+    drop_calls_schema(graph)
+
+    try:
+        generate_synthetic_calls(graph, calls, turns_per_call)
+
+        print("Measuring without constraints/indexes...")
+        before = _measure(graph, calls + 1, samples, turns_per_call, record_limit)
+
+        print("Creating constraints/indexes...")
+        ensure_calls_schema(graph)
+
+        print("Measuring with constraints/indexes...")
+        after = _measure(graph, calls + samples + 1, samples, turns_per_call, record_limit)
+    finally:
+        _wipe(graph)
+        drop_calls_schema(graph)
+        graph._driver.close()
+
+    return {
+        "calls": calls,
+        "turns_per_call": turns_per_call,
+        "samples": samples,
+        "before": before,
+        "after": after,
+        "speedup": {
+            key: round(before[key] / after[key], 1) if after[key] else None
+            for key in before
+        }
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Before/after benchmark of the calls graph schema on synthetic data.")
+    parser.add_argument("--database", default=NEO4J_BENCHMARK_DATABASE, help="Scratch database (wiped!)")
+    parser.add_argument("--calls", type=int, default=10000)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=10, help="Calls fetched per get_last_n_call_records query")
+    args = parser.parse_args()
+
+    print(json.dumps(run_schema_benchmark(args.database, args.calls, args.turns, args.samples, args.limit), indent=2))
@@ -0,0 +1,210 @@
+import argparse
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Union
+
+
+# <SECTION 3; type='objection' id='obj_2' category='phone-privacy-concern'> ... </SECTION 3>
+SECTION_PATTERN = re.compile(r"<SECTION (\d+);([^>]*)>(.*?)</SECTION \1>", re.DOTALL)
+ATTRIBUTE_PATTERN = re.compile(r"(\w+)='([^']*)'")
+LABEL_PATTERN = re.compile(r"\b(Before|After)\s*:", re.IGNORECASE)
+# "### Section 3: Objection 2 (obj_2)" in the Step 2 analysis
+ANALYSIS_HEADING_PATTERN = re.compile(r"###\s*Section\s+(\d+)\b", re.IGNORECASE)
+
+
+class ScriptSectionError(ValueError):
+    """Raised when a script cannot be parsed or an update would change more than its section."""
+
+
+@dataclass
+class ScriptSection:
+    number: int
+    header: str  # the exact opening tag, e.g. "<SECTION 3; type='objection' ...>"
+    body: str    # everything between the opening and the closing tag, byte for byte
+    footer: str  # the exact closing tag, e.g. "</SECTION 3>"
+    attributes: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def section_id(self):
+        return self.attributes.get("id")
+
+    def render(self):
+        return self.header + self.body + self.footer
+
+
+@dataclass
+class ScriptModel:
+    # Alternating plain text and sections; joining them gives back the original script
+    parts: List[Union[str, ScriptSection]]
+
+    @property
+    def sections(self):
+        return [part for part in self.parts if isinstance(part, ScriptSection)]
+
+    def section(self, number):
+        for section in self.sections:
+            if section.number == number:
+                return section
+        return None
+
+    def sections_by_id(self, section_id):
+        # Ids are not unique in the VAPI script (close_1 is used by sections 11 and 12)
+        return [section for section in self.sections if section.section_id == section_id]
+
+    def render(self):
+        return "".join(part if isinstance(part, str) else part.render() for part in self.parts)
+
+
+# ==============================================================================
+# 1. PARSING
+# ==============================================================================
+def parse_script(script):
+    """
+    Parses a VAPI script into plain text and <SECTION n; ...>...</SECTION n> blocks.
+    The model renders back to exactly the same string.
+    """
+    parts = []
+    position = 0
+    seen = set()
+    for match in SECTION_PATTERN.finditer(script):
+        number = int(match.group(1))
+        if number in seen:
+            raise ScriptSectionError(f"Section {number} appears more than once in the script.")
+        seen.add(number)
+
+        parts.append(script[position:match.start()])
+        header_end = match.start(3)
+        body_end = match.end(3)
+        parts.append(ScriptSection(
+            number=number,
+            header=script[match.start():header_end],
+            body=match.group(3),
+            footer=script[body_end:match.end()],
+            attributes=dict(ATTRIBUTE_PATTERN.findall(match.group(2)))
+        ))
+        position = match.end()
+    parts.append(script[position:])
+
+    model = ScriptModel(parts)
+    if model.render() != script:
+        raise ScriptSectionError("Parsed script does not render back to the original.")
+    return model
+
+
+def parse_improved_sections(improved_sections_output):
+    """
+    Extracts the "After:" versions from the Step 4 Before/After output.
+    Returns {section number: section body}. A later After block for the same section wins.
+    """
+    labels = [(match.start(), match.group(1).lower()) for match in LABEL_PATTERN.finditer(improved_sections_output)]
+
+    improved = {}
+    for match in SECTION_PATTERN.finditer(improved_sections_output):
+        preceding = [label for start, label in labels if start < match.start()]
+        if preceding and preceding[-1] == "after":
+            improved[int(match.group(1))] = match.group(3)
+    return improved
+
+
+def flagged_sections(llm_insights):
+    """
+    Returns {section number: analysis block} for the "### Section N: ..." blocks of the
+    Step 2 analysis whose status is NEEDS IMPROVEMENT.
+    """
+    flagged = {}
+    for block in re.split(r"\n(?=\s*###\s)", llm_insights):
+        # The last block runs into the next "## ..." part of the analysis; cut it there
+        block = re.split(r"\n\s*##\s", block)[0].strip()
+        heading = ANALYSIS_HEADING_PATTERN.match(block)
+        if heading and "NEEDS IMPROVEMENT" in block.upper():
+            flagged[int(heading.group(1))] = block
+    return flagged
+
+
+# ==============================================================================
+# 2. SPLICING
+# ==============================================================================
+def _keep_outer_whitespace(original_body, new_body):
+    # Keep the original line breaks/indentation around the content so the layout does not shift
+    leading = original_body[:len(original_body) - len(original_body.lstrip())]
+    trailing = original_body[len(original_body.rstrip()):]
+    return leading + new_body.strip() + trailing
+
+
+def apply_section_updates(script, updates):
+    """
+    Replaces the bodies of the given sections ({section number: new body}) and returns
+    (new script, report). Section tags are kept exactly as in the original.
+    Raises ScriptSectionError if anything outside the updated sections would change.
+    """
+    model = parse_script(script)
+    report = {"updated": [], "unchanged": [], "unknown": []}
+
+    for number, new_body in sorted(updates.items()):
+        section = model.section(number)
+        if section is None:
+            report["unknown"].append(number)
+            continue
+        body = _keep_outer_whitespace(section.body, new_body)
+        if body == section.body:
+            report["unchanged"].append(number)
+            continue
+        section.body = body
+        report["updated"].append(number)
+
+    rebuilt = model.render()
+    validate_splice(script, rebuilt, report["updated"])
+    return rebuilt, report
+
+
+def validate_splice(original_script, rebuilt_script, updated_numbers):
+    """
+    Checks that the rebuilt script has the same sections in the same order and that
+    everything except the bodies of `updated_numbers` is byte-for-byte identical.
+    """
+    original = parse_script(original_script)
+    rebuilt = parse_script(rebuilt_script)
+
+    if len(original.parts) != len(rebuilt.parts):
+        raise ScriptSectionError("The rebuilt script has a different number of sections.")
+
+    for before, after in zip(original.parts, rebuilt.parts):
+        if isinstance(before, str) or isinstance(after, str):
+            if before != after:
+                raise ScriptSectionError("Text outside the sections changed.")
+            continue
+        if (before.number, before.header, before.footer) != (after.number, after.header, after.footer):
+            raise ScriptSectionError(f"Section {before.number} tags changed or sections moved.")
+        if before.number not in updated_numbers and before.body != after.body:
+            raise ScriptSectionError(f"Section {before.number} changed although it was not updated.")
+
+
+def splice_improved_sections(original_script, improved_sections_output):
+    """
+    Applies the "After:" sections of the Step 4 output to the original script.
+    Returns (rebuilt script, report).
+    """
+    return apply_section_updates(original_script, parse_improved_sections(improved_sections_output))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the sections of a VAPI script or splice improved sections into it.")
+    parser.add_argument("script", help="Path of the VAPI script, e.g. 'vapi script.txt'")
+    parser.add_argument("--improved", help="Path of a Step 4 Before/After output to splice in")
+    parser.add_argument("--output", help="Where to write the rebuilt script (default: print the report only)")
+    args = parser.parse_args()
+
+    with open(args.script, "r", encoding="utf-8") as f:
+        script_text = f.read()
+
+    if not args.improved:
+        for section in parse_script(script_text).sections:
+            print(f"{section.number:>3}  {json.dumps(section.attributes)}  ({len(section.body)} chars)")
+    else:
+        with open(args.improved, "r", encoding="utf-8") as f:
+            rebuilt_script, splice_report = splice_improved_sections(script_text, f.read())
+        print(json.dumps(splice_report, indent=2))
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(rebuilt_script)
@@ -0,0 +1,110 @@
+import json
+import threading
+from utils.graphConnection import get_graph_connection, run_in_transaction
+from utils.graphSchema import ensure_calls_schema
+
+
+# Name of the counter node that hands out CallSession numbers
+SESSION_SEQUENCE_NAME = "call_session"
+
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def session_num_from_id(session_id):
+    """
+    Returns the integer part of a session id such as "call_transcript_12".
+    """
+    return int(str(session_id).split('_')[-1])
+
+
+# ==============================================================================
+# 1. ONE-TIME SETUP: CONSTRAINTS AND BACKFILL OF session_num
+# ==============================================================================
+def ensure_session_sequence(graph):
+    """
+    Creates the calls graph constraints (including the ones the allocator relies on)
+    and backfills the integer `session_num` property on CallSession nodes written before it existed.
+    Runs once per database per process; safe to call on every request.
+    """
+    key = graph._database
+    if key in _schema_ready:
+        return
+
+    with _schema_lock:
+        if key in _schema_ready:
+            return
+
+        ensure_calls_schema(graph, await_online=False)
+        graph.query("""
+        MATCH (cs:CallSession)
+        WHERE cs.session_num IS NULL
+        SET cs.session_num = toInteger(split(cs.session_id, '_')[-1])
+        """)
+        _schema_ready.add(key)
+
+
+# ==============================================================================
+# 2. ATOMIC ALLOCATION FROM THE SEQUENCE NODE
+# ==============================================================================
+def _allocate(tx, name, count):
+    # Fast path: the counter node exists, so incrementing it takes a write lock
+    # on that single node and concurrent callers are serialized by Neo4j.
+    record = tx.run("""
+    MATCH (s:Sequence {name: $name})
+    SET s.value = s.value + $count
+    RETURN s.value AS value
+    """, {'name': name, 'count': count}).single()
+
+    if record is None:
+        # First allocation ever: seed the counter from the existing sessions.
+        # The uniqueness constraint on Sequence.name makes this MERGE safe.
+        record = tx.run("""
+        OPTIONAL MATCH (cs:CallSession)
+        WITH max(cs.session_num) AS max_id
+        MERGE (s:Sequence {name: $name})
+        ON CREATE SET s.value = coalesce(max_id, 0)
+        SET s.value = s.value + $count
+        RETURN s.value AS value
+        """, {'name': name, 'count': count}).single()
+
+    return record['value']
+
+
+def allocate_session_ids(graph, count=1):
+    """
+    Atomically reserves `count` consecutive session numbers and returns them as a list.
+    """
+    if count < 1:
+        raise ValueError("count must be at least 1.")
+
+    ensure_session_sequence(graph)
+    last_id = run_in_transaction(graph, lambda tx: _allocate(tx, SESSION_SEQUENCE_NAME, count))
+    return list(range(last_id - count + 1, last_id + 1))
+
+
+# ==============================================================================
+# 3. MAX INGESTED SESSION NUMBER (INDEX-BACKED)
+# ==============================================================================
+def get_max_session_num(graph):
+    """
+    Returns the highest session_num that was actually ingested (0 if none).
+    Served from the uniqueness constraint's index instead of scanning every CallSession.
+    """
+    ensure_session_sequence(graph)
+    result = graph.query("""
+    MATCH (cs:CallSession)
+    WHERE cs.session_num IS NOT NULL
+    RETURN cs.session_num AS max_id
+    ORDER BY cs.session_num DESC
+    LIMIT 1
+    """)
+    return result[0]['max_id'] if result else 0
+
+
+if __name__ == "__main__":
+    graph = get_graph_connection(1)
+    print(json.dumps({
+        "allocated": allocate_session_ids(graph),
+        "max_ingested": get_max_session_num(graph)
+    }, indent=2))
@@ -4,52 +4,69 @@ import json
 import sys
 import os
 from utils.graphConnection import get_graph_connection
+from utils.callCounters import read_counters, acknowledge_counters
 
 
 def check_threshold():
     """
-    Checks if the highest session ID has reached the next analysis threshold (50, 100, 150, 200, etc.).
-    Returns a simple Yes/No (boolean) and the next threshold that needs to be reached.
-    """    
+    Checks if the calls ingested since the last acknowledged analysis have reached the
+    analysis threshold, globally and per ICP segment (each segment has its own threshold).
+    Only the materialized counter nodes are read, so this is constant time regardless of graph size.
+    """
     try:
             calls_graph = get_graph_connection(1)
+            counters = read_counters(calls_graph)
+
+            global_counter = counters["global"]
+            ready_segments = [
+                segment for segment, counter in counters["segments"].items()
+                if counter["threshold_met"]
+            ]
+            threshold_met = global_counter["threshold_met"] or bool(ready_segments)
 
-            # Get the highest session ID (similar to get_next_session_id function)
-            query = """
-            MATCH (cs:CallSession)
-            // We extract the numeric part of the session_id
-            WITH toInteger(split(cs.session_id, '_')[-1]) AS session_num
-            RETURN max(session_num) AS max_id
-            """
-            
-            result = calls_graph.query(query)
-            max_session_id = result[0]['max_id'] if result and result[0]['max_id'] is not None else 0
-
-            # Calculate what threshold we should be at based on max_session_id
-            # Find the highest threshold that max_session_id has surpassed
-            current_threshold_level = (max_session_id // 50) * 50
-            next_threshold = current_threshold_level + 50
-
-            # Check if we've reached a new threshold
-            if max_session_id >= next_threshold:
-                return {
-                    "threshold_met": True,
-                    "max_session_id": max_session_id,
-                    "threshold_reached": next_threshold,
-                    "message": f"Threshold of {next_threshold} calls reached. Current max session ID: {max_session_id}."
-                }
+            if threshold_met:
+                parts = []
+                if global_counter["threshold_met"]:
+                    parts.append(f"{global_counter['since_last_analysis']} new calls since the last analysis "
+                                 f"(threshold {global_counter['threshold']})")
+                if ready_segments:
+                    parts.append(f"segments ready: {', '.join(ready_segments)}")
+                message = "Threshold reached: " + "; ".join(parts) + "."
             else:
-                return {
-                    "threshold_met": False,
-                    "max_session_id": max_session_id,
-                    "next_threshold": next_threshold,
-                    "sessions_remaining": next_threshold - max_session_id,
-                    "message": f"Threshold not met. Current max session ID: {max_session_id}/{next_threshold}. {next_threshold - max_session_id} more sessions needed."
-                }
+                remaining = global_counter["threshold"] - global_counter["since_last_analysis"]
+                message = (f"Threshold not met. {global_counter['since_last_analysis']}/{global_counter['threshold']} "
+                           f"new calls since the last analysis. {remaining} more calls needed.")
+
+            return {
+                "threshold_met": threshold_met,
+                "total_calls": global_counter["count"],
+                "calls_since_last_analysis": global_counter["since_last_analysis"],
+                "threshold": global_counter["threshold"],
+                "ready_segments": ready_segments,
+                "segments": counters["segments"],
+                "message": message
+            }
     except Exception as e:
             # If the database is down or the query fails, return an error
             raise HTTPException(status_code=500, detail=f"Database query failed: {str(e)}")
-    
+
+
+def acknowledge_threshold(segments=None):
+    """
+    Marks the current counts as analyzed so the thresholds start counting from here.
+    Called once the script analysis for the ready segments has been run.
+    """
+    try:
+            calls_graph = get_graph_connection(1)
+            counters = acknowledge_counters(calls_graph, segments)
+            return {
+                "acknowledged_segments": segments if segments is not None else list(counters["segments"].keys()),
+                "total_calls": counters["global"]["count"],
+                "message": "Thresholds acknowledged. Counting starts again from the current totals."
+            }
+    except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database query failed: {str(e)}")
+
 
 if __name__ == "__main__":
     response = check_threshold()
@@ -0,0 +1,85 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from utils.eventStream import publish_event
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Outbound webhook (e.g. an n8n Webhook node) called when a threshold is crossed. Unset = SSE only.
+THRESHOLD_WEBHOOK_URL = os.getenv("THRESHOLD_WEBHOOK_URL")
+# Optional shared secret sent as X-Webhook-Secret so the receiver can verify the sender
+THRESHOLD_WEBHOOK_SECRET = os.getenv("THRESHOLD_WEBHOOK_SECRET")
+THRESHOLD_WEBHOOK_RETRIES = int(os.getenv("THRESHOLD_WEBHOOK_RETRIES", "5"))
+THRESHOLD_WEBHOOK_BACKOFF_SECONDS = float(os.getenv("THRESHOLD_WEBHOOK_BACKOFF_SECONDS", "1"))
+THRESHOLD_WEBHOOK_TIMEOUT = float(os.getenv("THRESHOLD_WEBHOOK_TIMEOUT", "10"))
+
+# SSE topic the threshold events are published on (GET /events/thresholds)
+THRESHOLD_EVENTS_TOPIC = "thresholds"
+
+_webhook_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="threshold-webhook")
+
+
+# ==============================================================================
+# 1. WEBHOOK DELIVERY WITH RETRY
+# ==============================================================================
+def _is_retryable(status_code):
+    return status_code == 429 or status_code >= 500
+
+
+def deliver_webhook(payload, url=THRESHOLD_WEBHOOK_URL):
+    """
+    POSTs the payload to the webhook, retrying connection errors, 429 and 5xx responses
+    with exponential backoff. Returns True once the receiver accepted it.
+    """
+    headers = {"Content-Type": "application/json"}
+    if THRESHOLD_WEBHOOK_SECRET:
+        headers["X-Webhook-Secret"] = THRESHOLD_WEBHOOK_SECRET
+
+    for attempt in range(1, THRESHOLD_WEBHOOK_RETRIES + 1):
+        try:
+            response = requests.post(url, json=payload, headers=headers, timeout=THRESHOLD_WEBHOOK_TIMEOUT)
+            if response.status_code < 300:
+                print(f"Threshold webhook delivered (event {payload['event_id']}, attempt {attempt}).")
+                return True
+            if not _is_retryable(response.status_code):
+                print(f"Threshold webhook rejected event {payload['event_id']}: {response.status_code} {response.text}")
+                return False
+            error = f"{response.status_code} {response.text}"
+        except requests.RequestException as e:
+            error = str(e)
+
+        if attempt < THRESHOLD_WEBHOOK_RETRIES:
+            delay = THRESHOLD_WEBHOOK_BACKOFF_SECONDS * 2 ** (attempt - 1)
+            print(f"Threshold webhook attempt {attempt} failed ({error}). Retrying in {delay}s.")
+            time.sleep(delay)
+
+    print(f"ERROR: Threshold webhook gave up on event {payload['event_id']} after {THRESHOLD_WEBHOOK_RETRIES} attempts.")
+    return False
+
+
+# ==============================================================================
+# 2. FAN-OUT: SSE SUBSCRIBERS + WEBHOOK
+# ==============================================================================
+def notify_threshold_crossings(crossings):
+    """
+    Pushes one "threshold_crossed" event per crossing to the SSE subscribers and
+    (in the background, so ingestion is not delayed) to the configured webhook.
+    """
+    for crossing in crossings:
+        event = publish_event(THRESHOLD_EVENTS_TOPIC, "threshold_crossed", crossing)
+        scope = crossing["segment"] or "all calls"
+        print(f"Threshold of {crossing['threshold']} calls crossed for {scope} (event {event['id']}).")
+
+        if THRESHOLD_WEBHOOK_URL:
+            payload = {"event_id": event["id"], "event": "threshold_crossed", **crossing}
+            _webhook_executor.submit(deliver_webhook, payload)
+
+
+def shutdown_threshold_notifier(wait=True):
+    """
+    Waits for pending webhook deliveries (including their retries). Called on shutdown.
+    """
+    _webhook_executor.shutdown(wait=wait)
@@ -0,0 +1,157 @@
+import re
+
+
+# Speaker markers used in VAPI transcripts, either alone on a line ("Assistant")
+# or as a prefix ("Assistant: Hi, Dale.")
+SPEAKER_LABELS = ("Assistant", "You", "User", "AI", "Agent", "Customer", "Bot")
+# The labels of those used for our own voice agent; every other label is the called party
+AGENT_SPEAKER_LABELS = ("Assistant", "AI", "Agent", "Bot")
+
+_speaker_line = re.compile(r"^\s*(" + "|".join(SPEAKER_LABELS) + r")\s*(?::\s*(.*))?$", re.IGNORECASE)
+
+
+# ==============================================================================
+# 1. SPLIT A TRANSCRIPT INTO OVERLAPPING WINDOWS ON SPEAKER BOUNDARIES
+# ==============================================================================
+def split_utterances(transcript_text):
+    """
+    Splits a transcript into utterances, each starting at a speaker marker.
+    Text before the first marker is kept as its own utterance.
+    """
+    utterances = []
+    current = []
+    for line in transcript_text.splitlines():
+        if _speaker_line.match(line) and current:
+            utterances.append("\n".join(current).strip())
+            current = []
+        current.append(line)
+    if current:
+        utterances.append("\n".join(current).strip())
+    return [u for u in utterances if u]
+
+
+def split_speaker_utterances(transcript_text):
+    """
+    Returns [(speaker label, utterance text without the label)] for every utterance.
+    The label is None for text before the first speaker marker.
+    """
+    result = []
+    for utterance in split_utterances(transcript_text):
+        first_line, _, rest = utterance.partition("\n")
+        match = _speaker_line.match(first_line)
+        if match:
+            text = "\n".join(part for part in (match.group(2) or "", rest) if part).strip()
+            label = next(label for label in SPEAKER_LABELS if label.lower() == match.group(1).lower())
+            result.append((label, text))
+        else:
+            result.append((None, utterance))
+    return result
+
+
+def split_into_windows(transcript_text, window_chars, overlap_utterances):
+    """
+    Groups utterances into windows of roughly `window_chars` characters. Each window
+    (after the first) repeats the last `overlap_utterances` utterances of the previous
+    one so the model sees the context of every turn. Windows never cut an utterance.
+
+    Returns [{"text": ..., "overlap": n}], where n is how many utterances at the start
+    of the window were already in the previous one (0 for the first window).
+    """
+    utterances = split_utterances(transcript_text)
+    if len(utterances) <= 1:
+        return [{"text": transcript_text, "overlap": 0}]
+
+    windows = []
+    start = 0
+    previous_end = 0
+    while start < len(utterances):
+        end = start
+        size = 0
+        while end < len(utterances) and (end == start or size + len(utterances[end]) <= window_chars):
+            size += len(utterances[end]) + 1
+            end += 1
+        windows.append({"text": "\n".join(utterances[start:end]), "overlap": max(0, previous_end - start)})
+        if end >= len(utterances):
+            break
+        # Step back for the overlap, but always make progress
+        previous_end = end
+        start = max(start + 1, end - overlap_utterances)
+    return windows
+
+
+# ==============================================================================
+# 2. STITCH THE PER-WINDOW EXTRACTIONS BACK INTO ONE CALL
+# ==============================================================================
+def _normalize_text(text):
+    return re.sub(r"[^a-z0-9]+", " ", str(text).lower()).strip()
+
+
+def _repeated_prefix(turns, tail_turns):
+    """
+    Returns how many leading `turns` repeat `tail_turns` (the end of the previous window).
+    Each leading turn must appear, in order, in the tail's normalized text; the model may
+    have merged or split the repeated utterances, so one turn can cover several tail
+    turns or a part of one. Stops at the first turn not found in the rest of the tail.
+    """
+    remaining = " ".join(_normalize_text(turn.get("text", "")) for turn in tail_turns)
+    repeated = 0
+    for turn in turns:
+        text = _normalize_text(turn.get("text", ""))
+        position = remaining.find(text) if text else -1
+        if position < 0:
+            break
+        remaining = remaining[position + len(text):]
+        repeated += 1
+    return repeated
+
+
+def merge_window_extractions(window_outputs, overlaps):
+    """
+    Merges the parsed NER JSON of each window (in window order) into one extraction:
+      - call_session: product focus from the first window, outcome from the last one
+        (the end of the call decides the outcome),
+      - participants: union by name, first occurrence wins,
+      - dialogue_turns: concatenated in order, dropping the leading turns of window i
+        that repeat the last overlaps[i] turns of window i - 1 (matched by normalized
+        text, bounded to that tail), then renumbered 1..N. When the number of dropped
+        turns differs from overlaps[i] it is logged; unmatched turns are always kept.
+    """
+    if not window_outputs:
+        raise ValueError("No window extractions to merge.")
+
+    call_session = dict(window_outputs[0].get("call_session") or {})
+    last_session = window_outputs[-1].get("call_session") or {}
+    if last_session.get("outcome"):
+        call_session["outcome"] = last_session["outcome"]
+    if not call_session.get("product_focus"):
+        call_session["product_focus"] = next(
+            (w["call_session"]["product_focus"] for w in window_outputs
+             if (w.get("call_session") or {}).get("product_focus")), ""
+        )
+
+    participants = []
+    seen_names = set()
+    for window in window_outputs:
+        for participant in window.get("participants", []):
+            key = _normalize_text(participant.get("name", ""))
+            if key and key not in seen_names:
+                seen_names.add(key)
+                participants.append(participant)
+
+    dialogue_turns = []
+    previous_turns = []
+    for index, window in enumerate(window_outputs):
+        turns = sorted(window.get("dialogue_turns", []), key=lambda t: t.get("turn_number", 0))
+        skip = 0
+        if index > 0 and overlaps[index]:
+            skip = _repeated_prefix(turns, previous_turns[-overlaps[index]:])
+            if skip != overlaps[index]:
+                print(f"WARNING: Window {index + 1} repeats {overlaps[index]} utterances of the previous window, "
+                      f"but {skip} of its leading turns matched them; the other turns are kept.")
+        dialogue_turns.extend(turns[skip:])
+        previous_turns = turns
+
+    for number, turn in enumerate(dialogue_turns, start=1):
+        turn["turn_number"] = number
+
+    return {"call_session": call_session, "participants": participants, "dialogue_turns": dialogue_turns}